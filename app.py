@@ -1,27 +1,217 @@
+import io
 import os
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, abort
+import gzip
+import json
+import shutil
+import hashlib
+import click
+from flask import Blueprint, Flask, Response, current_app, render_template, jsonify, request, redirect, url_for, flash, abort, g, session, send_file, stream_with_context
+from flask.cli import AppGroup
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from flask_migrate import Migrate
-from datetime import datetime
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.engine import make_url
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from dotenv import load_dotenv
 from utils.timeline import Timeline as TimelineManager, Event as TimelineEvent, Permission, TimelineError, EventConflictError, PermissionError
+from utils.dating import DatingSystem, get_dating_system, parse_era_table
+from utils.cache import TimelineCache, CachedTimeline, PermissionCache, UserCache
+from utils.search import FTS_CREATE_STATEMENTS, FTS_DROP_STATEMENTS, SNIPPET_START, SNIPPET_END, fts_query, render_snippet, include_in_migrations
+from utils.serializer import EventFragmentCache, serialize_events, serialize_timeline
+from utils.merge import EventChange, diff_fork, plan_merge
+from utils.aggregate import ALL_EVENTS, BinCounts, Binning, bucket_deltas, plan_bins
+from utils.formats import iter_ndjson_records, iter_csv_records, event_from_record, parse_labels, iter_ndjson_chunks, iter_csv_chunks, gzip_chunks
+from utils.instrumentation import Metrics, cache_samples, init_instrumentation, instrument_methods, span
+from utils.jobs import QUEUED, RUNNING, SUCCEEDED, FAILED, JobError, JobProgress, JobWorker, worker_name
+from utils.snapshots import LocalSnapshotStore, S3SnapshotStore, SnapshotStore, render_snapshot
 import uuid
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-please-change')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///fiction_timelines.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Initialize extensions, they are bound to the application in create_app
+db = SQLAlchemy()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+bp = Blueprint('main', __name__)
 
-# Initialize extensions
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
+# Process-wide caches, sized from the configuration in create_app
+timeline_cache: Optional[TimelineCache] = None
+event_fragments: Optional[EventFragmentCache] = None
+permission_cache: Optional[PermissionCache] = None
+user_cache: Optional[UserCache] = None
+
+def create_app(config: Optional[dict] = None, migrations: bool = True) -> Flask:
+    """
+    Create and configure the application
+    
+    The schema is only managed through migrations (`flask db upgrade`), so
+    creating the application never touches the database.
+    
+    Args:
+        config: Settings overriding the defaults and environment variables
+        migrations: Whether to set up Flask-Migrate and the `flask db`
+            commands. Alembic is slow to import and only needed to manage
+            the schema, so the Lambda entry point skips it.
+            
+    Returns:
+        Flask: The configured application
+    """
+    global timeline_cache, event_fragments, permission_cache, user_cache
+    
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-please-change')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///fiction_timelines.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TIMELINE_CACHE_MAX_ENTRIES'] = int(os.getenv('TIMELINE_CACHE_MAX_ENTRIES', 128))
+    app.config['TIMELINE_CACHE_MAX_EVENTS'] = int(os.getenv('TIMELINE_CACHE_MAX_EVENTS', 200000))
+    app.config['EVENT_FRAGMENT_CACHE_MAX_ENTRIES'] = int(os.getenv('EVENT_FRAGMENT_CACHE_MAX_ENTRIES', app.config['TIMELINE_CACHE_MAX_EVENTS']))
+    app.config['IMPORT_BATCH_SIZE'] = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+    app.config['IMPORT_MAX_REPORTED_ERRORS'] = 1000
+    app.config['EXPORT_YIELD_PER'] = int(os.getenv('EXPORT_YIELD_PER', 1000))
+    app.config['EXPLORE_PAGE_SIZE'] = 24
+    app.config['SEARCH_MAX_PER_PAGE'] = 100
+    app.config['CHANGES_MAX_PER_PAGE'] = 1000
+    app.config['PERMISSION_CACHE_TTL'] = float(os.getenv('PERMISSION_CACHE_TTL', 30))
+    app.config['PERMISSIONS_MAX_TIMELINES'] = 200
+    app.config['USER_CACHE_TTL'] = float(os.getenv('USER_CACHE_TTL', 30))
+    app.config['AGGREGATE_MAX_BINS'] = 1000
+    app.config['AGGREGATE_MAX_EVENTS_PER_BIN'] = 10
+    # Applied to every SQLite connection, set to {} to keep SQLite's defaults
+    app.config['SQLITE_PRAGMAS'] = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    }
+    app.config['SQLITE_POOL_SIZE'] = int(os.getenv('SQLITE_POOL_SIZE', 5))
+    app.config['SQLITE_MAX_OVERFLOW'] = int(os.getenv('SQLITE_MAX_OVERFLOW', 10))
+    # Opt-in request tracing: Server-Timing headers, request logs and /metrics
+    app.config['INSTRUMENTATION'] = os.getenv('INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+    app.config['INSTRUMENTATION_LOG_THRESHOLD_MS'] = float(os.getenv('INSTRUMENTATION_LOG_THRESHOLD_MS', 0))
+    # Background jobs, run by `flask jobs work`. Uploads and export files are kept in JOBS_DIR,
+    # which the workers must share with the application.
+    app.config['JOBS_DIR'] = os.getenv('JOBS_DIR', os.path.join(app.instance_path, 'jobs'))
+    app.config['JOB_WORKER_THREADS'] = int(os.getenv('JOB_WORKER_THREADS', 2))
+    app.config['JOB_POLL_INTERVAL'] = float(os.getenv('JOB_POLL_INTERVAL', 1))
+    app.config['JOB_HEARTBEAT_INTERVAL'] = 30
+    app.config['JOB_STALE_AFTER'] = 300  # Seconds without a heartbeat before a running job's worker is presumed dead
+    app.config['JOB_MAX_ATTEMPTS'] = 3
+    app.config['JOB_RETENTION_DAYS'] = float(os.getenv('JOB_RETENTION_DAYS', 7))
+    app.config['REINDEX_BATCH_SIZE'] = 500  # Event rows looked up at once, kept under SQLite's bound parameter limit
+    # Precomputed timeline snapshots, rendered by the job workers. Off unless SNAPSHOT_STORE is 'local' or 's3'.
+    app.config['SNAPSHOT_STORE'] = os.getenv('SNAPSHOT_STORE', '')
+    app.config['SNAPSHOT_DIR'] = os.getenv('SNAPSHOT_DIR', os.path.join(app.instance_path, 'snapshots'))
+    app.config['SNAPSHOT_BUCKET'] = os.getenv('SNAPSHOT_BUCKET')
+    app.config['SNAPSHOT_PREFIX'] = os.getenv('SNAPSHOT_PREFIX', 'snapshots/')
+    app.config['SNAPSHOT_ENDPOINT_URL'] = os.getenv('SNAPSHOT_ENDPOINT_URL')  # For S3-compatible stores other than AWS
+    app.config['SNAPSHOT_BASE_URL'] = os.getenv('SNAPSHOT_BASE_URL')  # Public URL of the snapshots, clients are redirected to it
+    app.config['SNAPSHOT_URL_TTL'] = int(os.getenv('SNAPSHOT_URL_TTL', 3600))
+    app.config['SNAPSHOT_DEBOUNCE'] = float(os.getenv('SNAPSHOT_DEBOUNCE', 10))
+    app.config['SNAPSHOT_MAX_DELAY'] = float(os.getenv('SNAPSHOT_MAX_DELAY', 60))
+    if config:
+        app.config.update(config)
+    if app.config['SNAPSHOT_STORE'] not in ('', 'local', 's3'):
+        raise ValueError(f"Unknown SNAPSHOT_STORE: {app.config['SNAPSHOT_STORE']}")
+        
+    configure_sqlite_pool(app)
+    db.init_app(app)
+    if app.config['SQLITE_PRAGMAS'] and make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name() == 'sqlite':
+        with app.app_context():
+            pragmas = dict(app.config['SQLITE_PRAGMAS'])
+            sqlalchemy_event.listen(db.engine, 'connect', lambda connection, record: set_sqlite_pragmas(connection, pragmas))
+    login_manager.init_app(app)
+    if migrations:
+        from flask_migrate import Migrate
+        Migrate(app, db, include_object=include_in_migrations)
+        
+    timeline_cache = TimelineCache(
+        max_entries=app.config['TIMELINE_CACHE_MAX_ENTRIES'],
+        max_weight=app.config['TIMELINE_CACHE_MAX_EVENTS']
+    )
+    event_fragments = EventFragmentCache(max_entries=app.config['EVENT_FRAGMENT_CACHE_MAX_ENTRIES'])
+    permission_cache = PermissionCache(ttl=app.config['PERMISSION_CACHE_TTL'])
+    user_cache = UserCache(ttl=app.config['USER_CACHE_TTL'])
+    
+    app.register_blueprint(bp)
+    app.cli.add_command(jobs_cli)
+    if app.config['INSTRUMENTATION']:
+        configure_instrumentation(app)
+    return app
+
+def configure_instrumentation(app: Flask) -> None:
+    """
+    Trace requests to find where their time goes
+    
+    SQL queries, timeline hydration and serialization, the hot methods of
+    the timeline model and template rendering are timed separately. Nothing
+    is hooked unless INSTRUMENTATION is enabled, so it costs nothing when
+    off.
+    """
+    metrics = Metrics()
+    with app.app_context():
+        init_instrumentation(app, db.engine, metrics)
+    instrument_methods(TimelineManager, [
+        'to_dict', 'fork', 'add_event', 'edit_event', 'delete_event', 'events_between', 'nearest',
+        'conflicting_events', 'find_all_conflicts'
+    ], 'timeline.')
+    metrics.add_collector(cache_samples({
+        'timeline': timeline_cache,
+        'event_fragments': event_fragments,
+        'permissions': permission_cache,
+        'users': user_cache
+    }))
+    app.extensions['instrumentation'] = metrics
+
+def configure_sqlite_pool(app: Flask) -> None:
+    """
+    Size the connection pool of a file-backed SQLite database
+    
+    Connections are kept open between requests instead of being reopened,
+    which keeps their page cache and memory map warm. In-memory databases
+    share a single connection and other databases keep their own settings.
+    """
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    options.setdefault('pool_size', app.config['SQLITE_POOL_SIZE'])
+    options.setdefault('max_overflow', app.config['SQLITE_MAX_OVERFLOW'])
+
+def set_sqlite_pragmas(dbapi_connection, pragmas: Dict[str, object]) -> None:
+    """
+    Tune a new SQLite connection
+    
+    WAL lets readers proceed while a write is in progress, and with it
+    synchronous=NORMAL only syncs at checkpoints. busy_timeout makes
+    concurrent writers wait for the lock instead of failing with
+    "database is locked", and mmap_size reads pages through a shared memory
+    map instead of copying them into each connection.
+    """
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+_lambda_app = None
+
+def lambda_handler(event, context):
+    """
+    AWS Lambda entry point translating API Gateway events into WSGI requests
+    
+    The application is created on the first invocation and reused by the
+    ones that follow. aws-wsgi is imported here rather than at module level
+    so that nothing else pays for it.
+    """
+    global _lambda_app
+    import awsgi
+    if _lambda_app is None:
+        _lambda_app = create_app(migrations=False)
+    return awsgi.response(_lambda_app, event, context)
 
 # Models
 class User(UserMixin, db.Model):
@@ -38,60 +228,218 @@ class Timeline(db.Model):
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     dating_system = db.Column(db.String(50), default='CE')
+    era_table = db.Column(db.Text)  # JSON list of [era name, start offset] pairs for custom eras
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     modified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    parent_timeline_id = db.Column(db.Integer, db.ForeignKey('timeline.id'), nullable=True)
-    events = db.relationship('Event', backref='timeline', lazy=True, cascade='all, delete-orphan')
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    parent_timeline_id = db.Column(db.Integer, db.ForeignKey('timeline.id'), nullable=True, index=True)
+    forked_at = db.Column(db.DateTime)  # Forks inherit their parent's events and only store what they change
+    event_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Maintained by the event routes
+    max_span = db.Column(db.Float)  # Upper bound on the length of its own events' spans, bounds conflict lookups
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Last change number taken by its event rows and tombstones
+    snapshot_key = db.Column(db.String(80))  # Latest snapshot of the timeline's JSON in the snapshot store
+    snapshot_version = db.Column(db.String(32))  # ETag of the version of the timeline the snapshot was rendered from
+    events = db.relationship('Event', backref='timeline', lazy=True, cascade='all, delete-orphan',
+                             order_by='Event.date_key.asc().nulls_last(), Event.id')
     collaborators = db.relationship('TimelineCollaborator', backref='timeline', lazy=True, cascade='all, delete-orphan')
+    tombstones = db.relationship('EventTombstone', backref='timeline', lazy=True, cascade='all, delete-orphan')
 
 class Event(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    uuid = db.Column(db.String(36), nullable=False, default=lambda: str(uuid.uuid4()))  # Shared by a fork's override and the event it replaces
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     date = db.Column(db.String(50), nullable=False)
-    categories = db.Column(db.String(500))  # Stored as comma-separated values
-    tags = db.Column(db.String(500))  # Stored as comma-separated values
+    date_key = db.Column(db.Float)  # Sort key compiled from date by the timeline's dating system
+    end_date = db.Column(db.String(50))  # Set for events spanning a period
+    end_key = db.Column(db.Float)
+    categories = db.Column(db.String(500))  # Comma-separated copy of event_category, used for hydration
+    tags = db.Column(db.String(500))  # Comma-separated copy of event_tag, used for hydration
     timeline_id = db.Column(db.Integer, db.ForeignKey('timeline.id'), nullable=False)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     modified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    base_hash = db.Column(db.String(64))  # Set on fork overrides: content hash of the inherited version
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Taken from the timeline on every write, see take_change_seqs
+    
+    __table_args__ = (
+        db.UniqueConstraint('timeline_id', 'uuid', name='uq_event_timeline_uuid'),
+        db.Index('ix_event_timeline_date_key', 'timeline_id', 'date_key'),
+        db.Index('ix_event_timeline_change_seq', 'timeline_id', 'change_seq'),
+    )
+
+class EventTombstone(db.Model):
+    # Records a deleted event for change feeds, and in forks hides the inherited version
+    id = db.Column(db.Integer, primary_key=True)
+    timeline_id = db.Column(db.Integer, db.ForeignKey('timeline.id'), nullable=False)
+    event_uuid = db.Column(db.String(36), nullable=False)
+    base_hash = db.Column(db.String(64))  # Set when an inherited version was deleted: its content hash
+    deleted_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Shares the numbering of the timeline's event rows
+    
+    __table_args__ = (
+        db.UniqueConstraint('timeline_id', 'event_uuid', name='uq_event_tombstone_timeline_uuid'),
+        db.Index('ix_event_tombstone_timeline_change_seq', 'timeline_id', 'change_seq'),
+    )
+
+class EventBucket(db.Model):
+    # Zoom-level summary: a timeline's own event rows counted per date bucket and category at each
+    # level of the pyramid in utils.aggregate, maintained by the event helpers
+    timeline_id = db.Column(db.Integer, db.ForeignKey('timeline.id'), primary_key=True)
+    level = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+class EventBucketTotal(db.Model):
+    # Counts of every event per bucket, whatever its categories, kept apart so no category can be mistaken for them
+    timeline_id = db.Column(db.Integer, db.ForeignKey('timeline.id'), primary_key=True)
+    level = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+event_tags = db.Table(
+    'event_tag',
+    db.Column('event_id', db.Integer, db.ForeignKey('event.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_event_tag_tag_id', 'tag_id', 'event_id')
+)
+
+event_categories = db.Table(
+    'event_category',
+    db.Column('event_id', db.Integer, db.ForeignKey('event.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('category_id', db.Integer, db.ForeignKey('category.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_event_category_category_id', 'category_id', 'event_id')
+)
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+
+class Category(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
 
 class TimelineCollaborator(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     timeline_id = db.Column(db.Integer, db.ForeignKey('timeline.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     permission = db.Column(db.String(20), nullable=False)  # 'view', 'edit', 'admin'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('timeline_id', 'user_id', name='uq_timeline_collaborator_timeline_user'),
+    )
+
+class Job(db.Model):
+    # Background work queued by the routes and run by `flask jobs work`, see utils.jobs
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # Key of JOB_HANDLERS
+    status = db.Column(db.String(20), nullable=False, default=QUEUED)  # 'queued', 'running', 'succeeded', 'failed'
+    timeline_id = db.Column(db.Integer, db.ForeignKey('timeline.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    payload = db.Column(db.Text)  # JSON arguments, a 'path' in them is a file owned by the job
+    result = db.Column(db.Text)  # JSON outcome, also kept for failed jobs that got partway
+    error = db.Column(db.Text)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)  # What progress counts up to, when known
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(100))  # Worker that claimed the job
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Refreshed by the worker while the job runs
+    finished_at = db.Column(db.DateTime)
+    run_after = db.Column(db.DateTime)  # Queued jobs aren't claimed before this time, if set
+    
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+        db.Index('ix_job_timeline_status', 'timeline_id', 'status'),
+    )
+
+class SessionUser(UserMixin):
+    """
+    Logged in user restored from the session cookie
+    
+    Most requests only need the user's id, so the User row is loaded the
+    first time any other attribute is read. load_user has already confirmed
+    the user exists; if they were deleted since, the request is answered
+    with 401 instead of failing on a missing attribute.
+    """
+    _user = None
+    
+    def __init__(self, user_id: int):
+        self.id = user_id
+        
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+            if self._user is None:
+                user_cache.invalidate(self.id)
+                abort(401)
+        return getattr(self._user, name)
+
+@sqlalchemy_event.listens_for(db.metadata, 'after_create')
+def create_search_index(target, connection, **kw):
+    """Create the FTS5 search tables and their sync triggers alongside the models"""
+    if connection.dialect.name == 'sqlite':
+        for statement in FTS_CREATE_STATEMENTS:
+            connection.exec_driver_sql(statement)
+
+@sqlalchemy_event.listens_for(db.metadata, 'before_drop')
+def drop_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        for statement in FTS_DROP_STATEMENTS:
+            connection.exec_driver_sql(statement)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-# Helper functions
-def get_timeline_manager(timeline_db: Timeline) -> TimelineManager:
-    """Convert database Timeline to TimelineManager instance"""
-    events = []
-    for event_db in timeline_db.events:
-        event = TimelineEvent(
-            id=event_db.uuid,
-            title=event_db.title,
-            description=event_db.description,
-            date=event_db.date,
-            categories=set(event_db.categories.split(',')) if event_db.categories else set(),
-            tags=set(event_db.tags.split(',')) if event_db.tags else set(),
-            created_by=str(event_db.created_by),
-            created_at=event_db.created_at,
-            modified_at=event_db.modified_at
-        )
-        events.append(event)
+    """
+    Restore the logged in user from the session cookie
     
-    collaborators = {
-        str(collab.user_id): Permission(collab.permission)
-        for collab in timeline_db.collaborators
-    }
+    Confirming that the user still exists is a primary key lookup, and its
+    result is cached for USER_CACHE_TTL seconds.
     
+    Returns:
+        SessionUser, or None if the user no longer exists
+    """
+    user_id = int(user_id)
+    if not user_cache.get(user_id):
+        if db.session.scalar(db.select(User.id).where(User.id == user_id)) is None:
+            return None
+        user_cache.put(user_id)
+    return SessionUser(user_id)
+
+# Helper functions
+def event_from_db(event_db: Event) -> TimelineEvent:
+    """Convert a database Event row to a TimelineEvent"""
+    return TimelineEvent(
+        id=event_db.uuid,
+        title=event_db.title,
+        description=event_db.description,
+        date=event_db.date,
+        categories=event_db.categories.split(',') if event_db.categories else (),
+        tags=event_db.tags.split(',') if event_db.tags else (),
+        created_by=str(event_db.created_by),
+        created_at=event_db.created_at,
+        modified_at=event_db.modified_at,
+        date_key=event_db.date_key,
+        end_date=event_db.end_date,
+        end_key=event_db.end_key
+    )
+
+def get_era_table(timeline_db: Timeline) -> Optional[List]:
+    """Return the timeline's user-defined era table, if it has one"""
+    return json.loads(timeline_db.era_table) if timeline_db.era_table else None
+
+def get_timeline_dating_system(timeline_db: Timeline) -> DatingSystem:
+    """Return the parser for a timeline's dating system"""
+    return get_dating_system(timeline_db.dating_system, get_era_table(timeline_db))
+
+def manager_from_db(timeline_db: Timeline, events: List[TimelineEvent], collaborators: dict) -> TimelineManager:
+    """Build a TimelineManager for a database Timeline from already converted parts"""
     return TimelineManager(
         id=timeline_db.uuid,
         title=timeline_db.title,
@@ -102,64 +450,1815 @@ def get_timeline_manager(timeline_db: Timeline) -> TimelineManager:
         created_at=timeline_db.created_at,
         modified_at=timeline_db.modified_at,
         collaborators=collaborators,
-        parent_timeline_id=str(timeline_db.parent_timeline_id) if timeline_db.parent_timeline_id else None
+        parent_timeline_id=str(timeline_db.parent_timeline_id) if timeline_db.parent_timeline_id else None,
+        era_table=get_era_table(timeline_db)
+    )
+
+def get_fork_chain(timeline_db: Timeline) -> List[Tuple[int, datetime]]:
+    """
+    Return a timeline and its ancestors, nearest first, with their modification times
+    
+    Forks only store the events they change, so their reads resolve through
+    this chain. Timelines that aren't forks are answered without a query.
+    """
+    if timeline_db.parent_timeline_id is None:
+        return [(timeline_db.id, timeline_db.modified_at)]
+        
+    chain = (
+        db.select(Timeline.id, Timeline.parent_timeline_id, Timeline.modified_at, db.literal(0).label('depth'))
+        .where(Timeline.id == timeline_db.id)
+        .cte('fork_chain', recursive=True)
+    )
+    parent = db.aliased(Timeline)
+    chain = chain.union_all(
+        db.select(parent.id, parent.parent_timeline_id, parent.modified_at, chain.c.depth + 1)
+        .where(parent.id == chain.c.parent_timeline_id)
+    )
+    rows = db.session.execute(db.select(chain.c.id, chain.c.modified_at).order_by(chain.c.depth)).all()
+    return [(timeline_id, modified_at) for timeline_id, modified_at in rows]
+
+def visible_events(chain: List[Tuple[int, datetime]]):
+    """
+    Build a filter matching the events visible in the first timeline of a fork chain
+    
+    An event row is visible unless a timeline nearer the start of the chain
+    overrides it with its own row for the same uuid or deletes it with a
+    tombstone. The checks are correlated lookups on (timeline_id, uuid), so
+    other filters narrow the rows first and only the matches are resolved.
+    
+    Args:
+        chain: Fork chain as returned by get_fork_chain
+    """
+    timeline_ids = [timeline_id for timeline_id, _ in chain]
+    if len(timeline_ids) == 1:
+        return Event.timeline_id == timeline_ids[0]
+        
+    depths = {timeline_id: depth for depth, timeline_id in enumerate(timeline_ids)}
+    depth = db.case(depths, value=Event.timeline_id)
+    nearer = db.aliased(Event)
+    overridden = (
+        db.select(nearer.id)
+        .where(nearer.uuid == Event.uuid, nearer.timeline_id.in_(timeline_ids),
+               db.case(depths, value=nearer.timeline_id) < depth)
+        .exists()
+    )
+    deleted = (
+        db.select(EventTombstone.id)
+        .where(EventTombstone.event_uuid == Event.uuid, EventTombstone.timeline_id.in_(timeline_ids),
+               db.case(depths, value=EventTombstone.timeline_id) < depth)
+        .exists()
+    )
+    return db.and_(Event.timeline_id.in_(timeline_ids), ~overridden, ~deleted)
+
+def get_visible_event(timeline_db: Timeline, event_uuid: str) -> Optional[Event]:
+    """Return the row holding a timeline's version of an event, which may belong to an ancestor"""
+    return Event.query.filter(visible_events(get_fork_chain(timeline_db)), Event.uuid == event_uuid).first()
+
+def get_visible_events(timeline_db: Timeline, event_uuids: List[str]) -> Dict[str, Event]:
+    """Return the rows holding a timeline's versions of several events, keyed by uuid"""
+    visible = visible_events(get_fork_chain(timeline_db))
+    events_db = {}
+    # Look up in batches to stay under the database's bound parameter limit
+    for start in range(0, len(event_uuids), 500):
+        batch = event_uuids[start:start + 500]
+        events_db.update((event_db.uuid, event_db) for event_db in Event.query.filter(visible, Event.uuid.in_(batch)))
+    return events_db
+
+def get_timeline_manager(timeline_db: Timeline, chain: Optional[List[Tuple[int, datetime]]] = None) -> TimelineManager:
+    """Convert database Timeline to TimelineManager instance"""
+    with span('hydrate'):
+        events_db = Event.query.filter(visible_events(chain or get_fork_chain(timeline_db)))
+        events = [event_from_db(event_db) for event_db in events_db.order_by(Event.date_key.asc().nulls_last(), Event.id)]
+        
+        collaborators = {
+            str(collab.user_id): Permission(collab.permission)
+            for collab in timeline_db.collaborators
+        }
+        
+        return manager_from_db(timeline_db, events, collaborators)
+
+def get_permissions(timeline_ids: List[int], user_id: int) -> Dict[int, Optional[Permission]]:
+    """
+    Resolve a user's permissions on several timelines at once
+    
+    Owners get admin permission. Results are cached for the rest of the
+    request and, for a short time, in the process-wide permission cache, and
+    whatever is left is resolved with a single query.
+    
+    Args:
+        timeline_ids: IDs of the timelines to check
+        user_id: ID of the user
+        
+    Returns:
+        dict: Permission, or None without access, for each existing timeline
+    """
+    if 'permissions' not in g:
+        g.permissions = {}
+    permissions = {}
+    missing = []
+    for timeline_id in set(timeline_ids):
+        permission = g.permissions.get((timeline_id, user_id), PermissionCache.MISSING)
+        if permission is PermissionCache.MISSING:
+            permission = permission_cache.get(timeline_id, user_id)
+        if permission is PermissionCache.MISSING:
+            missing.append(timeline_id)
+        else:
+            permissions[timeline_id] = permission
+            
+    if missing:
+        rows = db.session.execute(
+            db.select(Timeline.id, Timeline.user_id, TimelineCollaborator.permission)
+            .outerjoin(TimelineCollaborator, db.and_(
+                TimelineCollaborator.timeline_id == Timeline.id,
+                TimelineCollaborator.user_id == user_id
+            ))
+            .where(Timeline.id.in_(missing))
+        ).all()
+        for timeline_id, owner_id, permission in rows:
+            if owner_id == user_id:
+                permission = Permission.ADMIN
+            elif permission is not None:
+                permission = Permission(permission)
+            permissions[timeline_id] = permission
+            permission_cache.put(timeline_id, user_id, permission)
+            
+    g.permissions.update(((timeline_id, user_id), permission) for timeline_id, permission in permissions.items())
+    return permissions
+
+def invalidate_permissions(timeline_id: int) -> None:
+    """Forget the cached permissions on a timeline after its collaborators change"""
+    permission_cache.invalidate(timeline_id)
+    for key in [key for key in g.get('permissions', {}) if key[0] == timeline_id]:
+        del g.permissions[key]
+
+def get_write_manager(timeline_db: Timeline, user_id: int, events_db: Optional[List[Event]] = None,
+                      event: Optional[TimelineEvent] = None) -> TimelineManager:
+    """
+    Build a TimelineManager holding only the state a single write needs
+    
+    Instead of hydrating every event and collaborator, only the acting user's
+    permission, the given events and the events whose spans overlap the
+    event being written are loaded, so permission and conflict checks stay
+    cheap regardless of timeline size.
+    
+    Args:
+        timeline_db: Timeline being modified
+        user_id: ID of the user performing the write
+        events_db: Event rows affected by the write
+        event: Event being added or edited, used to load conflict candidates
+    """
+    permission = get_permissions([timeline_db.id], user_id).get(timeline_db.id)
+    collaborators = {str(user_id): permission} if permission else {}
+    events_db = list(events_db or [])
+    
+    if event is not None and event.end_date:
+        dating = get_timeline_dating_system(timeline_db)
+        start, end = dating.parse(event.date), dating.parse(event.end_date)
+        if start is not None and end is not None and end > start:
+            events_db.extend(get_overlapping_spans(timeline_db, [(start, end)], exclude_uuid=event.id))
+    
+    events = [event_from_db(event_db) for event_db in events_db]
+    return manager_from_db(timeline_db, events, collaborators)
+
+def get_overlapping_spans(timeline_db: Timeline, spans: Iterable[Tuple[float, float]],
+                          exclude_uuid: Optional[str] = None) -> List[Event]:
+    """
+    Load the visible events whose spans overlap any of the given spans
+    
+    Spans overlapping [start, end) start at most max_span before it, which
+    bounds the range of the date index each lookup scans. Spans whose
+    ranges meet are looked up together.
+    
+    Args:
+        timeline_db: Timeline whose events are searched
+        spans: (start, end) date keys to check
+        exclude_uuid: Event to leave out, e.g. the one being edited
+    """
+    chain = get_fork_chain(timeline_db)
+    max_span = get_max_span(timeline_db, chain)
+    if max_span is None:
+        return []
+        
+    windows = []
+    for start, end in sorted(spans):
+        if windows and start - max_span <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+            
+    visible = visible_events(chain)
+    events_db = []
+    for start, end in windows:
+        query = Event.query.filter(visible, Event.date_key >= start - max_span, Event.date_key < end, Event.end_key > start)
+        if exclude_uuid is not None:
+            query = query.filter(Event.uuid != exclude_uuid)
+        events_db.extend(query.all())
+    return events_db
+
+def get_max_span(timeline_db: Timeline, chain: List[Tuple[int, datetime]]) -> Optional[float]:
+    """Return the longest span among the events visible in a timeline, or None if none of them spans a period"""
+    if len(chain) == 1:
+        return timeline_db.max_span
+    # Forks see their ancestors' rows as well as their own
+    return db.session.execute(
+        db.select(db.func.max(Timeline.max_span)).where(Timeline.id.in_([timeline_id for timeline_id, _ in chain]))
+    ).scalar()
+
+def get_cached_timeline(timeline_db: Timeline, chain: Optional[List[Tuple[int, datetime]]] = None) -> CachedTimeline:
+    """Return the hydrated and serialized timeline, building it on a cache miss"""
+    # A fork's content changes whenever any of its ancestors does
+    chain = chain or get_fork_chain(timeline_db)
+    version = tuple(modified_at for _, modified_at in chain)
+    cached = timeline_cache.get(timeline_db.uuid, version)
+    if cached is None:
+        timeline = get_timeline_manager(timeline_db, chain)
+        with span('serialize'):
+            serialized = serialize_timeline(timeline, event_fragments)
+        cached = timeline_cache.put(timeline_db.uuid, version, timeline, serialized)
+    return cached
+
+def timeline_validators(timeline_db: Timeline, chain: List[Tuple[int, datetime]],
+                        per_user: bool = False) -> Tuple[str, datetime, bool]:
+    """
+    Compute HTTP cache validators for a response derived from a timeline
+    
+    Every event and collaborator write touches the timeline, so the
+    modification times of the timeline and its ancestors identify its
+    content without loading any events. The event count is included as a
+    guard against writes landing within the same clock tick.
+    
+    Args:
+        timeline_db: Timeline the response is built from
+        chain: Fork chain as returned by get_fork_chain
+        per_user: Whether the response also depends on the logged in user
+        
+    Returns:
+        Tuple of the strong ETag, the Last-Modified time and per_user
+    """
+    parts = [f'{timeline_id}@{modified_at.isoformat()}' for timeline_id, modified_at in chain]
+    parts.append(str(timeline_db.event_count))
+    if per_user:
+        parts.append(f'user:{current_user.get_id()}')
+    etag = hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:32]
+    return etag, max(modified_at for _, modified_at in chain), per_user
+
+def not_modified_response(validators: Tuple[str, datetime, bool]) -> Optional[Response]:
+    """Return a 304 response if the client's copy matches the validators, None otherwise"""
+    etag, last_modified, per_user = validators
+    if per_user and session.get('_flashes'):
+        # Pending flash messages are only shown on a freshly rendered page
+        return None
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return add_validators(Response(status=304), validators)
+
+def add_validators(response: Response, validators: Tuple[str, datetime, bool]) -> Response:
+    """Attach cache validators to a response so clients revalidate it instead of refetching"""
+    etag, last_modified, per_user = validators
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    if per_user:
+        response.cache_control.private = True
+        response.vary.add('Cookie')
+    return response
+
+def get_inheriting_forks(timeline_db: Timeline, event_uuid: Optional[str] = None) -> List[int]:
+    """
+    Return the IDs of the forks below a timeline that see its version of an event
+    
+    Forks that override or delete the event hide it from their own forks, so
+    their subtrees are skipped. Takes one query per level of the fork tree.
+    
+    Args:
+        timeline_db: Timeline whose event changed
+        event_uuid: UUID of the event, or None for new events no fork can hide yet
+    """
+    fork_ids = []
+    parent_ids = [timeline_db.id]
+    while parent_ids:
+        child_ids = db.session.execute(
+            db.select(Timeline.id).where(Timeline.parent_timeline_id.in_(parent_ids))
+        ).scalars().all()
+        if child_ids and event_uuid is not None:
+            hiding = set(db.session.execute(
+                db.select(Event.timeline_id).where(Event.uuid == event_uuid, Event.timeline_id.in_(child_ids))
+                .union(db.select(EventTombstone.timeline_id)
+                       .where(EventTombstone.event_uuid == event_uuid, EventTombstone.timeline_id.in_(child_ids)))
+            ).scalars())
+            child_ids = [child_id for child_id in child_ids if child_id not in hiding]
+        fork_ids.extend(child_ids)
+        parent_ids = child_ids
+    return fork_ids
+
+def touch_timeline(timeline_db: Timeline, event_delta: int = 0, event_uuid: Optional[str] = None) -> None:
+    """
+    Mark a timeline as modified and drop its cached copy
+    
+    Args:
+        timeline_db: Timeline that was changed
+        event_delta: Number of events added (or removed, if negative) by the change
+        event_uuid: UUID of the removed event, so forks that hid it keep their counts
+    """
+    timeline_db.modified_at = datetime.utcnow()
+    if event_delta:
+        # Increment in SQL so concurrent writers don't overwrite each other's counts
+        timeline_db.event_count = Timeline.event_count + event_delta
+        fork_ids = get_inheriting_forks(timeline_db, event_uuid)
+        if fork_ids:
+            db.session.execute(
+                db.update(Timeline).where(Timeline.id.in_(fork_ids))
+                .values(event_count=Timeline.event_count + event_delta)
+                .execution_options(synchronize_session=False)
+            )
+    timeline_cache.invalidate(timeline_db.uuid)
+    schedule_snapshot(timeline_db)
+
+def filter_by_labels(query, model, table, column, names: List[str], match_all: bool):
+    """
+    Restrict an Event query to events linked to any or all of the given labels
+    
+    Args:
+        query: Event query to filter
+        model: Tag or Category
+        table: Association table linking events to the model
+        column: Column of the association table referencing the model
+        names: Label names to match
+        match_all: Require every label instead of at least one
+    """
+    matching = (
+        db.select(table.c.event_id)
+        .join(model, model.id == column)
+        .where(model.name.in_(names))
+    )
+    if match_all:
+        matching = matching.group_by(table.c.event_id).having(db.func.count(column) == len(set(names)))
+    return query.filter(Event.id.in_(matching))
+
+def parse_date_arg(dating: DatingSystem, name: str) -> Optional[float]:
+    """Compile a date from the query string, or return None if it wasn't given"""
+    date = request.args.get(name)
+    if date is None:
+        return None
+    key = dating.parse(date)
+    if key is None:
+        raise TimelineError(f"Unrecognized date for {dating.name} dating system: {date}")
+    return key
+
+def event_row(timeline_db: Timeline, event: TimelineEvent, user_id: int) -> dict:
+    """Convert TimelineEvent to a column mapping for bulk inserts"""
+    return {
+        'uuid': event.id,
+        'title': event.title,
+        'description': event.description,
+        'date': event.date,
+        'date_key': event.date_key,
+        'end_date': event.end_date,
+        'end_key': event.end_key,
+        'categories': ','.join(event.categories),
+        'tags': ','.join(event.tags),
+        'timeline_id': timeline_db.id,
+        'created_by': user_id,
+        'created_at': event.created_at,
+        'modified_at': event.modified_at
+    }
+
+def insert_ignore(table):
+    """Build an INSERT that skips rows violating a unique constraint"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return db.insert(table).prefix_with('IGNORE')
+    return insert(table).on_conflict_do_nothing()
+
+def insert_increment(table, column: str):
+    """Build an INSERT that adds to a column of rows that already exist instead of failing"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        return statement.on_duplicate_key_update({column: table.c[column] + statement.inserted[column]})
+    statement = insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=list(table.primary_key.columns),
+        set_={column: table.c[column] + statement.excluded[column]}
     )
 
-def save_timeline_event(timeline_db: Timeline, event: TimelineEvent, user_id: int) -> Event:
+def get_label_ids(model, names: Set[str]) -> Dict[str, int]:
+    """Return the IDs of Tag or Category names, creating any that don't exist yet"""
+    if not names:
+        return {}
+    db.session.execute(insert_ignore(model.__table__), [{'name': name} for name in names])
+    return dict(db.session.execute(db.select(model.name, model.id).where(model.name.in_(names))).all())
+
+def save_event_labels(labels: List[Tuple[int, Iterable[str], Iterable[str]]], replace: bool = False) -> None:
+    """
+    Write the normalized category and tag links for a batch of events
+    
+    Args:
+        labels: (event id, categories, tags) for each event
+        replace: Remove the events' existing links first, for edits
+    """
+    labels = [(event_id, set(categories), set(tags)) for event_id, categories, tags in labels]
+    if replace:
+        delete_event_labels([event_id for event_id, _, _ in labels])
+        
+    category_ids = get_label_ids(Category, {name for _, categories, _ in labels for name in categories})
+    tag_ids = get_label_ids(Tag, {name for _, _, tags in labels for name in tags})
+    category_links = [
+        {'event_id': event_id, 'category_id': category_ids[name]}
+        for event_id, categories, _ in labels for name in categories
+    ]
+    tag_links = [
+        {'event_id': event_id, 'tag_id': tag_ids[name]}
+        for event_id, _, tags in labels for name in tags
+    ]
+    if category_links:
+        db.session.execute(event_categories.insert(), category_links)
+    if tag_links:
+        db.session.execute(event_tags.insert(), tag_links)
+
+def delete_event_labels(event_ids: List[int]) -> None:
+    """Remove the category and tag links of events"""
+    db.session.execute(event_categories.delete().where(event_categories.c.event_id.in_(event_ids)))
+    db.session.execute(event_tags.delete().where(event_tags.c.event_id.in_(event_ids)))
+
+def summary_entry(event_db: Event) -> Tuple[Optional[float], List[str]]:
+    """Return what an event row counts for in the zoom-level summary: its date key and categories"""
+    return event_db.date_key, list(filter(None, (event_db.categories or '').split(',')))
+
+def update_event_buckets(timeline_id: int, added: Iterable[Tuple[Optional[float], Iterable[str]]] = (),
+                         removed: Iterable[Tuple[Optional[float], Iterable[str]]] = ()) -> None:
+    """
+    Apply added and removed event rows to a timeline's zoom-level summary
+    
+    Counts are incremented in SQL so concurrent writers don't overwrite each
+    other's changes, and buckets left empty are deleted.
+    
+    Args:
+        timeline_id: ID of the timeline storing the rows
+        added: (date key, categories) of the rows added
+        removed: (date key, categories) of the rows removed
+    """
+    deltas = bucket_deltas(added, removed)
+    totals = [
+        {'timeline_id': timeline_id, 'level': level, 'bucket': bucket, 'count': delta}
+        for (level, bucket, category), delta in deltas.items() if category is ALL_EVENTS
+    ]
+    categories = [
+        {'timeline_id': timeline_id, 'level': level, 'bucket': bucket, 'category': category, 'count': delta}
+        for (level, bucket, category), delta in deltas.items() if category is not ALL_EVENTS
+    ]
+    for table, rows in ((EventBucketTotal.__table__, totals), (EventBucket.__table__, categories)):
+        if not rows:
+            continue
+        db.session.execute(insert_increment(table, 'count'), rows)
+        emptied = [row for row in rows if row['count'] < 0]
+        if emptied:
+            keys = [column.name for column in table.primary_key.columns]
+            db.session.execute(
+                table.delete().where(*(table.c[key] == db.bindparam(key) for key in keys), table.c.count <= 0),
+                [{key: row[key] for key in keys} for row in emptied]
+            )
+
+def take_change_seqs(timeline_db: Timeline, count: int = 1) -> int:
+    """
+    Number the event rows and tombstones a timeline is about to write, for the change feed
+    
+    The counter is incremented in SQL, which holds the timeline row's lock
+    until the transaction ends, so numbers become visible in the order they
+    were taken: once a reader sees the counter at a value, every change
+    numbered up to it is committed.
+    
+    Args:
+        timeline_db: Timeline storing the rows
+        count: Number of rows to number
+        
+    Returns:
+        int: The first of count consecutive change numbers
+    """
+    # modified_at is left to touch_timeline
+    last = db.session.execute(
+        db.update(Timeline).where(Timeline.id == timeline_db.id)
+        .values(change_seq=Timeline.change_seq + count, modified_at=Timeline.modified_at)
+        .returning(Timeline.change_seq)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    db.session.expire(timeline_db, ['change_seq'])
+    return last - count + 1
+
+def widen_max_span(timeline_db: Timeline, spans: Iterable[Tuple[Optional[float], Optional[float]]]) -> None:
+    """
+    Raise a timeline's max_span to cover newly written event spans
+    
+    Args:
+        timeline_db: Timeline storing the events
+        spans: (date key, end key) of the events written
+    """
+    longest = max((end - start for start, end in spans if start is not None and end is not None and end > start),
+                  default=None)
+    if longest is None:
+        return
+    # Compared in SQL so concurrent writers can't lower each other's spans
+    db.session.execute(
+        db.update(Timeline).where(Timeline.id == timeline_db.id)
+        .values(max_span=db.case((db.or_(Timeline.max_span.is_(None), Timeline.max_span < longest), longest),
+                                 else_=Timeline.max_span),
+                modified_at=Timeline.modified_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.expire(timeline_db, ['max_span'])
+
+def refresh_max_span(timeline_id: int) -> None:
+    """Recompute a timeline's max_span from its event rows, in the current transaction"""
+    longest = db.session.execute(
+        db.select(db.func.max(Event.end_key - Event.date_key))
+        .where(Event.timeline_id == timeline_id, Event.end_key > Event.date_key)
+    ).scalar()
+    db.session.execute(
+        db.update(Timeline).where(Timeline.id == timeline_id).values(max_span=longest, modified_at=Timeline.modified_at)
+        .execution_options(synchronize_session=False)
+    )
+
+def insert_events(timeline_db: Timeline, rows: List[dict]) -> None:
+    """Insert event rows with a single executemany and link their labels"""
+    first_seq = take_change_seqs(timeline_db, len(rows))
+    for offset, row in enumerate(rows):
+        row['change_seq'] = first_seq + offset
+    event_ids = db.session.execute(
+        db.insert(Event).returning(Event.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    save_event_labels([
+        (event_id, filter(None, row['categories'].split(',')), filter(None, row['tags'].split(',')))
+        for event_id, row in zip(event_ids, rows)
+    ])
+    update_event_buckets(timeline_db.id, added=[
+        (row['date_key'], filter(None, row['categories'].split(','))) for row in rows
+    ])
+    widen_max_span(timeline_db, [(row['date_key'], row['end_key']) for row in rows])
+    touch_timeline(timeline_db, event_delta=len(rows))
+
+def save_timeline_event(timeline_db: Timeline, event: TimelineEvent, user_id: int,
+                        base_hash: Optional[str] = None) -> Event:
     """Convert TimelineEvent to database Event and save it"""
     event_db = Event(
         uuid=event.id,
         title=event.title,
         description=event.description,
         date=event.date,
+        date_key=event.date_key,
+        end_date=event.end_date,
+        end_key=event.end_key,
         categories=','.join(event.categories),
         tags=','.join(event.tags),
         timeline_id=timeline_db.id,
         created_by=user_id,
         created_at=event.created_at,
-        modified_at=event.modified_at
+        modified_at=event.modified_at,
+        base_hash=base_hash,
+        change_seq=take_change_seqs(timeline_db)
     )
     db.session.add(event_db)
+    db.session.flush()
+    save_event_labels([(event_db.id, event.categories, event.tags)])
+    update_event_buckets(timeline_db.id, added=[(event.date_key, event.categories)])
+    widen_max_span(timeline_db, [(event.date_key, event.end_key)])
     return event_db
 
+def update_timeline_event(timeline_db: Timeline, event_db: Event, event: TimelineEvent) -> None:
+    """
+    Save an edited event
+    
+    Rows inherited from an ancestor are left untouched and the edit is stored
+    as an override in the timeline, recording the version it replaced.
+    """
+    if event_db.timeline_id != timeline_db.id:
+        event.created_at = event_db.created_at
+        save_timeline_event(timeline_db, event, event_db.created_by,
+                            base_hash=event_from_db(event_db).content_hash())
+        return
+        
+    update_event_buckets(timeline_db.id, added=[(event.date_key, event.categories)], removed=[summary_entry(event_db)])
+    widen_max_span(timeline_db, [(event.date_key, event.end_key)])
+    event_db.title = event.title
+    event_db.description = event.description
+    event_db.date = event.date
+    event_db.date_key = event.date_key
+    event_db.end_date = event.end_date
+    event_db.end_key = event.end_key
+    event_db.categories = ','.join(event.categories)
+    event_db.tags = ','.join(event.tags)
+    save_event_labels([(event_db.id, event.categories, event.tags)], replace=True)
+    event_db.modified_at = datetime.utcnow()
+    event_db.change_seq = take_change_seqs(timeline_db)
+
+def delete_timeline_event(timeline_db: Timeline, event_db: Event, user_id: int) -> None:
+    """
+    Delete an event, leaving a tombstone for change feeds
+    
+    When the event is inherited from an ancestor, or overrides one, the
+    tombstone records the ancestor's version and keeps it hidden.
+    """
+    inherited = event_db.timeline_id != timeline_db.id
+    if inherited or event_db.base_hash:
+        base_hash = event_db.base_hash or event_from_db(event_db).content_hash()
+    else:
+        base_hash = None
+    db.session.add(EventTombstone(
+        timeline_id=timeline_db.id,
+        event_uuid=event_db.uuid,
+        base_hash=base_hash,
+        deleted_by=user_id,
+        change_seq=take_change_seqs(timeline_db)
+    ))
+    if not inherited:
+        delete_event_labels([event_db.id])
+        update_event_buckets(timeline_db.id, removed=[summary_entry(event_db)])
+        db.session.delete(event_db)
+
+def get_fork_changes(fork_db: Timeline) -> Tuple[List[EventChange], Dict[str, Event]]:
+    """
+    Diff a fork against its parent
+    
+    Only the rows and tombstones the fork stores can differ from the parent,
+    so the diff costs a few queries proportional to the fork's changes.
+    
+    Returns:
+        Tuple of the fork's changes and the parent's rows for the changed events, keyed by uuid
+    """
+    events_db = Event.query.filter_by(timeline_id=fork_db.id).all()
+    # Deletions of the fork's own events don't concern the parent
+    tombstones = EventTombstone.query.filter(
+        EventTombstone.timeline_id == fork_db.id, EventTombstone.base_hash.isnot(None)
+    ).all()
+    parent_db = db.session.get(Timeline, fork_db.parent_timeline_id)
+    parent_events_db = get_visible_events(
+        parent_db, [event_db.uuid for event_db in events_db] + [tombstone.event_uuid for tombstone in tombstones]
+    )
+    changes = diff_fork(
+        (event_from_db(event_db) for event_db in parent_events_db.values()),
+        ((event_from_db(event_db), event_db.base_hash) for event_db in events_db),
+        ((tombstone.event_uuid, tombstone.base_hash) for tombstone in tombstones)
+    )
+    return changes, parent_events_db
+
+def merge_fork(timeline_db: Timeline, fork_db: Timeline, user_id: int) -> Dict:
+    """
+    Apply a fork's changes to its parent with a three-way merge
+    
+    Changes the parent hasn't touched since the fork made them are applied
+    through the regular write checks. Changes that conflict with upstream
+    edits, or with overlapping spans, are reported and left in the fork.
+    Merged and already matching changes are dropped from the fork, which
+    inherits the same content from the parent afterwards.
+    
+    Args:
+        timeline_db: Parent timeline receiving the changes
+        fork_db: Direct fork of the parent
+        user_id: ID of the user performing the merge
+        
+    Returns:
+        dict: The applied changes, the conflicts and the number of changes already in sync
+        
+    Raises:
+        PermissionError: If the user can't edit the parent
+    """
+    changes, parent_events_db = get_fork_changes(fork_db)
+    apply, in_sync, conflicts = plan_merge(changes)
+    reported = [dict(change.to_dict(), reason='diverged') for change in conflicts]
+    applied = []
+    
+    for change in apply:
+        event_db = parent_events_db.get(change.event_id)
+        try:
+            if change.fork is None:
+                timeline = get_write_manager(timeline_db, user_id, [event_db])
+                timeline.delete_event(change.event_id, str(user_id))
+                delete_timeline_event(timeline_db, event_db, user_id)
+                touch_timeline(timeline_db, event_delta=-1, event_uuid=change.event_id)
+            else:
+                event = change.fork.replace()
+                if event_db is None:
+                    timeline = get_write_manager(timeline_db, user_id, event=event)
+                    timeline.add_event(event, str(user_id))
+                    save_timeline_event(timeline_db, event, int(change.fork.created_by))
+                    touch_timeline(timeline_db, event_delta=1, event_uuid=change.event_id)
+                else:
+                    timeline = get_write_manager(timeline_db, user_id, [event_db], event=event)
+                    timeline.edit_event(change.event_id, event, str(user_id))
+                    update_timeline_event(timeline_db, event_db, event)
+                    touch_timeline(timeline_db)
+        except EventConflictError as e:
+            reported.append(dict(change.to_dict(), reason='overlap', error=str(e)))
+            continue
+        applied.append(change)
+        
+    # The counts above skipped the fork because it still held these changes
+    merged = applied + in_sync
+    merged_events = [change.event_id for change in merged if change.fork is not None]
+    merged_deletions = [change.event_id for change in merged if change.fork is None]
+    if merged_events:
+        rows = db.session.execute(
+            db.select(Event.id, Event.date_key, Event.categories)
+            .where(Event.timeline_id == fork_db.id, Event.uuid.in_(merged_events))
+        ).all()
+        event_ids = [row.id for row in rows]
+        delete_event_labels(event_ids)
+        update_event_buckets(fork_db.id, removed=[summary_entry(row) for row in rows])
+        db.session.execute(db.delete(Event).where(Event.id.in_(event_ids)))
+    if merged_deletions:
+        db.session.execute(db.delete(EventTombstone).where(
+            EventTombstone.timeline_id == fork_db.id, EventTombstone.event_uuid.in_(merged_deletions)
+        ))
+        
+    return {
+        'fork_id': fork_db.id,
+        'applied': [change.to_dict() for change in applied],
+        'conflicts': reported,
+        'in_sync': len(in_sync)
+    }
+
+def get_change_seqs(timeline_db: Timeline, chain: List[Tuple[int, datetime]]) -> Dict[int, int]:
+    """Return the last change number taken by each timeline of a fork chain"""
+    if len(chain) == 1:
+        return {timeline_db.id: timeline_db.change_seq}
+    return dict(db.session.execute(
+        db.select(Timeline.id, Timeline.change_seq).where(Timeline.id.in_([timeline_id for timeline_id, _ in chain]))
+    ).all())
+
+def parse_change_cursor(cursor: str) -> Optional[Dict[int, int]]:
+    """
+    Parse a change feed cursor into the last change number delivered per timeline
+    
+    Returns:
+        dict: Change numbers by timeline ID, or None for a cursor of the
+        earlier timestamp format, which calls for a full resync
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        datetime.fromisoformat(cursor)
+        return None
+    except ValueError:
+        pass
+    seqs = {}
+    for part in cursor.split(','):
+        timeline_id, _, seq = part.partition(':')
+        seqs[int(timeline_id)] = int(seq)
+    return seqs
+
+def format_change_cursor(seqs: Dict[int, int]) -> str:
+    return ','.join(f'{timeline_id}:{seq}' for timeline_id, seq in seqs.items())
+
+def get_date_range(chain: List[Tuple[int, datetime]]) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Return the earliest and latest date keys stored along a fork chain
+    
+    Each bound is a separate lookup per timeline that the (timeline_id,
+    date_key) index answers directly. In forks the range can include
+    ancestor events the fork hides, which only adds empty bins at the ends.
+    """
+    bounds = [
+        db.select(function(Event.date_key)).where(Event.timeline_id == timeline_id).scalar_subquery()
+        for timeline_id, _ in chain for function in (db.func.min, db.func.max)
+    ]
+    values = db.session.execute(db.select(*bounds)).one()
+    starts = [value for value in values[0::2] if value is not None]
+    ends = [value for value in values[1::2] if value is not None]
+    return (min(starts), max(ends)) if starts else (None, None)
+
+def count_events_by_bin(chain: List[Tuple[int, datetime]], binning: Binning) -> BinCounts:
+    """
+    Count the events visible in a fork chain and their categories per bin
+    
+    Bins aligned to a level of the pyramid add up that level's buckets, so
+    the cost depends on the number of bins rather than on the number of
+    events. Forks add up the summaries of every timeline in the chain and
+    subtract the ancestor rows they override or delete, which costs a query
+    proportional to the changes forks store. Bins finer than the pyramid
+    are counted from the events in the range.
+    """
+    counts = BinCounts(binning)
+    timeline_ids = [timeline_id for timeline_id, _ in chain]
+    
+    if binning.level is None:
+        in_range = (Event.date_key >= binning.start, Event.date_key < binning.end)
+        offset = (Event.date_key - binning.start) / binning.width
+        # CAST truncates in SQLite, which is the floor of these non-negative offsets
+        index = db.cast(offset, db.Integer) if db.session.get_bind().dialect.name == 'sqlite' else db.func.floor(offset)
+        index = db.case((index >= binning.count, binning.count - 1), else_=index).label('bin')
+        visible = visible_events(chain)
+        for bin_index, total in db.session.execute(
+            db.select(index, db.func.count()).where(visible, *in_range).group_by(index)
+        ):
+            counts.add(bin_index, ALL_EVENTS, total)
+        for bin_index, name, total in db.session.execute(
+            db.select(index, Category.name, db.func.count())
+            .select_from(event_categories)
+            .join(Category, Category.id == event_categories.c.category_id)
+            .join(Event, Event.id == event_categories.c.event_id)
+            .where(visible, *in_range)
+            .group_by(index, Category.name)
+        ):
+            counts.add(bin_index, name, total)
+        return counts
+        
+    # Totals come back with a NULL category, which is ALL_EVENTS
+    for bucket, category, total in db.session.execute(db.union_all(
+        db.select(EventBucketTotal.bucket, db.null(), db.func.sum(EventBucketTotal.count))
+        .where(EventBucketTotal.timeline_id.in_(timeline_ids), EventBucketTotal.level == binning.level,
+               EventBucketTotal.bucket.between(binning.first_bucket, binning.last_bucket))
+        .group_by(EventBucketTotal.bucket),
+        db.select(EventBucket.bucket, EventBucket.category, db.func.sum(EventBucket.count))
+        .where(EventBucket.timeline_id.in_(timeline_ids), EventBucket.level == binning.level,
+               EventBucket.bucket.between(binning.first_bucket, binning.last_bucket))
+        .group_by(EventBucket.bucket, EventBucket.category)
+    )):
+        counts.add(binning.bin_of_bucket(bucket), category, total)
+        
+    if len(timeline_ids) > 1:
+        changed = (
+            db.select(Event.uuid).where(Event.timeline_id.in_(timeline_ids[:-1]))
+            .union(db.select(EventTombstone.event_uuid).where(EventTombstone.timeline_id.in_(timeline_ids[:-1])))
+        )
+        # Filtering the range here rather than in SQL keeps the lookup on the changed uuids' index
+        hidden = db.session.execute(
+            db.select(Event.date_key, Event.categories)
+            .where(Event.timeline_id.in_(timeline_ids[1:]), Event.uuid.in_(changed), db.not_(visible_events(chain)))
+        ).all()
+        counts.add_events([summary_entry(row) for row in hidden
+                           if row.date_key is not None and binning.start <= row.date_key < binning.end], sign=-1)
+    return counts
+
+def sample_events_by_bin(chain: List[Tuple[int, datetime]], binning: Binning, limit: int) -> Dict[int, List[Event]]:
+    """
+    Pick the earliest events visible in each bin as its representatives
+    
+    Bins are generated by a recursive CTE and each one is looked up with a
+    correlated query that walks the (timeline_id, date_key) index from the
+    bin's start, so only the picked events are read.
+    
+    Returns:
+        Dict[int, List[Event]]: Up to limit events per bin index, in date order
+    """
+    bins = db.select(db.literal(0).label('i')).cte('bins', recursive=True)
+    bins = bins.union_all(db.select(bins.c.i + 1).where(bins.c.i < binning.count - 1))
+    bin_start = binning.start + bins.c.i * binning.width
+    bin_end = db.case((bins.c.i == binning.count - 1, binning.end), else_=bin_start + binning.width)
+    picked = (
+        db.select(Event.id)
+        .where(visible_events(chain), Event.date_key >= bin_start, Event.date_key < bin_end)
+        .order_by(Event.date_key, Event.id)
+        .limit(limit)
+    )
+    sample = db.aliased(Event)
+    samples = {}
+    for bin_index, event_db in db.session.execute(
+        db.select(bins.c.i, sample).join(sample, sample.id.in_(picked)).order_by(bins.c.i, sample.date_key, sample.id)
+    ):
+        samples.setdefault(bin_index, []).append(event_db)
+    return samples
+
+def import_records(timeline_db: Timeline, user_id: int, records: Iterable[Tuple[int, Dict]], summary: Dict,
+                   on_batch: Optional[Callable[[], None]] = None) -> None:
+    """
+    Validate imported records and insert them in batches, committing each batch
+    
+    Rows that fail validation or conflict with existing spans are counted
+    and reported in the summary without stopping the import. Each batch is
+    checked against the stored spans it overlaps, which include the ones
+    imported by earlier batches, so memory use depends on the batch size
+    rather than on the size of the upload or the timeline.
+    
+    Args:
+        timeline_db: Timeline receiving the events
+        user_id: ID of the user importing them
+        records: (row number, record) pairs as parsed by utils.formats
+        summary: Counts of imported and failed rows and the reported errors,
+            updated as the import goes so it is accurate if a batch fails
+        on_batch: Called after each batch is committed
+        
+    Raises:
+        PermissionError: If the user can't add events to the timeline
+    """
+    timeline = get_write_manager(timeline_db, user_id)
+    if not timeline.can_edit(str(user_id)):
+        raise PermissionError("User does not have permission to add events")
+        
+    batch_size = current_app.config['IMPORT_BATCH_SIZE']
+    batch = []
+    for row_number, record in records:
+        try:
+            event = event_from_record(record)
+            timeline.compile_dates(event)
+        except TimelineError as e:
+            report_import_error(summary, row_number, e)
+            continue
+            
+        batch.append((row_number, event))
+        if len(batch) >= batch_size:
+            import_batch(timeline_db, user_id, batch, summary)
+            batch = []
+            if on_batch:
+                on_batch()
+                
+    if batch:
+        import_batch(timeline_db, user_id, batch, summary)
+        if on_batch:
+            on_batch()
+
+def import_batch(timeline_db: Timeline, user_id: int, batch: List[Tuple[int, TimelineEvent]], summary: Dict) -> None:
+    """Check a batch of imported events for conflicts, then insert and commit the ones that pass"""
+    # Point events never conflict, only the stored spans overlapping the batch's spans are needed
+    spans = [(event.date_key, event.end_key) for _, event in batch if event.has_span]
+    timeline = get_write_manager(timeline_db, user_id, get_overlapping_spans(timeline_db, spans) if spans else [])
+    rows = []
+    for row_number, event in batch:
+        if event.has_span:
+            try:
+                # Indexed as it is checked, so later rows of the batch are checked against it
+                timeline.add_event(event, str(user_id))
+            except TimelineError as e:
+                report_import_error(summary, row_number, e)
+                continue
+        rows.append(event_row(timeline_db, event, user_id))
+        
+    if rows:
+        insert_events(timeline_db, rows)
+        db.session.commit()
+        summary['imported'] += len(rows)
+    # Conflicts are found after the batch's other errors, keep the report in row order
+    summary['errors'].sort(key=lambda error: error['row'])
+
+def report_import_error(summary: Dict, row_number: int, error: Exception) -> None:
+    """Count a rejected import row, reporting its error until the reported errors reach their limit"""
+    summary['failed'] += 1
+    if len(summary['errors']) < current_app.config['IMPORT_MAX_REPORTED_ERRORS']:
+        summary['errors'].append({'row': row_number, 'error': str(error)})
+
+def export_chunks(chain: List[Tuple[int, datetime]], export_format: str, compress: bool,
+                  on_event: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    Encode the events visible in a timeline for export, in date order
+    
+    Plain rows are streamed through a server-side cursor instead of loading
+    ORM objects, so memory use doesn't grow with the timeline.
+    
+    Args:
+        chain: Fork chain of the timeline, as returned by get_fork_chain
+        export_format: 'ndjson' or 'csv'
+        compress: Whether to gzip the output
+        on_event: Called with the number of events read so far as they are read
+    """
+    query = (
+        db.select(*Event.__table__.columns)
+        .where(visible_events(chain))
+        .order_by(Event.date_key.asc().nulls_last(), Event.id)
+        .execution_options(yield_per=current_app.config['EXPORT_YIELD_PER'])
+    )
+    
+    def events():
+        for count, row in enumerate(db.session.execute(query), start=1):
+            if on_event:
+                on_event(count)
+            yield event_from_db(row)
+            
+    chunks = iter_csv_chunks(events()) if export_format == 'csv' else iter_ndjson_chunks(events())
+    return gzip_chunks(chunks) if compress else chunks
+
+def export_filename(timeline_id: int, export_format: str, compress: bool) -> str:
+    return f'timeline-{timeline_id}.{export_format}' + ('.gz' if compress else '')
+
+def export_mimetype(export_format: str, compress: bool) -> str:
+    if compress:
+        return 'application/gzip'
+    return 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+
+def own_event_batches(timeline_id: int, *columns) -> Iterator[List]:
+    """
+    Read columns of the event rows a timeline stores, in batches
+    
+    The rows' IDs are read up front and each batch is looked up by primary
+    key, so batches can be committed in between and none of them rescans
+    the timeline.
+    """
+    event_ids = db.session.execute(
+        db.select(Event.id).where(Event.timeline_id == timeline_id).order_by(Event.id)
+    ).scalars().all()
+    batch_size = current_app.config['REINDEX_BATCH_SIZE']
+    for start in range(0, len(event_ids), batch_size):
+        yield db.session.execute(db.select(*columns).where(Event.id.in_(event_ids[start:start + batch_size]))).all()
+
+def rebuild_event_buckets(timeline_id: int) -> None:
+    """Recount a timeline's zoom-level summary from its event rows, in the current transaction"""
+    db.session.execute(db.delete(EventBucketTotal).where(EventBucketTotal.timeline_id == timeline_id))
+    db.session.execute(db.delete(EventBucket).where(EventBucket.timeline_id == timeline_id))
+    entries = []
+    for rows in own_event_batches(timeline_id, Event.date_key, Event.categories):
+        entries.extend(summary_entry(row) for row in rows)
+    # Counted in one go so each bucket is written once
+    update_event_buckets(timeline_id, added=entries)
+
+def reindex_timeline(timeline_db: Timeline, progress: Optional[JobProgress] = None) -> Dict:
+    """
+    Recompile the date keys of a timeline's own event rows and rebuild its zoom-level summary and max_span
+    
+    Keys are compiled when events are written, so they go stale when a
+    dating system's parsing changes. Rows are rechecked in batches, each
+    committed on its own, and only rows whose keys changed are updated.
+    Forks only reindex the rows they store, their ancestors' rows are
+    reindexed with the ancestors.
+    
+    Args:
+        timeline_db: Timeline to reindex
+        progress: Receives the number of rows checked out of the total
+        
+    Returns:
+        dict: Number of rows checked and of rows whose keys changed
+    """
+    dating = get_timeline_dating_system(timeline_db)
+    total = db.session.execute(
+        db.select(db.func.count()).select_from(Event).where(Event.timeline_id == timeline_db.id)
+    ).scalar()
+    table = Event.__table__
+    rekey = (
+        table.update()
+        .where(table.c.id == db.bindparam('event_id'))
+        .values(date_key=db.bindparam('new_date_key'), end_key=db.bindparam('new_end_key'), modified_at=db.bindparam('now'),
+                change_seq=db.bindparam('new_change_seq'))
+    )
+    
+    checked = rekeyed = 0
+    for rows in own_event_batches(timeline_db.id, Event.id, Event.date, Event.date_key, Event.end_date, Event.end_key):
+        now = datetime.utcnow()
+        changes = []
+        for row in rows:
+            date_key = dating.parse(row.date)
+            end_key = dating.parse(row.end_date) if row.end_date else None
+            if date_key != row.date_key or end_key != row.end_key:
+                changes.append({'event_id': row.id, 'new_date_key': date_key, 'new_end_key': end_key, 'now': now})
+        if changes:
+            first_seq = take_change_seqs(timeline_db, len(changes))
+            for offset, change in enumerate(changes):
+                change['new_change_seq'] = first_seq + offset
+            db.session.execute(rekey, changes)
+            db.session.commit()
+        checked += len(rows)
+        rekeyed += len(changes)
+        if progress:
+            progress.update(checked, total)
+            
+    # Recounting in a single transaction keeps concurrent writes from being counted twice or lost
+    rebuild_event_buckets(timeline_db.id)
+    refresh_max_span(timeline_db.id)
+    touch_timeline(timeline_db)
+    db.session.commit()
+    return {'events': checked, 'rekeyed': rekeyed}
+
+# Background jobs
+# Handlers by job kind, with whether a job whose worker died can safely be run again
+JOB_HANDLERS: Dict[str, Tuple[Callable, bool]] = {}
+
+def job_handler(kind: str, retry: bool = True):
+    """
+    Register the function running jobs of a kind
+    
+    Handlers are called with the Job row, its decoded payload and a
+    JobProgress, and return the JSON-serializable result of the job. They
+    report failures by raising JobError, TimelineError or PermissionError.
+    Handlers that aren't idempotent must be registered with retry=False.
+    """
+    def register(handler):
+        JOB_HANDLERS[kind] = (handler, retry)
+        return handler
+    return register
+
+def job_directory(name: str) -> str:
+    """Return a subdirectory of JOBS_DIR, creating it if needed"""
+    path = os.path.join(current_app.config['JOBS_DIR'], name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def enqueue_job(kind: str, user_id: int, timeline_id: Optional[int] = None, payload: Optional[Dict] = None,
+                run_after: Optional[datetime] = None) -> Job:
+    """Add a job to the queue, it is run once the caller commits and, if given, run_after has passed"""
+    job = Job(kind=kind, user_id=user_id, timeline_id=timeline_id, payload=json.dumps(payload or {}), run_after=run_after)
+    db.session.add(job)
+    return job
+
+def prefers_async() -> bool:
+    """Whether the client asked for a 202 and a job instead of waiting (RFC 7240 Prefer: respond-async)"""
+    preferences = request.headers.get('Prefer', '')
+    return any(preference.split(';')[0].strip().lower() == 'respond-async' for preference in preferences.split(','))
+
+def job_to_dict(job: Job) -> Dict:
+    """Describe a job to its owner"""
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'timeline_id': job.timeline_id,
+        'progress': {'done': job.progress, 'total': job.total},
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+    if job.kind == 'export' and job.status == SUCCEEDED:
+        data['result_url'] = url_for('main.download_job_result', job_id=job.id)
+    return data
+
+def job_accepted(job: Job) -> Response:
+    """Respond to a request whose work was queued as a job, pointing at the job's status"""
+    response = jsonify(job_to_dict(job))
+    response.status_code = 202
+    response.headers['Location'] = url_for('main.get_job', job_id=job.id)
+    if prefers_async():
+        response.headers['Preference-Applied'] = 'respond-async'
+    return response
+
+def claim_job(worker: str) -> Optional[int]:
+    """
+    Claim the oldest queued job for a worker
+    
+    The claim is an UPDATE conditioned on the job still being queued, so
+    when workers race for a job only one of them gets it. When the queue is
+    empty, jobs whose worker stopped sending heartbeats are requeued first.
+    
+    Returns:
+        int: ID of the claimed job, or None if there is nothing to run
+    """
+    while True:
+        job_id = db.session.execute(
+            db.select(Job.id)
+            .where(Job.status == QUEUED, db.or_(Job.run_after.is_(None), Job.run_after <= datetime.utcnow()))
+            .order_by(Job.id)
+            .limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.rollback()
+            if requeue_stale_jobs():
+                continue
+            return None
+            
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            db.update(Job).where(Job.id == job_id, Job.status == QUEUED)
+            .values(status=RUNNING, worker=worker, attempts=Job.attempts + 1, started_at=now, heartbeat_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+
+def requeue_stale_jobs() -> int:
+    """
+    Requeue running jobs whose worker stopped sending heartbeats
+    
+    Jobs that can't safely be run again, or that ran out of attempts, are
+    failed instead.
+    
+    Returns:
+        int: Number of jobs requeued
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['JOB_STALE_AFTER'])
+    stale = db.and_(Job.status == RUNNING, Job.heartbeat_at < cutoff)
+    retryable = [kind for kind, (_, retry) in JOB_HANDLERS.items() if retry]
+    requeued = db.session.execute(
+        db.update(Job)
+        .where(stale, Job.kind.in_(retryable), Job.attempts < current_app.config['JOB_MAX_ATTEMPTS'])
+        .values(status=QUEUED, worker=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.execute(
+        db.update(Job).where(stale)
+        .values(status=FAILED, error='The worker running the job stopped', finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return requeued
+
+def record_job_progress(job_id: int, done: int, total: Optional[int]) -> None:
+    # Written on a connection of its own so the job's transaction is left alone
+    with db.engine.begin() as connection:
+        connection.execute(
+            db.update(Job).where(Job.id == job_id)
+            .values(progress=done, total=total, heartbeat_at=datetime.utcnow())
+        )
+
+def record_job_heartbeats(job_ids: Set[int]) -> None:
+    with db.engine.begin() as connection:
+        connection.execute(
+            db.update(Job).where(Job.id.in_(job_ids), Job.status == RUNNING).values(heartbeat_at=datetime.utcnow())
+        )
+
+def run_job(job_id: int) -> None:
+    """
+    Run a claimed job and record its outcome
+    
+    Failures are recorded on the job rather than raised. Unexpected errors
+    are logged and shown to the job's owner as an internal error.
+    """
+    job = db.session.get(Job, job_id)
+    progress = JobProgress(lambda done, total: record_job_progress(job_id, done, total))
+    result = error = None
+    try:
+        if job.kind not in JOB_HANDLERS:
+            raise JobError(f'Unknown job kind: {job.kind}')
+        handler, _ = JOB_HANDLERS[job.kind]
+        result = handler(job, json.loads(job.payload or '{}'), progress)
+    except JobError as e:
+        db.session.rollback()
+        if e.__cause__ is not None:
+            current_app.logger.error('Job %s failed', job_id, exc_info=e.__cause__)
+        error, result = str(e), e.result
+    except (TimelineError, PermissionError) as e:
+        db.session.rollback()
+        error = str(e)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Job %s failed', job_id)
+        error = 'Internal server error'
+        
+    db.session.execute(
+        db.update(Job).where(Job.id == job_id)
+        .values(
+            status=FAILED if error else SUCCEEDED,
+            result=json.dumps(result) if result is not None else None,
+            error=error,
+            progress=progress.done,
+            total=progress.total,
+            finished_at=datetime.utcnow()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+def prune_jobs(retention_days: float) -> int:
+    """
+    Delete finished jobs older than the retention period, along with their files
+    
+    Returns:
+        int: Number of jobs deleted
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    pruned = 0
+    while True:
+        jobs = db.session.execute(
+            db.select(Job.id, Job.payload)
+            .where(Job.status.in_([SUCCEEDED, FAILED]), Job.finished_at < cutoff)
+            .limit(500)
+        ).all()
+        if not jobs:
+            return pruned
+        for _, payload in jobs:
+            path = json.loads(payload or '{}').get('path')
+            if path and os.path.exists(path):
+                os.remove(path)
+        db.session.execute(db.delete(Job).where(Job.id.in_([job_id for job_id, _ in jobs])))
+        db.session.commit()
+        pruned += len(jobs)
+
+def get_job_timeline(job: Job) -> Timeline:
+    timeline_db = db.session.get(Timeline, job.timeline_id)
+    if timeline_db is None:
+        raise JobError('Timeline not found')
+    return timeline_db
+
+@job_handler('import', retry=False)
+def run_import_job(job: Job, payload: Dict, progress: JobProgress) -> Dict:
+    """Import the events of an upload saved by import_events, reporting progress in bytes read"""
+    summary = {'imported': 0, 'failed': 0, 'errors': []}
+    try:
+        timeline_db = get_job_timeline(job)
+        with open(payload['path'], 'rb') as upload:
+            size = os.fstat(upload.fileno()).st_size
+            records = iter_csv_records(upload) if payload['csv'] else iter_ndjson_records(upload)
+            # The parser closes the file once it reaches the end
+            import_records(timeline_db, job.user_id, records, summary,
+                           on_batch=lambda: progress.update(size if upload.closed else upload.tell(), size))
+            progress.update(size, size, force=True)
+    except (JobError, TimelineError):
+        raise
+    except Exception as e:
+        raise JobError('Internal server error', summary) from e
+    finally:
+        if os.path.exists(payload['path']):
+            os.remove(payload['path'])
+    return summary
+
+@job_handler('export')
+def run_export_job(job: Job, payload: Dict, progress: JobProgress) -> Dict:
+    """Write a timeline's export to the file served by download_job_result, reporting progress in events"""
+    timeline_db = get_job_timeline(job)
+    total = timeline_db.event_count
+    
+    def on_event(count):
+        if count % 1000 == 0:
+            progress.update(count, total)
+    
+    # Written under a temporary name so a partial file is never served
+    partial = payload['path'] + '.part'
+    try:
+        with open(partial, 'wb') as output:
+            for chunk in export_chunks(get_fork_chain(timeline_db), payload['format'], payload['gzip'], on_event):
+                output.write(chunk)
+        os.replace(partial, payload['path'])
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    progress.update(total, total, force=True)
+    return {'filename': payload['filename'], 'size': os.path.getsize(payload['path'])}
+
+@job_handler('reindex')
+def run_reindex_job(job: Job, payload: Dict, progress: JobProgress) -> Dict:
+    timeline_db = get_job_timeline(job)
+    if not get_write_manager(timeline_db, job.user_id).can_edit(str(job.user_id)):
+        raise PermissionError("User does not have permission to reindex this timeline")
+    return reindex_timeline(timeline_db, progress)
+
+# Snapshots
+def get_snapshot_store() -> Optional[SnapshotStore]:
+    """Return the configured snapshot store, created on first use, or None if snapshots are off"""
+    config = current_app.config
+    if not config['SNAPSHOT_STORE']:
+        return None
+    store = current_app.extensions.get('snapshots')
+    if store is None:
+        if config['SNAPSHOT_STORE'] == 's3':
+            store = S3SnapshotStore(
+                config['SNAPSHOT_BUCKET'],
+                prefix=config['SNAPSHOT_PREFIX'],
+                base_url=config['SNAPSHOT_BASE_URL'],
+                url_ttl=config['SNAPSHOT_URL_TTL'],
+                endpoint_url=config['SNAPSHOT_ENDPOINT_URL']
+            )
+        else:
+            store = LocalSnapshotStore(config['SNAPSHOT_DIR'], base_url=config['SNAPSHOT_BASE_URL'])
+        current_app.extensions['snapshots'] = store
+    return store
+
+def schedule_snapshot(timeline_db: Timeline, postpone: bool = True) -> bool:
+    """
+    Queue a job rendering a timeline's snapshot, debounced
+    
+    The job runs SNAPSHOT_DEBOUNCE seconds after it is queued. Writes made
+    while it waits postpone it, so a burst of edits is rendered once, but
+    never past SNAPSHOT_MAX_DELAY after the job was queued.
+    
+    Args:
+        timeline_db: Timeline whose snapshot is out of date
+        postpone: Whether to push back a job that is already waiting
+        
+    Returns:
+        bool: Whether a new job was queued
+    """
+    config = current_app.config
+    if not config['SNAPSHOT_STORE']:
+        return False
+    run_after = datetime.utcnow() + timedelta(seconds=config['SNAPSHOT_DEBOUNCE'])
+    job = db.session.execute(
+        db.select(Job).where(Job.timeline_id == timeline_db.id, Job.status == QUEUED, Job.kind == 'snapshot').limit(1)
+    ).scalar()
+    if job is None:
+        enqueue_job('snapshot', timeline_db.user_id, timeline_db.id, run_after=run_after)
+        return True
+    if postpone:
+        job.run_after = min(run_after, job.created_at + timedelta(seconds=config['SNAPSHOT_MAX_DELAY']))
+    return False
+
+def get_snapshot_key(timeline_db: Timeline, chain: List[Tuple[int, datetime]]) -> Optional[str]:
+    """
+    Return the key of a timeline's snapshot if it is of the timeline's current version
+    
+    Snapshots are keyed by content, and the timeline records the version
+    its latest one was rendered from, so checking costs no queries. A
+    snapshot is queued when the current one is out of date, which also
+    covers forks whose ancestors changed and timelines never snapshotted.
+    """
+    if not current_app.config['SNAPSHOT_STORE']:
+        return None
+    if timeline_db.snapshot_key and timeline_db.snapshot_version == timeline_validators(timeline_db, chain)[0]:
+        return timeline_db.snapshot_key
+    try:
+        if schedule_snapshot(timeline_db, postpone=False):
+            db.session.commit()
+    except Exception:
+        # Reads are answered from the database meanwhile, they mustn't fail over a missed snapshot
+        db.session.rollback()
+        current_app.logger.warning('Snapshot of timeline %s could not be scheduled', timeline_db.id, exc_info=True)
+    return None
+
+def read_snapshot(key: str) -> Optional[bytes]:
+    """Return a snapshot's gzipped bytes, or None if the store can't provide them"""
+    try:
+        with span('snapshot'):
+            return get_snapshot_store().get(key)
+    except Exception:
+        current_app.logger.warning('Snapshot %s could not be read', key, exc_info=True)
+        return None
+
+@job_handler('snapshot')
+def run_snapshot_job(job: Job, payload: Dict, progress: JobProgress) -> Dict:
+    """Render a timeline's JSON to the snapshot store and point the timeline at it"""
+    store = get_snapshot_store()
+    if store is None:
+        raise JobError('Snapshots are not enabled')
+    timeline_db = get_job_timeline(job)
+    chain = get_fork_chain(timeline_db)
+    # Computed before the timeline is read, so the snapshot is never older than the version it is recorded as
+    version = timeline_validators(timeline_db, chain)[0]
+    if timeline_db.snapshot_version == version:
+        return {'key': timeline_db.snapshot_key, 'version': version}
+        
+    key, data = render_snapshot(get_cached_timeline(timeline_db, chain).payload)
+    if not store.exists(key):
+        store.put(key, data)
+    # Setting modified_at to itself keeps its onupdate from marking the timeline as changed
+    db.session.execute(
+        db.update(Timeline).where(Timeline.id == timeline_db.id)
+        .values(snapshot_key=key, snapshot_version=version, modified_at=Timeline.modified_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return {'key': key, 'version': version, 'size': len(data)}
+
 # Routes
-@app.route('/')
+@bp.route('/')
 def index():
-    featured_timelines = Timeline.query.limit(6).all()
+    featured_timelines = Timeline.query.options(db.joinedload(Timeline.author)).limit(6).all()
     return render_template('index.html', featured_timelines=featured_timelines)
 
-@app.route('/explore')
+@bp.route('/explore')
 def explore():
-    timelines = Timeline.query.all()
-    return render_template('explore.html', timelines=timelines)
+    # Keyset pagination over ids, newest first, so deep pages cost the same as the first
+    page_size = current_app.config['EXPLORE_PAGE_SIZE']
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    query = Timeline.query.options(db.joinedload(Timeline.author))
+    
+    if before is not None:
+        timelines = query.filter(Timeline.id > before).order_by(Timeline.id.asc()).limit(page_size + 1).all()
+        has_previous = len(timelines) > page_size
+        timelines = timelines[:page_size][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            query = query.filter(Timeline.id < after)
+        timelines = query.order_by(Timeline.id.desc()).limit(page_size + 1).all()
+        has_next = len(timelines) > page_size
+        timelines = timelines[:page_size]
+        has_previous = after is not None
+        
+    # Edit badges for the whole page come from one batched permission lookup
+    permissions = get_permissions([timeline.id for timeline in timelines], current_user.id) \
+        if current_user.is_authenticated and timelines else {}
+        
+    return render_template(
+        'explore.html',
+        timelines=timelines,
+        permissions=permissions,
+        previous_cursor=timelines[0].id if timelines and has_previous else None,
+        next_cursor=timelines[-1].id if timelines and has_next else None
+    )
+
+@bp.route('/api/permissions', methods=['GET'])
+@login_required
+def list_permissions():
+    try:
+        timeline_ids = [int(timeline_id) for timeline_id in request.args.get('timeline_ids', '').split(',') if timeline_id]
+    except ValueError:
+        return jsonify({'error': 'timeline_ids must be a comma-separated list of IDs'}), 400
+    if len(timeline_ids) > current_app.config['PERMISSIONS_MAX_TIMELINES']:
+        return jsonify({'error': f"At most {current_app.config['PERMISSIONS_MAX_TIMELINES']} timelines per request"}), 400
+        
+    permissions = get_permissions(timeline_ids, current_user.id)
+    return jsonify({'permissions': {
+        str(timeline_id): {
+            'permission': permission.value if permission else None,
+            'can_edit': permission in (Permission.EDIT, Permission.ADMIN)
+        }
+        for timeline_id, permission in permissions.items()
+    }})
 
-@app.route('/timeline/<int:timeline_id>')
+@bp.route('/timeline/<int:timeline_id>')
 def view_timeline(timeline_id):
     timeline_db = Timeline.query.get_or_404(timeline_id)
-    timeline = get_timeline_manager(timeline_db)
-    return render_template('timeline.html', timeline=timeline_db, timeline_data=timeline.to_dict())
+    chain = get_fork_chain(timeline_db)
+    validators = timeline_validators(timeline_db, chain, per_user=True)
+    not_modified = not_modified_response(validators)
+    if not_modified:
+        return not_modified
+        
+    key = get_snapshot_key(timeline_db, chain)
+    snapshot = read_snapshot(key) if key else None
+    if snapshot is not None:
+        timeline_json = gzip.decompress(snapshot)
+    else:
+        timeline_json = get_cached_timeline(timeline_db, chain).payload
+    return add_validators(
+        current_app.make_response(render_template('timeline.html', timeline=timeline_db,
+                                          timeline_json=Markup(timeline_json.decode('utf-8')))),
+        validators
+    )
 
-@app.route('/create', methods=['GET', 'POST'])
+@bp.route('/api/timeline/<int:timeline_id>', methods=['GET'])
+def get_timeline(timeline_id):
+    timeline_db = Timeline.query.get_or_404(timeline_id)
+    chain = get_fork_chain(timeline_db)
+    validators = timeline_validators(timeline_db, chain)
+    not_modified = not_modified_response(validators)
+    if not_modified:
+        return not_modified
+        
+    key = get_snapshot_key(timeline_db, chain)
+    if key:
+        url = get_snapshot_store().url(key)
+        if url:
+            # The snapshot's URL changes with its content, so the redirect itself must not be cached
+            response = redirect(url)
+            response.cache_control.no_cache = True
+            return response
+        snapshot = read_snapshot(key)
+        if snapshot is not None:
+            if 'gzip' in request.accept_encodings:
+                response = Response(snapshot, mimetype='application/json', headers={'Content-Encoding': 'gzip'})
+            else:
+                response = Response(gzip.decompress(snapshot), mimetype='application/json')
+            response.vary.add('Accept-Encoding')
+            return add_validators(response, validators)
+            
+    cached = get_cached_timeline(timeline_db, chain)
+    return add_validators(Response(cached.payload, mimetype='application/json'), validators)
+
+@bp.route('/create', methods=['GET', 'POST'])
 @login_required
 def create_timeline():
     if request.method == 'POST':
+        try:
+            era_table = parse_era_table(request.form.get('era_table', ''))
+        except ValueError as e:
+            flash(str(e), 'error')
+            return render_template('create.html')
+            
         timeline = Timeline(
             title=request.form['title'],
             description=request.form['description'],
             dating_system=request.form.get('dating_system', 'CE'),
+            era_table=json.dumps(era_table) if era_table else None,
             user_id=current_user.id
         )
         db.session.add(timeline)
         db.session.commit()
         flash('Timeline created successfully!', 'success')
-        return redirect(url_for('view_timeline', timeline_id=timeline.id))
+        return redirect(url_for('main.view_timeline', timeline_id=timeline.id))
     return render_template('create.html')
 
-@app.route('/api/timeline/<int:timeline_id>/events', methods=['POST'])
+@bp.route('/api/timeline/<int:timeline_id>/events', methods=['GET'])
+def list_events(timeline_id):
+    timeline_db = Timeline.query.get_or_404(timeline_id)
+    chain = get_fork_chain(timeline_db)
+    validators = timeline_validators(timeline_db, chain)
+    not_modified = not_modified_response(validators)
+    if not_modified:
+        return not_modified
+        
+    dating = get_timeline_dating_system(timeline_db)
+    query = Event.query.filter(visible_events(chain))
+    
+    try:
+        start = parse_date_arg(dating, 'from')
+        end = parse_date_arg(dating, 'to')
+    except TimelineError as e:
+        return jsonify({'error': str(e)}), 400
+        
+    if start is not None:
+        query = query.filter(Event.date_key >= start)
+    if end is not None:
+        query = query.filter(Event.date_key <= end)
+    if request.args.get('tags'):
+        query = filter_by_labels(query, Tag, event_tags, event_tags.c.tag_id,
+                                 request.args['tags'].split(','), request.args.get('tags_match') == 'all')
+    if request.args.get('categories'):
+        query = filter_by_labels(query, Category, event_categories, event_categories.c.category_id,
+                                 request.args['categories'].split(','), request.args.get('categories_match') == 'all')
+        
+    events_db = query.order_by(Event.date_key.asc().nulls_last(), Event.id).all()
+    with span('serialize'):
+        events = serialize_events((event_from_db(event_db) for event_db in events_db), event_fragments)
+    return add_validators(Response(b'{"events":' + events + b'}', mimetype='application/json'), validators)
+
+@bp.route('/api/timeline/<int:timeline_id>/changes', methods=['GET'])
+def list_changes(timeline_id):
+    timeline_db = Timeline.query.get_or_404(timeline_id)
+    chain = get_fork_chain(timeline_db)
+    validators = timeline_validators(timeline_db, chain)
+    not_modified = not_modified_response(validators)
+    if not_modified:
+        return not_modified
+    limit = min(max(request.args.get('limit', current_app.config['CHANGES_MAX_PER_PAGE'], type=int), 1),
+                current_app.config['CHANGES_MAX_PER_PAGE'])
+    
+    # Read before the changes themselves, so every change numbered up to these is already committed
+    until = get_change_seqs(timeline_db, chain)
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = parse_change_cursor(since)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    cursor = {timeline_id: (since or {}).get(timeline_id, 0) for timeline_id, _ in chain}
+    
+    # Each timeline of the chain numbers its own rows, and its changes are paged in that order
+    visible = visible_events(chain)
+    events_db, deleted_uuids = [], []
+    for timeline_id, _ in chain:
+        after = cursor[timeline_id]
+        if after >= until[timeline_id] or len(events_db) + len(deleted_uuids) >= limit:
+            continue
+        remaining = limit - len(events_db) - len(deleted_uuids)
+        changes = [
+            (event_db.change_seq, event_db) for event_db in Event.query.filter(
+                visible, Event.timeline_id == timeline_id,
+                Event.change_seq > after, Event.change_seq <= until[timeline_id]
+            ).order_by(Event.change_seq).limit(remaining + 1)
+        ]
+        if since is not None:
+            changes.extend(db.session.execute(
+                db.select(EventTombstone.change_seq, EventTombstone.event_uuid).where(
+                    EventTombstone.timeline_id == timeline_id,
+                    EventTombstone.change_seq > after, EventTombstone.change_seq <= until[timeline_id]
+                ).order_by(EventTombstone.change_seq).limit(remaining + 1)
+            ).all())
+        changes.sort(key=lambda change: change[0])
+        if len(changes) > remaining:
+            changes = changes[:remaining]
+            cursor[timeline_id] = changes[-1][0]
+        else:
+            cursor[timeline_id] = until[timeline_id]
+        for _, change in changes:
+            if isinstance(change, str):
+                deleted_uuids.append(change)
+            else:
+                events_db.append(change)
+                
+    if len(chain) > 1 and deleted_uuids:
+        # A fork sees its ancestors' deletions unless it has its own version of the event
+        still_visible = get_visible_events(timeline_db, deleted_uuids)
+        deleted_uuids = [event_uuid for event_uuid in deleted_uuids if event_uuid not in still_visible]
+        
+    return add_validators(jsonify({
+        'upserts': [event_from_db(event_db).to_dict() for event_db in events_db],
+        'deletions': sorted(set(deleted_uuids)),
+        'cursor': format_change_cursor(cursor),
+        'more': any(cursor[timeline_id] < until[timeline_id] for timeline_id, _ in chain),
+        'full': since is None
+    }), validators)
+
+@bp.route('/api/timeline/<int:timeline_id>/facets', methods=['GET'])
+def event_facets(timeline_id):
+    timeline_db = Timeline.query.get_or_404(timeline_id)
+    chain = get_fork_chain(timeline_db)
+    validators = timeline_validators(timeline_db, chain)
+    not_modified = not_modified_response(validators)
+    if not_modified:
+        return not_modified
+    visible = visible_events(chain)
+    
+    facets = {}
+    for name, model, table, column in (('categories', Category, event_categories, event_categories.c.category_id),
+                                       ('tags', Tag, event_tags, event_tags.c.tag_id)):
+        counts = db.session.execute(
+            db.select(model.name, db.func.count())
+            .select_from(table)
+            .join(model, model.id == column)
+            .join(Event, Event.id == table.c.event_id)
+            .where(visible)
+            .group_by(model.name)
+            .order_by(db.func.count().desc(), model.name)
+        ).all()
+        facets[name] = dict(counts)
+    return add_validators(jsonify(facets), validators)
+
+@bp.route('/api/timeline/<int:timeline_id>/aggregate', methods=['GET'])
+def aggregate_events(timeline_id):
+    timeline_db = Timeline.query.get_or_404(timeline_id)
+    chain = get_fork_chain(timeline_db)
+    validators = timeline_validators(timeline_db, chain)
+    not_modified = not_modified_response(validators)
+    if not_modified:
+        return not_modified
+        
+    bins = request.args.get('bins', 100, type=int)
+    top = request.args.get('categories', 3, type=int)
+    per_bin = request.args.get('events', 1, type=int)
+    if not 1 <= bins <= current_app.config['AGGREGATE_MAX_BINS']:
+        return jsonify({'error': f"bins must be between 1 and {current_app.config['AGGREGATE_MAX_BINS']}"}), 400
+    if not 0 <= per_bin <= current_app.config['AGGREGATE_MAX_EVENTS_PER_BIN']:
+        return jsonify({'error': f"events must be between 0 and {current_app.config['AGGREGATE_MAX_EVENTS_PER_BIN']}"}), 400
+    if top < 0:
+        return jsonify({'error': 'categories must not be negative'}), 400
+        
+    dating = get_timeline_dating_system(timeline_db)
+    try:
+        start = parse_date_arg(dating, 'from')
+        end = parse_date_arg(dating, 'to')
+    except TimelineError as e:
+        return jsonify({'error': str(e)}), 400
+    if start is None or end is None:
+        first, last = get_date_range(chain)
+        start = first if start is None else start
+        end = last if end is None else end
+    if start is None or end is None:
+        return add_validators(jsonify({'level': None, 'bins': []}), validators)
+    if end < start:
+        return jsonify({'error': 'The range ends before it starts'}), 400
+        
+    binning = plan_bins(start, end, bins)
+    counts = count_events_by_bin(chain, binning)
+    samples = sample_events_by_bin(chain, binning, per_bin) if per_bin else {}
+    result = []
+    for index in range(binning.count):
+        bin_start, bin_end = binning.bounds(index)
+        result.append({
+            'start': bin_start,
+            'end': bin_end,
+            'count': counts.events[index],
+            'categories': counts.top_categories(index, top),
+            'events': [event_from_db(event_db).to_dict() for event_db in samples.get(index, [])]
+        })
+    return add_validators(jsonify({'level': binning.level, 'bins': result}), validators)
+
+@bp.route('/api/search', methods=['GET'])
+def search():
+    query = fts_query(request.args.get('q', ''))
+    if query is None:
+        return jsonify({'error': 'Missing search query'}), 400
+    if db.engine.dialect.name != 'sqlite':
+        return jsonify({'error': 'Search requires the SQLite FTS5 backend'}), 501
+        
+    timeline_id = request.args.get('timeline_id', type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), current_app.config['SEARCH_MAX_PER_PAGE'])
+    params = {'query': query, 'limit': per_page, 'start': SNIPPET_START, 'end': SNIPPET_END}
+    
+    # Titles weigh more than descriptions in the bm25 ranking
+    event_fts = db.table('event_fts', db.column('rowid'))
+    fts_row = db.literal_column('event_fts')  # The table name stands for the matched row in FTS5 functions
+    matches = (
+        db.select(Event.uuid, Event.timeline_id, Event.title, Event.date,
+                  db.func.snippet(fts_row, -1, SNIPPET_START, SNIPPET_END, '…', 16).label('snippet'))
+        .select_from(event_fts)
+        .join(Event, Event.id == event_fts.c.rowid)
+        .where(fts_row.op('MATCH')(query))
+        .order_by(db.func.bm25(fts_row, 10.0, 1.0))
+        .limit(per_page + 1)
+        .offset((page - 1) * per_page)
+    )
+    if timeline_id is not None:
+        # Scoped searches see a fork's inherited events, not the versions it replaced
+        matches = matches.where(visible_events(get_fork_chain(Timeline.query.get_or_404(timeline_id))))
+    rows = db.session.execute(matches).all()
+    results = {
+        'events': [
+            {'id': row.uuid, 'timeline_id': row.timeline_id, 'title': row.title,
+             'date': row.date, 'snippet': render_snippet(row.snippet)}
+            for row in rows[:per_page]
+        ],
+        'page': page,
+        'per_page': per_page,
+        'has_more': len(rows) > per_page
+    }
+    
+    if timeline_id is None and page == 1:
+        timelines = db.session.execute(db.text("""
+            SELECT timeline.id, timeline.title,
+                   snippet(timeline_fts, -1, :start, :end, '…', 16) AS snippet
+            FROM timeline_fts JOIN timeline ON timeline.id = timeline_fts.rowid
+            WHERE timeline_fts MATCH :query
+            ORDER BY bm25(timeline_fts, 10.0, 1.0)
+            LIMIT :limit
+        """), params).all()
+        results['timelines'] = [
+            {'id': row.id, 'title': row.title, 'snippet': render_snippet(row.snippet)}
+            for row in timelines
+        ]
+        
+    return jsonify(results)
+
+@bp.route('/api/timeline/<int:timeline_id>/events', methods=['POST'])
 @login_required
 def add_event(timeline_id):
     timeline_db = Timeline.query.get_or_404(timeline_id)
-    timeline = get_timeline_manager(timeline_db)
     
     try:
         event = TimelineEvent(
@@ -167,12 +2266,15 @@ def add_event(timeline_id):
             title=request.json['title'],
             description=request.json['description'],
             date=request.json['date'],
-            categories=set(request.json.get('categories', [])),
-            tags=set(request.json.get('tags', []))
+            end_date=request.json.get('end_date'),
+            categories=parse_labels(request.json.get('categories'), 'categories'),
+            tags=parse_labels(request.json.get('tags'), 'tags')
         )
         
+        timeline = get_write_manager(timeline_db, current_user.id, event=event)
         timeline.add_event(event, str(current_user.id))
         event_db = save_timeline_event(timeline_db, event, current_user.id)
+        touch_timeline(timeline_db, event_delta=1)
         db.session.commit()
         
         return jsonify(event.to_dict()), 201
@@ -183,16 +2285,87 @@ def add_event(timeline_id):
         db.session.rollback()
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/timeline/<int:timeline_id>/events/<string:event_uuid>', methods=['PUT', 'DELETE'])
+@bp.route('/api/timeline/<int:timeline_id>/events/import', methods=['POST'])
+@login_required
+def import_events(timeline_id):
+    timeline_db = Timeline.query.get_or_404(timeline_id)
+    csv_upload = request.args.get('format', request.mimetype) in ('csv', 'text/csv')
+    
+    if prefers_async():
+        if not get_write_manager(timeline_db, current_user.id).can_edit(str(current_user.id)):
+            return jsonify({'error': 'User does not have permission to add events'}), 403
+        # The upload is saved as is and parsed by the worker
+        path = os.path.join(job_directory('uploads'), uuid.uuid4().hex + ('.csv' if csv_upload else '.ndjson'))
+        with open(path, 'wb') as upload:
+            shutil.copyfileobj(request.stream, upload, 1024 * 1024)
+        job = enqueue_job('import', current_user.id, timeline_db.id, {'path': path, 'csv': csv_upload})
+        db.session.commit()
+        return job_accepted(job)
+        
+    stream = io.BufferedReader(request.stream)
+    records = iter_csv_records(stream) if csv_upload else iter_ndjson_records(stream)
+    summary = {'imported': 0, 'failed': 0, 'errors': []}
+    try:
+        import_records(timeline_db, current_user.id, records, summary)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Internal server error', 'imported': summary['imported']}), 500
+        
+    return jsonify(summary)
+
+@bp.route('/api/timeline/<int:timeline_id>/export', methods=['GET'])
+def export_timeline(timeline_id):
+    timeline_db = Timeline.query.get_or_404(timeline_id)
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': f'Unsupported export format: {export_format}'}), 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    filename = export_filename(timeline_db.id, export_format, compress)
+    
+    if prefers_async():
+        if not current_user.is_authenticated:
+            return jsonify({'error': 'Log in to export in the background'}), 401
+        path = os.path.join(job_directory('exports'), f'{uuid.uuid4().hex}-{filename}')
+        job = enqueue_job('export', current_user.id, timeline_db.id, {
+            'format': export_format, 'gzip': compress, 'filename': filename, 'path': path
+        })
+        db.session.commit()
+        return job_accepted(job)
+    
+    chain = get_fork_chain(timeline_db)
+    validators = timeline_validators(timeline_db, chain)
+    not_modified = not_modified_response(validators)
+    if not_modified:
+        return not_modified
+    
+    def generate():
+        yield from export_chunks(chain, export_format, compress)
+        
+    return add_validators(Response(
+        stream_with_context(generate()),
+        mimetype=export_mimetype(export_format, compress),
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    ), validators)
+
+@bp.route('/api/timeline/<int:timeline_id>/events/<string:event_uuid>', methods=['PUT', 'DELETE'])
 @login_required
 def manage_event(timeline_id, event_uuid):
     timeline_db = Timeline.query.get_or_404(timeline_id)
-    timeline = get_timeline_manager(timeline_db)
+    if timeline_db.parent_timeline_id is None:
+        event_db = Event.query.filter_by(timeline_id=timeline_id, uuid=event_uuid).first()
+    else:
+        # Forks write overrides and tombstones instead of changing their ancestors' rows
+        event_db = get_visible_event(timeline_db, event_uuid)
     
     try:
         if request.method == 'DELETE':
+            timeline = get_write_manager(timeline_db, current_user.id, [event_db] if event_db else [])
             timeline.delete_event(event_uuid, str(current_user.id))
-            Event.query.filter_by(uuid=event_uuid).delete()
+            if event_db:
+                delete_timeline_event(timeline_db, event_db, current_user.id)
+            touch_timeline(timeline_db, event_delta=-1 if event_db else 0, event_uuid=event_uuid)
             db.session.commit()
             return '', 204
             
@@ -202,18 +2375,15 @@ def manage_event(timeline_id, event_uuid):
                 title=request.json['title'],
                 description=request.json['description'],
                 date=request.json['date'],
-                categories=set(request.json.get('categories', [])),
-                tags=set(request.json.get('tags', []))
+                end_date=request.json.get('end_date'),
+                categories=parse_labels(request.json.get('categories'), 'categories'),
+                tags=parse_labels(request.json.get('tags'), 'tags')
             )
             
+            timeline = get_write_manager(timeline_db, current_user.id, [event_db] if event_db else [], event=event)
             timeline.edit_event(event_uuid, event, str(current_user.id))
-            event_db = Event.query.filter_by(uuid=event_uuid).first_or_404()
-            event_db.title = event.title
-            event_db.description = event.description
-            event_db.date = event.date
-            event_db.categories = ','.join(event.categories)
-            event_db.tags = ','.join(event.tags)
-            event_db.modified_at = datetime.utcnow()
+            update_timeline_event(timeline_db, event_db, event)
+            touch_timeline(timeline_db)
             db.session.commit()
             
             return jsonify(event.to_dict())
@@ -224,11 +2394,28 @@ def manage_event(timeline_id, event_uuid):
         db.session.rollback()
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/timeline/<int:timeline_id>/collaborators', methods=['POST', 'DELETE'])
+@bp.route('/api/timeline/<int:timeline_id>/conflicts', methods=['GET'])
+def list_conflicts(timeline_id):
+    timeline_db = Timeline.query.get_or_404(timeline_id)
+    chain = get_fork_chain(timeline_db)
+    validators = timeline_validators(timeline_db, chain)
+    not_modified = not_modified_response(validators)
+    if not_modified:
+        return not_modified
+        
+    timeline = get_cached_timeline(timeline_db, chain).timeline
+    
+    conflicts = [
+        {'events': [first.id, second.id], 'tags': sorted(first.tags & second.tags)}
+        for first, second in timeline.find_all_conflicts()
+    ]
+    return add_validators(jsonify({'conflicts': conflicts}), validators)
+
+@bp.route('/api/timeline/<int:timeline_id>/collaborators', methods=['POST', 'DELETE'])
 @login_required
 def manage_collaborators(timeline_id):
     timeline_db = Timeline.query.get_or_404(timeline_id)
-    timeline = get_timeline_manager(timeline_db)
+    timeline = get_write_manager(timeline_db, current_user.id)
     
     try:
         if request.method == 'POST':
@@ -237,13 +2424,18 @@ def manage_collaborators(timeline_id):
             
             timeline.add_collaborator(str(user_id), permission, str(current_user.id))
             
-            collab = TimelineCollaborator(
-                timeline_id=timeline_id,
-                user_id=user_id,
-                permission=permission.value
-            )
-            db.session.add(collab)
+            collab = TimelineCollaborator.query.filter_by(timeline_id=timeline_id, user_id=user_id).first()
+            if collab:
+                collab.permission = permission.value
+            else:
+                db.session.add(TimelineCollaborator(
+                    timeline_id=timeline_id,
+                    user_id=user_id,
+                    permission=permission.value
+                ))
+            touch_timeline(timeline_db)
             db.session.commit()
+            invalidate_permissions(timeline_id)
             
             return jsonify({'status': 'success'}), 201
             
@@ -255,7 +2447,9 @@ def manage_collaborators(timeline_id):
                 timeline_id=timeline_id,
                 user_id=user_id
             ).delete()
+            touch_timeline(timeline_db)
             db.session.commit()
+            invalidate_permissions(timeline_id)
             
             return '', 204
             
@@ -265,30 +2459,24 @@ def manage_collaborators(timeline_id):
         db.session.rollback()
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/timeline/<int:timeline_id>/fork', methods=['POST'])
+@bp.route('/api/timeline/<int:timeline_id>/fork', methods=['POST'])
 @login_required
 def fork_timeline(timeline_id):
     timeline_db = Timeline.query.get_or_404(timeline_id)
-    timeline = get_timeline_manager(timeline_db)
     
     try:
-        forked_timeline = timeline.fork(str(current_user.id))
-        
+        # The fork inherits its events through parent_timeline_id, so nothing is copied
         new_timeline_db = Timeline(
-            uuid=forked_timeline.id,
-            title=forked_timeline.title,
-            description=forked_timeline.description,
-            dating_system=forked_timeline.dating_system,
+            title=f"Fork of {timeline_db.title}",
+            description=timeline_db.description,
+            dating_system=timeline_db.dating_system,
+            era_table=timeline_db.era_table,
             user_id=current_user.id,
-            parent_timeline_id=timeline_id
+            parent_timeline_id=timeline_id,
+            forked_at=datetime.utcnow(),
+            event_count=timeline_db.event_count
         )
         db.session.add(new_timeline_db)
-        db.session.flush()  # Get the new timeline_id
-        
-        # Copy events
-        for event in forked_timeline.events:
-            save_timeline_event(new_timeline_db, event, current_user.id)
-            
         db.session.commit()
         return jsonify({'timeline_id': new_timeline_db.id}), 201
         
@@ -296,35 +2484,127 @@ def fork_timeline(timeline_id):
         db.session.rollback()
         return jsonify({'error': 'Internal server error'}), 500
 
+@bp.route('/api/timeline/<int:timeline_id>/diff', methods=['GET'])
+def diff_timeline(timeline_id):
+    timeline_db = Timeline.query.get_or_404(timeline_id)
+    if timeline_db.parent_timeline_id is None:
+        return jsonify({'error': 'Timeline is not a fork'}), 400
+    validators = timeline_validators(timeline_db, get_fork_chain(timeline_db))
+    not_modified = not_modified_response(validators)
+    if not_modified:
+        return not_modified
+        
+    changes, _ = get_fork_changes(timeline_db)
+    changes = [change for change in changes if change.diverged]
+    _, _, conflicts = plan_merge(changes)
+    summary = {status: 0 for status in ('added', 'modified', 'deleted')}
+    for change in changes:
+        summary[change.status] += 1
+    summary['conflicts'] = len(conflicts)
+    
+    return add_validators(jsonify({
+        'timeline_id': timeline_db.id,
+        'parent_timeline_id': timeline_db.parent_timeline_id,
+        'forked_at': timeline_db.forked_at.isoformat() if timeline_db.forked_at else None,
+        'summary': summary,
+        'changes': [change.to_dict() for change in changes]
+    }), validators)
+
+@bp.route('/api/timeline/<int:timeline_id>/merge', methods=['POST'])
+@login_required
+def merge_forks(timeline_id):
+    timeline_db = Timeline.query.get_or_404(timeline_id)
+    fork_ids = request.json.get('forks', [])
+    dry_run = bool(request.json.get('dry_run', False))
+    
+    if not get_write_manager(timeline_db, current_user.id).can_edit(str(current_user.id)):
+        return jsonify({'error': 'User does not have permission to merge into this timeline'}), 403
+    forks_db = {fork_db.id: fork_db for fork_db in Timeline.query.filter(Timeline.id.in_(fork_ids))}
+    for fork_id in fork_ids:
+        if fork_id not in forks_db or forks_db[fork_id].parent_timeline_id != timeline_db.id:
+            return jsonify({'error': f'Timeline {fork_id} is not a fork of this timeline'}), 400
+            
+    try:
+        # Forks are merged in the order given, each against the result of the previous ones
+        results = [merge_fork(timeline_db, forks_db[fork_id], current_user.id) for fork_id in fork_ids]
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        return jsonify({'dry_run': dry_run, 'forks': results})
+        
+    except (TimelineError, PermissionError) as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 403
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/api/timeline/<int:timeline_id>/reindex', methods=['POST'])
+@login_required
+def reindex_events(timeline_id):
+    timeline_db = Timeline.query.get_or_404(timeline_id)
+    if not get_write_manager(timeline_db, current_user.id).can_edit(str(current_user.id)):
+        return jsonify({'error': 'User does not have permission to reindex this timeline'}), 403
+    job = enqueue_job('reindex', current_user.id, timeline_db.id)
+    db.session.commit()
+    return job_accepted(job)
+
+@bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_to_dict(job))
+
+@bp.route('/api/jobs/<int:job_id>/result', methods=['GET'])
+@login_required
+def download_job_result(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or job.user_id != current_user.id or job.kind != 'export':
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status != SUCCEEDED:
+        return jsonify({'error': 'Export is not ready'}), 409
+    payload = json.loads(job.payload)
+    if not os.path.exists(payload['path']):
+        return jsonify({'error': 'Export is no longer available'}), 410
+    return send_file(
+        payload['path'],
+        mimetype=export_mimetype(payload['format'], payload['gzip']),
+        as_attachment=True,
+        download_name=payload['filename']
+    )
+
 # Authentication routes
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
         
     if request.method == 'POST':
         user = User.query.filter_by(email=request.form['email']).first()
         if user and check_password_hash(user.password_hash, request.form['password']):
             login_user(user, remember=True)
             next_page = request.args.get('next')
-            return redirect(next_page if next_page else url_for('index'))
+            return redirect(next_page if next_page else url_for('main.index'))
         flash('Invalid email or password', 'error')
     
     return render_template('auth/login.html')
 
-@app.route('/signup', methods=['GET', 'POST'])
+@bp.route('/signup', methods=['GET', 'POST'])
 def signup():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
         
     if request.method == 'POST':
         if User.query.filter_by(email=request.form['email']).first():
             flash('Email already registered', 'error')
-            return redirect(url_for('signup'))
+            return redirect(url_for('main.signup'))
             
         if User.query.filter_by(username=request.form['username']).first():
             flash('Username already taken', 'error')
-            return redirect(url_for('signup'))
+            return redirect(url_for('main.signup'))
             
         user = User(
             username=request.form['username'],
@@ -336,32 +2616,71 @@ def signup():
         
         login_user(user)
         flash('Account created successfully!', 'success')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
         
     return render_template('auth/signup.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 # Error handlers
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
 
-# Create database tables
-with app.app_context():
-    # Drop all tables first
-    db.drop_all()
-    # Create all tables with the latest schema
-    db.create_all()
+# Command line
+jobs_cli = AppGroup('jobs', help='Run and manage background jobs.')
+
+@jobs_cli.command('work')
+@click.option('--threads', type=int, default=None, help='Jobs run at the same time (default JOB_WORKER_THREADS).')
+@click.option('--once', is_flag=True, help='Exit once the queue is empty instead of waiting for more jobs.')
+def work_jobs_command(threads, once):
+    """Run queued jobs until interrupted.
+    
+    Any number of workers, on any host sharing the database and JOBS_DIR,
+    can run at once. Interrupting a worker lets its running jobs finish.
+    """
+    import signal
+    app = current_app._get_current_object()
+    name = worker_name()
+    
+    def claim():
+        return claim_job(name)
+        
+    def run(job_id):
+        with app.app_context():
+            run_job(job_id)
+            
+    def heartbeat(job_ids):
+        with app.app_context():
+            record_job_heartbeats(job_ids)
+            
+    worker = JobWorker(
+        claim, run, heartbeat,
+        threads=threads or app.config['JOB_WORKER_THREADS'],
+        poll_interval=app.config['JOB_POLL_INTERVAL'],
+        heartbeat_interval=app.config['JOB_HEARTBEAT_INTERVAL']
+    )
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *args: worker.stop())
+    click.echo(f'Worker {name} running jobs on {worker.threads} threads')
+    count = worker.run(once=once)
+    click.echo(f'Ran {count} jobs')
+
+@jobs_cli.command('prune')
+@click.option('--days', type=float, default=None, help='Keep jobs finished this recently (default JOB_RETENTION_DAYS).')
+def prune_jobs_command(days):
+    """Delete old finished jobs and their files."""
+    count = prune_jobs(current_app.config['JOB_RETENTION_DAYS'] if days is None else days)
+    click.echo(f'Deleted {count} jobs')
 
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    create_app().run(debug=True) 
\ No newline at end of file
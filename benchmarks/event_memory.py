@@ -0,0 +1,111 @@
+"""
+Memory benchmark for hydrated timeline events.
+
+Builds the same events with the slotted Event and with a plain dataclass
+laid out like the previous implementation, and reports the memory each
+representation holds per event.
+
+Usage: python benchmarks/event_memory.py [number of events]
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+import gc
+import os
+import random
+import sys
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.timeline import Event
+
+
+@dataclass
+class DictEvent:
+    """The previous Event layout: a regular dataclass with per-instance sets and datetimes"""
+    id: str
+    title: str
+    description: str
+    date: str
+    categories: Set[str] = field(default_factory=set)
+    tags: Set[str] = field(default_factory=set)
+    created_by: str = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    modified_at: datetime = field(default_factory=datetime.utcnow)
+    date_key: Optional[float] = None
+    end_date: Optional[str] = None
+    end_key: Optional[float] = None
+
+
+def make_rows(count: int) -> List[dict]:
+    """Generate event rows shaped like database rows, with a realistic spread of labels"""
+    random.seed(0)
+    tags = [f'character-{i}' for i in range(200)]
+    categories = ['battle', 'birth', 'death', 'treaty', 'journey', 'discovery']
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        created = start + timedelta(seconds=i)
+        rows.append({
+            'uuid': str(uuid.uuid4()),
+            'title': f'Event {i}',
+            'description': '',
+            'date': str(1000 + i // 10),
+            'date_key': 1000.0 + i // 10,
+            # Labels arrive as comma-separated strings, as they are stored in the event table
+            'categories': random.choice(categories),
+            'tags': ','.join(sorted(random.sample(tags[:20], 2))) if i % 3 else random.choice(tags),
+            'created_by': str(1 + i % 5),
+            'created_at': created,
+            'modified_at': created
+        })
+    return rows
+
+
+def measure(build, rows: List[dict]) -> int:
+    """Return the bytes still allocated after building events from rows"""
+    gc.collect()
+    tracemalloc.start()
+    events = [build(row) for row in rows]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del events
+    return size
+
+
+def build_slotted(row: dict) -> Event:
+    return Event(
+        id=row['uuid'], title=row['title'], description=row['description'], date=row['date'],
+        categories=row['categories'].split(','), tags=row['tags'].split(','),
+        created_by=str(row['created_by']), created_at=row['created_at'], modified_at=row['modified_at'],
+        date_key=row['date_key']
+    )
+
+
+def build_dict(row: dict) -> DictEvent:
+    return DictEvent(
+        id=row['uuid'], title=row['title'], description=row['description'], date=row['date'],
+        categories=set(row['categories'].split(',')), tags=set(row['tags'].split(',')),
+        created_by=str(row['created_by']),
+        # Database drivers return a new datetime object per row
+        created_at=row['created_at'] + timedelta(0), modified_at=row['modified_at'] + timedelta(0),
+        date_key=row['date_key']
+    )
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = make_rows(count)
+    before = measure(build_dict, rows)
+    after = measure(build_slotted, rows)
+    print(f'{count} events')
+    print(f'dataclass events: {before / 2**20:8.1f} MiB ({before / count:6.0f} bytes/event)')
+    print(f'slotted events:   {after / 2**20:8.1f} MiB ({after / count:6.0f} bytes/event)')
+    print(f'saved:            {(before - after) / 2**20:8.1f} MiB ({100 * (before - after) / before:.0f}%)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Serialization benchmark for hydrated timelines.
+
+Compares encoding Timeline.to_dict() with the standard library against
+the fragment-splicing serializer, both with a cold fragment cache and
+after one event changed.
+
+Usage: python benchmarks/serialize_timeline.py [number of events]
+"""
+
+from datetime import datetime, timedelta
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import serializer
+from utils.serializer import EventFragmentCache, serialize_timeline
+from utils.timeline import Event, Timeline
+
+
+def make_timeline(count: int) -> Timeline:
+    start = datetime(2024, 1, 1)
+    events = [
+        Event(id=str(uuid.uuid4()), title=f'Event {i}', description='A short description of what happened',
+              date=str(1000 + i // 10), categories=['battle'], tags=[f'character-{i % 50}', 'war'],
+              created_by='1', created_at=start + timedelta(seconds=i), modified_at=start + timedelta(seconds=i))
+        for i in range(count)
+    ]
+    return Timeline(id=str(uuid.uuid4()), title='Benchmark', description='', dating_system='CE',
+                    events=events, owner_id='1')
+
+
+def best_of(runs: int, fn) -> float:
+    """Return the fastest of several runs, in milliseconds"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    timeline = make_timeline(count)
+    fragments = EventFragmentCache(max_entries=count)
+
+    baseline = best_of(3, lambda: json.dumps(timeline.to_dict()))
+    cold = best_of(1, lambda: serialize_timeline(timeline, fragments))
+    # Edit one event and serialize again, as happens after every write
+    event = next(timeline.iter_events_by_date())
+    timeline.edit_event(event.id, event.replace(title='Edited'), '1')
+    warm = best_of(3, lambda: serialize_timeline(timeline, fragments))
+
+    print(f'{count} events, backend: {"orjson" if serializer.orjson else "json"}')
+    print(f'json.dumps(to_dict()):     {baseline:8.1f} ms')
+    print(f'fragments, cold cache:     {cold:8.1f} ms')
+    print(f'fragments, one event new:  {warm:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
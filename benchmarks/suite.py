@@ -0,0 +1,420 @@
+"""
+Benchmark suite for the timeline model and the Flask routes.
+
+Seeds an in-memory SQLite database with synthetic timelines of each size,
+a deep chain of forks with overrides and deletions at every level, many
+collaborators and a page's worth of other timelines for the explore page.
+Every case is then run repeatedly to record latency percentiles, once under
+tracemalloc for its peak memory, and once while counting SQL statements.
+Routes go through the Flask test client.
+
+Usage:
+    python benchmarks/suite.py [--sizes 1000,10000,100000] [--filter TEXT]
+    python benchmarks/suite.py --save-baseline
+    python benchmarks/suite.py --threshold 0.5
+
+Results are compared with benchmarks/baseline.json, and the script exits
+with status 1 if a case issues more queries than it did or its peak memory
+grew by more than the threshold. Both are the same from run to run. Timings
+are not, so they are only reported: each is scaled by a calibration case
+run in the same process, and slowdowns beyond the threshold are listed
+without failing the run.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event as sa_event
+from werkzeug.security import generate_password_hash
+
+import app as application
+from app import create_app, db, Timeline, TimelineCollaborator, User
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+FORK_DEPTH = 6
+FORK_CHANGES = 20  # Overrides per fork level, plus a quarter as many deletions
+COLLABORATORS = 200
+EXPLORE_TIMELINES = 100
+MIN_RUNS = 5
+MAX_RUNS = 50
+MIN_SECONDS = 1.0
+CALIBRATION = 'calibration'  # Pure Python work that scales the baseline timings to this machine and its load
+
+
+@dataclass
+class Case:
+    """One measured operation, with untimed setup run before every repetition"""
+    name: str
+    run: Callable[[], object]
+    setup: Optional[Callable[[], None]] = None
+
+
+class Bench:
+    """Application, database and clients shared by the benchmark cases"""
+
+    def __init__(self):
+        self.app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'TESTING': True,
+            'SNAPSHOT_DIR': tempfile.mkdtemp(),
+            'SNAPSHOT_DEBOUNCE': 0,
+            # Users stay cached for the whole run, so query counts don't depend on how long it has been going
+            'USER_CACHE_TTL': float('inf')
+        }, migrations=False)
+        self.app.logger.setLevel(logging.CRITICAL)
+        with self.app.app_context():
+            db.create_all()
+            self.engine = db.engine
+            owner = User(username='owner', email='owner@example.com', password_hash=generate_password_hash('secret'))
+            db.session.add(owner)
+            db.session.commit()
+            self.owner_id = owner.id
+        self.owner = self.client_for(self.owner_id)
+        self.anonymous = self.app.test_client()
+
+    def client_for(self, user_id: int):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+
+    def create_timeline(self, title: str) -> int:
+        with self.app.app_context():
+            timeline = Timeline(title=title, description='Synthetic timeline', dating_system='CE', user_id=self.owner_id)
+            db.session.add(timeline)
+            db.session.commit()
+            return timeline.id
+
+    def request(self, client, method: str, path: str, expected: int = 200, **kwargs):
+        response = client.open(path, method=method, **kwargs)
+        if response.status_code != expected:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        response.get_data()
+        return response
+
+
+def synthetic_events(count: int) -> bytes:
+    """NDJSON for events spread over two millennia, with spans, categories and tags"""
+    lines = []
+    for i in range(count):
+        year = 1 + i * 2000 // count
+        record = {
+            'title': f'Event {i}',
+            'description': f'Synthetic event number {i} in a long running saga',
+            'date': str(year),
+            'categories': [('battle', 'council', 'journey', 'birth', 'death')[i % 5]],
+            'tags': [f'character-{i % 97}', f'place-{i % 31}']
+        }
+        if i % 10 == 0:
+            record['end_date'] = str(year + 1)
+        lines.append(json.dumps(record))
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def seed_timeline(bench: Bench, size: int) -> Dict:
+    """Create a timeline with size events, collaborators and a chain of forks"""
+    timeline_id = bench.create_timeline(f'Saga of {size} events')
+    response = bench.request(bench.owner, 'POST', f'/api/timeline/{timeline_id}/events/import',
+                             data=synthetic_events(size), content_type='application/x-ndjson')
+    if response.json['failed']:
+        raise RuntimeError(f"Seeding failed: {response.json['errors'][:3]}")
+
+    with bench.app.app_context():
+        users = [User(username=f'collaborator-{size}-{i}', email=f'collaborator-{size}-{i}@example.com', password_hash='')
+                 for i in range(COLLABORATORS)]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add_all(TimelineCollaborator(timeline_id=timeline_id, user_id=user.id, permission=('view', 'edit')[i % 2])
+                           for i, user in enumerate(users))
+        db.session.commit()
+        collaborator_id = users[1].id
+
+    events = bench.request(bench.anonymous, 'GET', f'/api/timeline/{timeline_id}/events').json['events']
+    forks = []
+    parent_id = timeline_id
+    for depth in range(FORK_DEPTH):
+        parent_id = bench.request(bench.owner, 'POST', f'/api/timeline/{parent_id}/fork', expected=201).json['timeline_id']
+        forks.append(parent_id)
+        for i in range(FORK_CHANGES):
+            # Overrides come from the first half and deletions from the end, so they never collide
+            event = events[(depth * FORK_CHANGES + i) * (len(events) // 2) // (FORK_DEPTH * FORK_CHANGES)]
+            bench.request(bench.owner, 'PUT', f'/api/timeline/{parent_id}/events/{event["id"]}', json=dict(
+                event, title=f'{event["title"]} (fork {depth})'))
+        for i in range(FORK_CHANGES // 4):
+            event = events[-(depth * FORK_CHANGES + i + 1)]
+            bench.request(bench.owner, 'DELETE', f'/api/timeline/{parent_id}/events/{event["id"]}', expected=204)
+
+    return {
+        'timeline_id': timeline_id,
+        'forks': forks,
+        'collaborator': bench.client_for(collaborator_id),
+        'middle_year': 1000
+    }
+
+
+def calibration_case() -> Case:
+    """Parse and serialize a fixed batch of events, the interpreter work most cases spend their time on"""
+    lines = synthetic_events(2000).splitlines()
+    return Case(CALIBRATION, lambda: json.dumps(sorted((json.loads(line) for line in lines), key=lambda record: record['title'])))
+
+
+def timeline_cases(bench: Bench, size: int) -> List[Case]:
+    seeded = seed_timeline(bench, size)
+    timeline_id = seeded['timeline_id']
+    fork_id = seeded['forks'][-1]
+    base = f'/api/timeline/{timeline_id}'
+    fork = f'/api/timeline/{fork_id}'
+    year = seeded['middle_year']
+    state = {}
+
+    def hydrate(target_id):
+        with bench.app.app_context():
+            return application.get_timeline_manager(db.session.get(Timeline, target_id))
+
+    def build_manager():
+        state['manager'] = hydrate(timeline_id)
+
+    def clear_caches():
+        application.timeline_cache.clear()
+        application.event_fragments.clear()
+
+    def snapshots(enabled):
+        # Only the snapshot case uses them, other writes would otherwise queue snapshot jobs
+        bench.app.config['SNAPSHOT_STORE'] = 'local' if enabled else ''
+
+    def render_snapshot():
+        if 'snapshot' in state:
+            return
+        snapshots(True)
+        try:
+            with bench.app.app_context():
+                application.enqueue_job('snapshot', bench.owner_id, timeline_id)
+                db.session.commit()
+                application.run_job(application.claim_job('benchmark'))
+        finally:
+            snapshots(False)
+        state['snapshot'] = True
+
+    def read_snapshot():
+        snapshots(True)
+        try:
+            return bench.request(bench.anonymous, 'GET', base, headers={'Accept-Encoding': 'gzip'})
+        finally:
+            snapshots(False)
+
+    def add_event():
+        bench.request(seeded['collaborator'], 'POST', f'{base}/events', expected=201, json={
+            'title': 'Benchmark event', 'description': 'Added during the benchmark', 'date': str(year + 3)
+        })
+
+    return [
+        Case(f'model/hydrate/{size}', lambda: hydrate(timeline_id)),
+        Case(f'model/hydrate_fork_depth_{FORK_DEPTH}/{size}', lambda: hydrate(fork_id)),
+        Case(f'model/to_dict/{size}', lambda: state['manager'].to_dict(), setup=lambda: state.get('manager') or build_manager()),
+        Case(f'model/fork/{size}', lambda: state['manager'].fork('2'), setup=lambda: state.get('manager') or build_manager()),
+        Case(f'route/timeline_cold/{size}', lambda: bench.request(bench.anonymous, 'GET', base), setup=clear_caches),
+        Case(f'route/timeline_warm/{size}', lambda: bench.request(bench.anonymous, 'GET', base)),
+        Case(f'route/timeline_snapshot/{size}', read_snapshot, setup=render_snapshot),
+        Case(f'route/fork_timeline_cold/{size}', lambda: bench.request(bench.anonymous, 'GET', fork), setup=clear_caches),
+        Case(f'route/events_range/{size}', lambda: bench.request(bench.anonymous, 'GET', f'{base}/events?from={year}&to={year + 20}')),
+        Case(f'route/fork_events_range/{size}', lambda: bench.request(bench.anonymous, 'GET', f'{fork}/events?from={year}&to={year + 20}')),
+        Case(f'route/facets/{size}', lambda: bench.request(bench.anonymous, 'GET', f'{base}/facets')),
+        Case(f'route/aggregate/{size}', lambda: bench.request(bench.anonymous, 'GET', f'{base}/aggregate?bins=200')),
+        Case(f'route/fork_aggregate/{size}', lambda: bench.request(bench.anonymous, 'GET', f'{fork}/aggregate?bins=200')),
+        Case(f'route/aggregate_zoomed/{size}', lambda: bench.request(bench.anonymous, 'GET', f'{base}/aggregate?from={year}&to={year + 20}&bins=200')),
+        Case(f'route/search/{size}', lambda: bench.request(bench.anonymous, 'GET', f'/api/search?q=saga+even&timeline_id={timeline_id}')),
+        Case(f'route/fork_diff/{size}', lambda: bench.request(bench.anonymous, 'GET', f'{fork}/diff')),
+        Case(f'route/add_event/{size}', add_event),
+        Case(f'route/fork/{size}', lambda: bench.request(bench.owner, 'POST', f'{base}/fork', expected=201)),
+    ]
+
+
+def global_cases(bench: Bench) -> List[Case]:
+    timeline_ids = [bench.create_timeline(f'Explore {i}') for i in range(EXPLORE_TIMELINES)]
+    ids = ','.join(str(timeline_id) for timeline_id in timeline_ids[:100])
+    return [
+        Case('route/explore', lambda: bench.request(bench.owner, 'GET', '/explore')),
+        Case('route/explore_deep_page', lambda: bench.request(bench.owner, 'GET', f'/explore?after={timeline_ids[10]}')),
+        Case('route/permissions_100', lambda: bench.request(bench.owner, 'GET', f'/api/permissions?timeline_ids={ids}'),
+             setup=application.permission_cache.clear),
+    ]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def measure(bench: Bench, case: Case) -> Dict:
+    """Run a case repeatedly and return its latency percentiles, peak memory and query count"""
+    def once():
+        if case.setup:
+            case.setup()
+        # Like timeit, keep garbage collection pauses out of the timings
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            case.run()
+            return time.perf_counter() - start
+        finally:
+            gc.enable()
+
+    # Warm up while counting the statements one run issues, leaving out the setup
+    queries = []
+    count = lambda *args, **kwargs: queries.append(1)
+    if case.setup:
+        case.setup()
+    sa_event.listen(bench.engine, 'before_cursor_execute', count)
+    try:
+        case.run()
+    finally:
+        sa_event.remove(bench.engine, 'before_cursor_execute', count)
+
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < MIN_RUNS or (time.perf_counter() - started < MIN_SECONDS and len(timings) < MAX_RUNS):
+        timings.append(once())
+
+    if case.setup:
+        case.setup()
+    tracemalloc.start()
+    try:
+        case.run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'min_ms': round(min(timings) * 1000, 3),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        'runs': len(timings),
+        'peak_kib': round(peak / 1024, 1),
+        'queries': len(queries),
+    }
+
+
+def time_scale(results: Dict, baseline: Dict) -> float:
+    """How much slower this run is than the baseline run, going by the calibration case"""
+    if CALIBRATION not in results or CALIBRATION not in baseline:
+        return 1.0
+    return results[CALIBRATION]['min_ms'] / baseline[CALIBRATION]['min_ms']
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Find the cases that regressed against the baseline
+
+    Query counts must not grow at all and peak memory by no more than the
+    threshold. Timings are left to slowdowns, as they vary between runs.
+
+    Returns:
+        List[str]: One description per regression
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['peak_kib'] > before['peak_kib'] * (1 + threshold):
+            regressions.append(f"{name}: peak memory {before['peak_kib']:.0f} -> {result['peak_kib']:.0f} KiB")
+        if result['queries'] > before['queries']:
+            regressions.append(f"{name}: queries {before['queries']} -> {result['queries']}")
+    return regressions
+
+
+def slowdowns(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Find the cases that got slower than the baseline, for information only
+
+    Latency is compared on the fastest run, which varies least between runs
+    on a shared machine, after scaling the baseline by the calibration case.
+
+    Returns:
+        List[str]: One description per slowdown
+    """
+    scale = time_scale(results, baseline)
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None or name == CALIBRATION:
+            continue
+        expected = before['min_ms'] * scale
+        if result['min_ms'] > expected * (1 + threshold):
+            found.append(f"{name}: fastest run {expected:.2f} -> {result['min_ms']:.2f} ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Comma-separated timeline sizes in events')
+    parser.add_argument('--filter', default='', help='Only run cases whose name contains this text')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('BENCHMARK_THRESHOLD', 0.5)),
+                        help='Allowed memory growth, and slowdown before it is reported, as a fraction of the baseline')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline file to compare with or save to')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    args = parser.parse_args()
+
+    bench = Bench()
+    calibration = calibration_case()
+    cases = global_cases(bench)
+    for size in (int(size) for size in args.sizes.split(',')):
+        started = time.perf_counter()
+        cases.extend(timeline_cases(bench, size))
+        print(f"Seeded a {size} event timeline with {FORK_DEPTH} forks in {time.perf_counter() - started:.1f} s")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # The calibration runs before and after the cases and keeps its fastest run, so one noisy stretch does not skew the scale
+    results = {CALIBRATION: measure(bench, calibration)}
+    for case in cases:
+        if args.filter in case.name:
+            results[case.name] = measure(bench, case)
+    again = measure(bench, calibration)
+    if again['min_ms'] < results[CALIBRATION]['min_ms']:
+        results[CALIBRATION] = again
+
+    scale = time_scale(results, baseline)
+    print(f"{'case':<42} {'min ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak KiB':>9} {'queries':>7} {'vs base':>8}")
+    for name, result in results.items():
+        change = f"{result['min_ms'] / (baseline[name]['min_ms'] * scale) - 1:+.0%}" if name in baseline else 'new'
+        print(f"{name:<42} {result['min_ms']:>9.2f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+              f"{result['peak_kib']:>9.0f} {result['queries']:>7} {change:>8}")
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved {len(results)} results to {args.baseline}")
+        return 0
+
+    for slowdown in slowdowns(results, baseline, args.threshold):
+        print(f"SLOWER {slowdown}")
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(results)} cases, {len(regressions)} regressions (timings scaled by {scale:.2f})")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
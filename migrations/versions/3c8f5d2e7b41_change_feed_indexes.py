@@ -0,0 +1,32 @@
+"""change feed indexes
+
+Revision ID: 3c8f5d2e7b41
+Revises: b7e2c41f9a06
+Create Date: 2026-10-17 02:41:27.530918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8f5d2e7b41'
+down_revision = 'b7e2c41f9a06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.create_index('ix_event_timeline_modified_at', ['timeline_id', 'modified_at'], unique=False)
+
+    with op.batch_alter_table('event_tombstone', schema=None) as batch_op:
+        batch_op.create_index('ix_event_tombstone_timeline_deleted_at', ['timeline_id', 'deleted_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event_tombstone', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_tombstone_timeline_deleted_at')
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_timeline_modified_at')
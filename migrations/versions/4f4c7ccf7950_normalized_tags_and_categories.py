@@ -0,0 +1,97 @@
+"""normalized tags and categories
+
+Revision ID: 4f4c7ccf7950
+Revises: cbb337cd8b5c
+Create Date: 2026-10-17 01:31:05.402113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f4c7ccf7950'
+down_revision = 'cbb337cd8b5c'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def upgrade():
+    category = op.create_table('category',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    tag = op.create_table('tag',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    event_category = op.create_table('event_category',
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['category.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['event_id'], ['event.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('event_id', 'category_id')
+    )
+    with op.batch_alter_table('event_category', schema=None) as batch_op:
+        batch_op.create_index('ix_event_category_category_id', ['category_id', 'event_id'], unique=False)
+
+    event_tag = op.create_table('event_tag',
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['event.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['tag_id'], ['tag.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('event_id', 'tag_id')
+    )
+    with op.batch_alter_table('event_tag', schema=None) as batch_op:
+        batch_op.create_index('ix_event_tag_tag_id', ['tag_id', 'event_id'], unique=False)
+
+    _backfill(category, event_category, 'categories', 'category_id')
+    _backfill(tag, event_tag, 'tags', 'tag_id')
+
+
+def downgrade():
+    with op.batch_alter_table('event_tag', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_tag_tag_id')
+
+    op.drop_table('event_tag')
+    with op.batch_alter_table('event_category', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_category_category_id')
+
+    op.drop_table('event_category')
+    op.drop_table('tag')
+    op.drop_table('category')
+
+
+def _backfill(label_table, link_table, csv_column, link_column):
+    """Copy the comma-separated labels of every event into the normalized tables"""
+    connection = op.get_bind()
+    event = sa.table('event', sa.column('id', sa.Integer), sa.column(csv_column, sa.String))
+    label_ids = {}
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(event.c.id, event.c[csv_column])
+            .where(event.c.id > last_id)
+            .order_by(event.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        links = []
+        for event_id, value in rows:
+            for name in {name for name in (value or '').split(',') if name}:
+                if name not in label_ids:
+                    label_ids[name] = connection.execute(
+                        label_table.insert().values(name=name)
+                    ).inserted_primary_key[0]
+                links.append({'event_id': event_id, link_column: label_ids[name]})
+        if links:
+            connection.execute(link_table.insert(), links)
@@ -0,0 +1,32 @@
+"""unique timeline collaborator
+
+Revision ID: 5a9e3f1c7d20
+Revises: 3c8f5d2e7b41
+Create Date: 2026-10-17 03:12:08.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a9e3f1c7d20'
+down_revision = '3c8f5d2e7b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Re-adding a collaborator used to insert another row, keep the latest one
+    op.execute(
+        "DELETE FROM timeline_collaborator WHERE id NOT IN ("
+        "SELECT MAX(id) FROM timeline_collaborator GROUP BY timeline_id, user_id)"
+    )
+
+    with op.batch_alter_table('timeline_collaborator', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_timeline_collaborator_timeline_user', ['timeline_id', 'user_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('timeline_collaborator', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_timeline_collaborator_timeline_user', type_='unique')
@@ -0,0 +1,32 @@
+"""owner and collaborator indexes
+
+Revision ID: 8e4b6a2d9c13
+Revises: 5a9e3f1c7d20
+Create Date: 2026-10-17 04:05:51.663270
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4b6a2d9c13'
+down_revision = '5a9e3f1c7d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_timeline_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('timeline_collaborator', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_timeline_collaborator_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('timeline_collaborator', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_timeline_collaborator_user_id'))
+
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_timeline_user_id'))
@@ -0,0 +1,48 @@
+"""full-text search
+
+Revision ID: 9d1e6a0b27f3
+Revises: 4f4c7ccf7950
+Create Date: 2026-10-17 01:38:44.518230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d1e6a0b27f3'
+down_revision = '4f4c7ccf7950'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table in ('event', 'timeline'):
+        op.execute(f"""CREATE VIRTUAL TABLE {table}_fts USING fts5(
+            title, description, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )""")
+        op.execute(f"""CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {table}_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""")
+        op.execute(f"""CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {table}_fts({table}_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        END""")
+        op.execute(f"""CREATE TRIGGER {table}_fts_update AFTER UPDATE OF title, description ON {table} BEGIN
+            INSERT INTO {table}_fts({table}_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO {table}_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""")
+        # Index the rows that already exist
+        op.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table in ('event', 'timeline'):
+        for action in ('insert', 'delete', 'update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{action}")
+        op.execute(f"DROP TABLE IF EXISTS {table}_fts")
@@ -0,0 +1,57 @@
+"""timeline max span
+
+Revision ID: a6f2d8c3e195
+Revises: c41d7e2a9f58
+Create Date: 2026-10-17 09:14:52.207318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6f2d8c3e195'
+down_revision = 'c41d7e2a9f58'
+branch_labels = None
+depends_on = None
+
+
+def _create_timeline_search_triggers():
+    # SQLite drops a table's triggers when batch mode recreates it
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("""CREATE TRIGGER IF NOT EXISTS timeline_fts_insert AFTER INSERT ON timeline BEGIN
+        INSERT INTO timeline_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS timeline_fts_delete AFTER DELETE ON timeline BEGIN
+        INSERT INTO timeline_fts(timeline_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS timeline_fts_update AFTER UPDATE OF title, description ON timeline BEGIN
+        INSERT INTO timeline_fts(timeline_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO timeline_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+
+
+def upgrade():
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('max_span', sa.Float(), nullable=True))
+    _create_timeline_search_triggers()
+
+    # Backfill the longest span stored by each timeline
+    timeline = sa.table('timeline', sa.column('id', sa.Integer), sa.column('max_span', sa.Float))
+    event = sa.table('event', sa.column('timeline_id', sa.Integer), sa.column('date_key', sa.Float),
+                     sa.column('end_key', sa.Float))
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(event.c.timeline_id, sa.func.max(event.c.end_key - event.c.date_key))
+        .where(event.c.end_key > event.c.date_key)
+        .group_by(event.c.timeline_id)
+    ).all()
+    for timeline_id, max_span in rows:
+        connection.execute(timeline.update().where(timeline.c.id == timeline_id).values(max_span=max_span))
+
+
+def downgrade():
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.drop_column('max_span')
+    _create_timeline_search_triggers()
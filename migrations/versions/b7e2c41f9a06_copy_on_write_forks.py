@@ -0,0 +1,86 @@
+"""copy-on-write forks
+
+Revision ID: b7e2c41f9a06
+Revises: 9d1e6a0b27f3
+Create Date: 2026-10-17 02:12:09.173554
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c41f9a06'
+down_revision = '9d1e6a0b27f3'
+branch_labels = None
+depends_on = None
+
+# SQLite reflects the original unnamed unique constraint without a name
+NAMING_CONVENTION = {'uq': 'uq_%(table_name)s_%(column_0_name)s'}
+
+
+def _uuid_constraint_name():
+    for constraint in sa.inspect(op.get_bind()).get_unique_constraints('event'):
+        if constraint['column_names'] == ['uuid']:
+            return constraint['name'] or 'uq_event_uuid'
+    return 'uq_event_uuid'
+
+
+def _create_event_search_triggers():
+    # SQLite drops a table's triggers when batch mode recreates it
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("""CREATE TRIGGER IF NOT EXISTS event_fts_insert AFTER INSERT ON event BEGIN
+        INSERT INTO event_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS event_fts_delete AFTER DELETE ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS event_fts_update AFTER UPDATE OF title, description ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO event_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+
+
+def upgrade():
+    op.create_table('event_tombstone',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('timeline_id', sa.Integer(), nullable=False),
+    sa.Column('event_uuid', sa.String(length=36), nullable=False),
+    sa.Column('base_hash', sa.String(length=64), nullable=True),
+    sa.Column('deleted_by', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['deleted_by'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['timeline_id'], ['timeline.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('timeline_id', 'event_uuid', name='uq_event_tombstone_timeline_uuid')
+    )
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('forked_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_timeline_parent_timeline_id'), ['parent_timeline_id'], unique=False)
+
+    uuid_constraint = _uuid_constraint_name()
+    with op.batch_alter_table('event', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.add_column(sa.Column('base_hash', sa.String(length=64), nullable=True))
+        batch_op.drop_constraint(uuid_constraint, type_='unique')
+        batch_op.create_unique_constraint('uq_event_timeline_uuid', ['timeline_id', 'uuid'])
+    _create_event_search_triggers()
+
+
+def downgrade():
+    # Overrides share their uuid with the inherited event and can't survive
+    # the global uniqueness constraint, so forks lose their changes
+    op.execute("DELETE FROM event_tag WHERE event_id IN (SELECT id FROM event WHERE base_hash IS NOT NULL)")
+    op.execute("DELETE FROM event_category WHERE event_id IN (SELECT id FROM event WHERE base_hash IS NOT NULL)")
+    op.execute("DELETE FROM event WHERE base_hash IS NOT NULL")
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_event_timeline_uuid', type_='unique')
+        batch_op.create_unique_constraint('uq_event_uuid', ['uuid'])
+        batch_op.drop_column('base_hash')
+    _create_event_search_triggers()
+
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_timeline_parent_timeline_id'))
+        batch_op.drop_column('forked_at')
+
+    op.drop_table('event_tombstone')
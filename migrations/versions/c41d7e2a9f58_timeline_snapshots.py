@@ -0,0 +1,53 @@
+"""timeline snapshots
+
+Revision ID: c41d7e2a9f58
+Revises: 7d3a91c5e8b2
+Create Date: 2026-10-17 07:02:18.551930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e2a9f58'
+down_revision = '7d3a91c5e8b2'
+branch_labels = None
+depends_on = None
+
+
+def _create_timeline_search_triggers():
+    # SQLite drops a table's triggers when batch mode recreates it
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("""CREATE TRIGGER IF NOT EXISTS timeline_fts_insert AFTER INSERT ON timeline BEGIN
+        INSERT INTO timeline_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS timeline_fts_delete AFTER DELETE ON timeline BEGIN
+        INSERT INTO timeline_fts(timeline_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS timeline_fts_update AFTER UPDATE OF title, description ON timeline BEGIN
+        INSERT INTO timeline_fts(timeline_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO timeline_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+
+
+def upgrade():
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('snapshot_key', sa.String(length=80), nullable=True))
+        batch_op.add_column(sa.Column('snapshot_version', sa.String(length=32), nullable=True))
+
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('run_after', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_job_timeline_status', ['timeline_id', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_index('ix_job_timeline_status')
+        batch_op.drop_column('run_after')
+
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.drop_column('snapshot_version')
+        batch_op.drop_column('snapshot_key')
+    _create_timeline_search_triggers()
@@ -0,0 +1,90 @@
+"""change sequence numbers
+
+Revision ID: d93b0e6f4a27
+Revises: a6f2d8c3e195
+Create Date: 2026-10-17 10:03:41.662085
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93b0e6f4a27'
+down_revision = 'a6f2d8c3e195'
+branch_labels = None
+depends_on = None
+
+
+def _create_search_triggers():
+    # SQLite drops a table's triggers when batch mode recreates it
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("""CREATE TRIGGER IF NOT EXISTS event_fts_insert AFTER INSERT ON event BEGIN
+        INSERT INTO event_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS event_fts_delete AFTER DELETE ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS event_fts_update AFTER UPDATE OF title, description ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO event_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS timeline_fts_insert AFTER INSERT ON timeline BEGIN
+        INSERT INTO timeline_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS timeline_fts_delete AFTER DELETE ON timeline BEGIN
+        INSERT INTO timeline_fts(timeline_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS timeline_fts_update AFTER UPDATE OF title, description ON timeline BEGIN
+        INSERT INTO timeline_fts(timeline_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO timeline_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+
+
+def upgrade():
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+        batch_op.drop_index('ix_event_timeline_modified_at')
+
+    with op.batch_alter_table('event_tombstone', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+        batch_op.drop_index('ix_event_tombstone_timeline_deleted_at')
+    _create_search_triggers()
+
+    # Existing rows only need distinct numbers per timeline, clients holding timestamp cursors resync in full.
+    # Event IDs are distinct, and tombstones are numbered after the largest of them.
+    timeline = sa.table('timeline', sa.column('change_seq', sa.Integer))
+    event = sa.table('event', sa.column('id', sa.Integer), sa.column('change_seq', sa.Integer))
+    tombstone = sa.table('event_tombstone', sa.column('id', sa.Integer), sa.column('change_seq', sa.Integer))
+    connection = op.get_bind()
+    max_event_id = connection.execute(sa.select(sa.func.coalesce(sa.func.max(event.c.id), 0))).scalar()
+    max_tombstone_id = connection.execute(sa.select(sa.func.coalesce(sa.func.max(tombstone.c.id), 0))).scalar()
+    connection.execute(event.update().values(change_seq=event.c.id))
+    connection.execute(tombstone.update().values(change_seq=tombstone.c.id + max_event_id))
+    connection.execute(timeline.update().values(change_seq=max_event_id + max_tombstone_id))
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.create_index('ix_event_timeline_change_seq', ['timeline_id', 'change_seq'], unique=False)
+
+    with op.batch_alter_table('event_tombstone', schema=None) as batch_op:
+        batch_op.create_index('ix_event_tombstone_timeline_change_seq', ['timeline_id', 'change_seq'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event_tombstone', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_tombstone_timeline_change_seq')
+        batch_op.create_index('ix_event_tombstone_timeline_deleted_at', ['timeline_id', 'deleted_at'], unique=False)
+        batch_op.drop_column('change_seq')
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_timeline_change_seq')
+        batch_op.create_index('ix_event_timeline_modified_at', ['timeline_id', 'modified_at'], unique=False)
+        batch_op.drop_column('change_seq')
+
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.drop_column('change_seq')
+    _create_search_triggers()
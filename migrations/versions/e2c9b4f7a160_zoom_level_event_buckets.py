@@ -0,0 +1,80 @@
+"""zoom-level event buckets
+
+Revision ID: e2c9b4f7a160
+Revises: 8e4b6a2d9c13
+Create Date: 2026-10-17 05:12:44.318027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import math
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c9b4f7a160'
+down_revision = '8e4b6a2d9c13'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+# Copied from utils.aggregate as of this revision, the summary must match what the application maintains
+FANOUT = 4
+LEVELS = 16
+MAX_KEY = 2.0 ** 53
+
+
+def upgrade():
+    event_bucket = op.create_table('event_bucket',
+    sa.Column('timeline_id', sa.Integer(), nullable=False),
+    sa.Column('level', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.BigInteger(), nullable=False),
+    sa.Column('category', sa.String(length=100), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['timeline_id'], ['timeline.id'], ),
+    sa.PrimaryKeyConstraint('timeline_id', 'level', 'bucket', 'category')
+    )
+
+    _backfill(event_bucket)
+
+
+def downgrade():
+    op.drop_table('event_bucket')
+
+
+def _backfill(event_bucket):
+    """Summarize the event rows each timeline stores, one timeline at a time"""
+    connection = op.get_bind()
+    event = sa.table('event', sa.column('id', sa.Integer), sa.column('timeline_id', sa.Integer),
+                     sa.column('date_key', sa.Float), sa.column('categories', sa.String))
+    timeline_ids = connection.execute(sa.select(event.c.timeline_id).distinct()).scalars().all()
+    for timeline_id in timeline_ids:
+        counts = {}
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                sa.select(event.c.id, event.c.date_key, event.c.categories)
+                .where(event.c.timeline_id == timeline_id, event.c.id > last_id)
+                .order_by(event.c.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            for _, date_key, categories in rows:
+                if date_key is None or abs(date_key) >= MAX_KEY:
+                    continue
+                base = math.floor(date_key)
+                labels = {''} | {name for name in (categories or '').split(',') if name}
+                for level in range(LEVELS):
+                    bucket = base // FANOUT ** level
+                    for category in labels:
+                        counts[level, bucket, category] = counts.get((level, bucket, category), 0) + 1
+
+        rows = [
+            {'timeline_id': timeline_id, 'level': level, 'bucket': bucket, 'category': category, 'count': count}
+            for (level, bucket, category), count in counts.items()
+        ]
+        for start in range(0, len(rows), BACKFILL_BATCH_SIZE):
+            connection.execute(event_bucket.insert(), rows[start:start + BACKFILL_BATCH_SIZE])
@@ -0,0 +1,118 @@
+"""event bucket totals
+
+Revision ID: f5b8e3a1c702
+Revises: d93b0e6f4a27
+Create Date: 2026-10-17 14:26:09.518344
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import math
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5b8e3a1c702'
+down_revision = 'd93b0e6f4a27'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+# Copied from utils.aggregate as of this revision, the summary must match what the application maintains
+FANOUT = 4
+LEVELS = 16
+MAX_KEY = 2.0 ** 53
+
+
+def upgrade():
+    event_bucket_total = op.create_table('event_bucket_total',
+    sa.Column('timeline_id', sa.Integer(), nullable=False),
+    sa.Column('level', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.BigInteger(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['timeline_id'], ['timeline.id'], ),
+    sa.PrimaryKeyConstraint('timeline_id', 'level', 'bucket')
+    )
+
+    _drop_blank_labels()
+    # The totals were stored under the empty category, mixed with the counts of events that had it
+    op.execute("DELETE FROM event_bucket WHERE trim(category) = ''")
+    _backfill_totals(event_bucket_total)
+
+
+def downgrade():
+    op.execute(
+        "INSERT INTO event_bucket (timeline_id, level, bucket, category, count) "
+        "SELECT timeline_id, level, bucket, '', count FROM event_bucket_total"
+    )
+    op.drop_table('event_bucket_total')
+
+
+def _drop_blank_labels():
+    """Remove blank and whitespace-only categories and tags, which the JSON routes used to accept"""
+    connection = op.get_bind()
+    for label_table, link_table, link_column, event_column in (('category', 'event_category', 'category_id', 'categories'),
+                                                                ('tag', 'event_tag', 'tag_id', 'tags')):
+        op.execute(f"DELETE FROM {link_table} WHERE {link_column} IN (SELECT id FROM {label_table} WHERE trim(name) = '')")
+        op.execute(f"DELETE FROM {label_table} WHERE trim(name) = ''")
+
+        event = sa.table('event', sa.column('id', sa.Integer), sa.column(event_column, sa.String))
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                sa.select(event.c.id, event.c[event_column])
+                .where(event.c.id > last_id, event.c[event_column].isnot(None))
+                .order_by(event.c.id)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updates = []
+            for event_id, labels in rows:
+                names = labels.split(',')
+                kept = [name for name in names if name.strip()]
+                if kept != names:
+                    updates.append({'event_id': event_id, 'labels': ','.join(kept)})
+            if updates:
+                connection.execute(
+                    event.update().where(event.c.id == sa.bindparam('event_id')).values({event_column: sa.bindparam('labels')}),
+                    updates
+                )
+
+
+def _backfill_totals(event_bucket_total):
+    """Count the event rows each timeline stores, one timeline at a time"""
+    connection = op.get_bind()
+    event = sa.table('event', sa.column('id', sa.Integer), sa.column('timeline_id', sa.Integer),
+                     sa.column('date_key', sa.Float))
+    timeline_ids = connection.execute(sa.select(event.c.timeline_id).distinct()).scalars().all()
+    for timeline_id in timeline_ids:
+        counts = {}
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                sa.select(event.c.id, event.c.date_key)
+                .where(event.c.timeline_id == timeline_id, event.c.id > last_id)
+                .order_by(event.c.id)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            for _, date_key in rows:
+                if date_key is None or abs(date_key) >= MAX_KEY:
+                    continue
+                base = math.floor(date_key)
+                for level in range(LEVELS):
+                    bucket = base // FANOUT ** level
+                    counts[level, bucket] = counts.get((level, bucket), 0) + 1
+
+        rows = [
+            {'timeline_id': timeline_id, 'level': level, 'bucket': bucket, 'count': count}
+            for (level, bucket), count in counts.items()
+        ]
+        for start in range(0, len(rows), BATCH_SIZE):
+            connection.execute(event_bucket_total.insert(), rows[start:start + BATCH_SIZE])
@@ -0,0 +1,93 @@
+"""
+Cold start budget check for the application.
+
+Imports the app module and creates the application the way the Lambda
+entry point does, in a fresh interpreter, and fails if that takes longer
+than the budget or pulls in a module that should only load on demand. The
+slowest imports are listed from a `python -X importtime` report.
+
+Usage: python scripts/check_import_time.py [--budget-ms 600] [--runs 5] [--top 15]
+
+The startup time is the best of several runs, so the first run's bytecode
+compilation and disk cache misses don't count against the budget.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must stay out of the startup path: the Lambda adapter, the AWS
+# SDK and the migration tooling are imported lazily by the code that needs them
+LAZY_MODULES = ('awsgi', 'boto3', 'botocore', 'alembic', 'flask_migrate')
+
+STARTUP = (
+    "import time; started = time.perf_counter(); "
+    "import app; app.create_app(migrations=False); "
+    "print((time.perf_counter() - started) * 1000)"
+)
+
+
+def start(*options):
+    """Start the application in a fresh interpreter and return the completed process"""
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tempfile.gettempdir(), 'import_time.db'))
+    return subprocess.run([sys.executable, *options, '-c', STARTUP], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def startup_time() -> float:
+    """Wall-clock time to import the app module and create the application, in milliseconds"""
+    return float(start().stdout.strip().splitlines()[-1])
+
+
+def import_report():
+    """
+    Profile the imports made during startup
+
+    Returns:
+        List of (module, self us, cumulative us, depth) in import order
+    """
+    result = start('-X', 'importtime')
+    report = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        report.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('IMPORT_TIME_BUDGET_MS', 600)),
+                        help='Maximum time to import the app module and create the application')
+    parser.add_argument('--runs', type=int, default=5, help='Number of runs to take the best of')
+    parser.add_argument('--top', type=int, default=15, help='Number of slowest top-level imports to list')
+    args = parser.parse_args()
+
+    report = import_report()
+    startup_ms = min(startup_time() for _ in range(args.runs))
+
+    print("Slowest top-level imports (-X importtime, cumulative):")
+    top_level = sorted((entry for entry in report if entry[3] <= 1), key=lambda entry: entry[2], reverse=True)
+    for name, self_us, cumulative_us, _ in top_level[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+    print(f"Startup: {startup_ms:.1f} ms, best of {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    eager = sorted({name for name, _, _, _ in report if name.split('.')[0] in LAZY_MODULES})
+    if eager:
+        print(f"FAIL: imported at startup but should load lazily: {', '.join(eager)}")
+        failed = True
+    if startup_ms > args.budget_ms:
+        print(f"FAIL: startup exceeds the budget by {startup_ms - args.budget_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Query plan check for the application's routes.
+
+Seeds a throwaway SQLite database with a timeline, a fork of it and a few
+collaborators, requests every read and write route, and runs EXPLAIN QUERY
+PLAN on each SQL statement the routes issued. Statements that scan a whole
+table instead of searching an index are reported, so a model or query change
+that loses an index shows up before it reaches production data.
+
+Usage: python scripts/explain_queries.py [--verbose]
+
+Exits with status 1 if any statement scans a table that isn't listed in
+EXPECTED_SCANS.
+"""
+
+from collections import OrderedDict
+import logging
+import os
+import re
+import sys
+import tempfile
+
+WORK_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORK_DIR, 'explain.db')
+os.environ['JOBS_DIR'] = os.path.join(WORK_DIR, 'jobs')
+os.environ['SNAPSHOT_STORE'] = 'local'
+os.environ['SNAPSHOT_DIR'] = os.path.join(WORK_DIR, 'snapshots')
+os.environ['SNAPSHOT_DEBOUNCE'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event as sa_event
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db, Event, Timeline, TimelineCollaborator, User
+
+app = create_app(migrations=False)
+
+# Routes whose templates are missing still run their queries, keep their tracebacks out of the report
+app.logger.setLevel(logging.CRITICAL)
+
+# Table scans that are intended, by route. The explore page and the homepage
+# walk timelines in primary key order and stop after one page.
+EXPECTED_SCANS = {
+    'index': {'timeline'},
+    'explore': {'timeline'},
+}
+
+EVENT_COUNT = 200
+
+
+def seed():
+    """Create the schema and a small data set exercising forks and collaborators"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        owner = User(username='owner', email='owner@example.com', password_hash=generate_password_hash('secret'))
+        editor = User(username='editor', email='editor@example.com', password_hash=generate_password_hash('secret'))
+        db.session.add_all([owner, editor])
+        db.session.commit()
+        timeline = Timeline(title='Root', description='Root timeline', dating_system='CE', user_id=owner.id)
+        db.session.add(timeline)
+        db.session.commit()
+        db.session.add(TimelineCollaborator(timeline_id=timeline.id, user_id=editor.id, permission='edit'))
+        db.session.commit()
+        return owner.id, editor.id, timeline.id
+
+
+def client_for(user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def capture(statements, name, send):
+    """Issue a request and record the statements it executed under the route name"""
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE')):
+            statements.setdefault((name, statement), parameters)
+
+    with app.app_context():
+        engine = db.engine
+    sa_event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = send()
+    except Exception as e:  # Missing templates still leave the route's queries behind
+        response = e
+    finally:
+        sa_event.remove(engine, 'before_cursor_execute', record)
+    return response
+
+
+def exercise(owner_id, editor_id, timeline_id):
+    """Request every route with realistic parameters"""
+    statements = OrderedDict()
+    owner = client_for(owner_id)
+    editor = client_for(editor_id)
+    anonymous = app.test_client()
+    base = f'/api/timeline/{timeline_id}'
+
+    for i in range(EVENT_COUNT):
+        capture(statements, 'add_event', lambda: owner.post(f'{base}/events', json={
+            'title': f'Battle {i}', 'description': 'Armies met', 'date': str(1000 + i),
+            'categories': ['war'], 'tags': [f'house-{i % 5}'], **({'end_date': str(1002 + i)} if i % 10 == 0 else {})
+        }))
+    with app.app_context():
+        event_uuids = [event_uuid for event_uuid, in db.session.execute(
+            db.select(Event.uuid).where(Event.timeline_id == timeline_id).limit(3)
+        )]
+
+    fork_id = capture(statements, 'fork_timeline', lambda: editor.post(f'{base}/fork')).json['timeline_id']
+    fork = f'/api/timeline/{fork_id}'
+    capture(statements, 'add_event', lambda: editor.post(f'{fork}/events', json={
+        'title': 'Siege', 'description': 'In the fork', 'date': '1100', 'end_date': '1104', 'tags': ['house-1']
+    }))
+    capture(statements, 'manage_event', lambda: editor.put(f'{fork}/events/{event_uuids[0]}', json={
+        'title': 'Changed', 'description': 'In the fork', 'date': '1000', 'categories': ['war'], 'tags': []
+    }))
+    capture(statements, 'manage_event', lambda: editor.delete(f'{fork}/events/{event_uuids[1]}'))
+    capture(statements, 'manage_event', lambda: owner.put(f'{base}/events/{event_uuids[2]}', json={
+        'title': 'Changed upstream', 'description': 'In the root', 'date': '1002', 'categories': [], 'tags': []
+    }))
+
+    for path in (base, fork):
+        capture(statements, 'view_timeline', lambda: anonymous.get(path.replace('/api/timeline', '/timeline')))
+        capture(statements, 'get_timeline', lambda: anonymous.get(path))
+        capture(statements, 'list_events', lambda: anonymous.get(f'{path}/events?from=1050&to=1100&tags=house-1'))
+        cursor = capture(statements, 'list_changes', lambda: anonymous.get(f'{path}/changes?limit=50')).json['cursor']
+        capture(statements, 'list_changes', lambda: anonymous.get(f'{path}/changes?since={cursor}'))
+        capture(statements, 'event_facets', lambda: anonymous.get(f'{path}/facets'))
+        capture(statements, 'aggregate_events', lambda: anonymous.get(f'{path}/aggregate?bins=20&events=2'))
+        capture(statements, 'aggregate_events', lambda: anonymous.get(f'{path}/aggregate?from=1050&to=1060&bins=50'))
+        capture(statements, 'export_timeline', lambda: b''.join(anonymous.get(f'{path}/export').response))
+        capture(statements, 'list_conflicts', lambda: anonymous.get(f'{path}/conflicts'))
+    capture(statements, 'fork_diff', lambda: anonymous.get(f'{fork}/diff'))
+    capture(statements, 'merge_forks', lambda: owner.post(f'{base}/merge', json={'forks': [fork_id], 'dry_run': True}))
+    capture(statements, 'search', lambda: anonymous.get(f'/api/search?q=battle&timeline_id={fork_id}'))
+    capture(statements, 'index', lambda: anonymous.get('/'))
+    capture(statements, 'explore', lambda: editor.get('/explore'))
+    capture(statements, 'list_permissions', lambda: editor.get(f'/api/permissions?timeline_ids={timeline_id},{fork_id}'))
+    capture(statements, 'manage_collaborators', lambda: owner.post(f'{base}/collaborators', json={
+        'user_id': editor_id, 'permission': 'admin'
+    }))
+    capture(statements, 'import_events', lambda: owner.post(f'{base}/events/import', data=b'{"title": "Imported", "date": "1500"}\n',
+                                                             content_type='application/x-ndjson'))
+
+    # Background jobs, from being queued to being run by a worker and pruned
+    prefer_async = {'Prefer': 'respond-async'}
+    jobs = [
+        capture(statements, 'import_events', lambda: owner.post(f'{base}/events/import', data=b'{"title": "Queued", "date": "1600"}\n',
+                                                                 content_type='application/x-ndjson', headers=prefer_async)),
+        capture(statements, 'export_timeline', lambda: owner.get(f'{fork}/export', headers=prefer_async)),
+        capture(statements, 'reindex_events', lambda: owner.post(f'{base}/reindex')),
+    ]
+    capture(statements, 'jobs work', lambda: app.test_cli_runner().invoke(args=['jobs', 'work', '--once']))
+    for job in jobs:
+        capture(statements, 'get_job', lambda: owner.get(job.headers['Location']))
+    capture(statements, 'download_job_result', lambda: owner.get(jobs[1].headers['Location'] + '/result').close())
+    capture(statements, 'jobs prune', lambda: app.test_cli_runner().invoke(args=['jobs', 'prune', '--days', '0']))
+
+    # Timelines served from their snapshots once a worker has rendered them, the fork's is scheduled by the first read
+    for _ in range(2):
+        capture(statements, 'jobs work', lambda: app.test_cli_runner().invoke(args=['jobs', 'work', '--once']))
+        for path in (base, fork):
+            capture(statements, 'view_timeline', lambda: anonymous.get(path.replace('/api/timeline', '/timeline')))
+            capture(statements, 'get_timeline', lambda: anonymous.get(path, headers={'Accept-Encoding': 'gzip'}))
+    return statements
+
+
+def scanned_tables(plan):
+    """Tables read in full by a query plan, ignoring CTEs, virtual tables and subquery results"""
+    tables = set()
+    for detail in plan:
+        match = re.match(r'SCAN (\w+)', detail)
+        if match and match.group(1) in db.metadata.tables and 'VIRTUAL TABLE' not in detail:
+            tables.add(match.group(1))
+    return tables
+
+
+def main():
+    verbose = '--verbose' in sys.argv
+    owner_id, editor_id, timeline_id = seed()
+    statements = exercise(owner_id, editor_id, timeline_id)
+
+    problems = 0
+    with app.app_context():
+        connection = db.session.connection()
+        for (name, statement), parameters in statements.items():
+            plan = [row[3] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+            unexpected = scanned_tables(plan) - EXPECTED_SCANS.get(name, set())
+            if unexpected:
+                problems += 1
+            if unexpected or verbose:
+                print(f"[{name}] {'SCANS ' + ', '.join(sorted(unexpected)) if unexpected else 'ok'}")
+                print('    ' + ' '.join(statement.split()))
+                for detail in plan:
+                    print('      ' + detail)
+
+    print(f"{len(statements)} statements checked, {problems} with unexpected table scans")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Concurrency load test for the SQLite engine settings.
+
+Runs several reader processes, like gunicorn workers, against one SQLite
+database file while a writer process keeps adding events, first with
+SQLite's default settings and then with the tuned pragmas and pool from
+create_app. Readers request event ranges through the Flask test client,
+so every read goes through the routes and the database.
+
+Usage: python scripts/load_test_sqlite.py [--workers 1,2,4] [--seconds 5] [--events 5000]
+
+Read throughput can only scale with workers up to the number of CPU cores.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    'sqlite defaults': {'SQLITE_PRAGMAS': {}},
+    'tuned': {},
+}
+
+
+def make_app(database: str, mode: str):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+    from app import create_app
+    app = create_app(dict(MODES[mode]), migrations=False)
+    app.logger.setLevel(logging.CRITICAL)
+    return app
+
+
+def client_for(app, user_id: int):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def seed(database: str, mode: str, events: int):
+    """Create a database holding one timeline with the given number of events"""
+    from werkzeug.security import generate_password_hash
+    app = make_app(database, mode)
+    from app import db, Timeline, User
+    with app.app_context():
+        db.create_all()
+        user = User(username='load', email='load@example.com', password_hash=generate_password_hash('secret'))
+        db.session.add(user)
+        db.session.commit()
+        timeline = Timeline(title='Load test', description='', dating_system='CE', user_id=user.id)
+        db.session.add(timeline)
+        db.session.commit()
+        user_id, timeline_id = user.id, timeline.id
+    records = ''.join(json.dumps({'title': f'Event {i}', 'description': 'Seeded', 'date': str(i), 'tags': [f'tag-{i % 20}']}) + '\n'
+                      for i in range(events))
+    response = client_for(app, user_id).post(f'/api/timeline/{timeline_id}/events/import', data=records.encode(),
+                                             content_type='application/x-ndjson')
+    assert response.status_code == 200, response.data
+    return user_id, timeline_id
+
+
+def reader(database, mode, user_id, timeline_id, events, ready, start, deadline, results):
+    app = make_app(database, mode)
+    client = client_for(app, user_id)
+    latencies, errors = [], 0
+    ready.release()
+    start.wait()
+    while time.time() < deadline.value:
+        first = random.randrange(events)
+        began = time.perf_counter()
+        try:
+            ok = client.get(f'/api/timeline/{timeline_id}/events?from={first}&to={first + 50}').status_code == 200
+        except Exception:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - began)
+        else:
+            errors += 1
+    results.put(('read', latencies, errors))
+
+
+def writer(database, mode, user_id, timeline_id, events, ready, start, deadline, results):
+    app = make_app(database, mode)
+    client = client_for(app, user_id)
+    latencies, errors = [], 0
+    ready.release()
+    start.wait()
+    i = events
+    while time.time() < deadline.value:
+        began = time.perf_counter()
+        try:
+            ok = client.post(f'/api/timeline/{timeline_id}/events', json={
+                'title': f'Event {i}', 'description': 'Written under load', 'date': str(i)
+            }).status_code == 201
+        except Exception:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - began)
+        else:
+            errors += 1
+        i += 1
+    results.put(('write', latencies, errors))
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(mode: str, workers: int, seconds: float, events: int) -> dict:
+    """Measure one mode with the given number of reader processes"""
+    database = os.path.join(tempfile.mkdtemp(), 'load.db')
+    user_id, timeline_id = seed(database, mode, events)
+
+    context = multiprocessing.get_context('spawn')
+    ready = context.Semaphore(0)
+    start = context.Event()
+    deadline = context.Value('d', 0.0)
+    results = context.Queue()
+    processes = [
+        context.Process(target=target, args=(database, mode, user_id, timeline_id, events, ready, start, deadline, results))
+        for target in [reader] * workers + [writer]
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+    deadline.value = time.time() + seconds
+    start.set()
+
+    reads, writes = [], []
+    read_errors = write_errors = 0
+    for _ in processes:
+        kind, latencies, errors = results.get()
+        if kind == 'read':
+            reads.extend(latencies)
+            read_errors += errors
+        else:
+            writes.extend(latencies)
+            write_errors += errors
+    for process in processes:
+        process.join()
+
+    return {
+        'reads_per_second': len(reads) / seconds,
+        'read_p95_ms': percentile(reads, 0.95) * 1000,
+        'read_errors': read_errors,
+        'writes_per_second': len(writes) / seconds,
+        'write_p95_ms': percentile(writes, 0.95) * 1000,
+        'write_errors': write_errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated reader process counts')
+    parser.add_argument('--seconds', type=float, default=5, help='Duration of each measurement')
+    parser.add_argument('--events', type=int, default=5000, help='Events seeded into the timeline')
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.events} events, {args.seconds:g} s per run, one writer process")
+    print(f"{'mode':<16} {'readers':>7} {'reads/s':>9} {'p95 ms':>8} {'errors':>6} {'writes/s':>9} {'p95 ms':>8} {'errors':>6}")
+    for mode in MODES:
+        for workers in (int(count) for count in args.workers.split(',')):
+            result = run(mode, workers, args.seconds, args.events)
+            print(f"{mode:<16} {workers:>7} {result['reads_per_second']:>9.1f} {result['read_p95_ms']:>8.1f} "
+                  f"{result['read_errors']:>6} {result['writes_per_second']:>9.1f} {result['write_p95_ms']:>8.1f} "
+                  f"{result['write_errors']:>6}")
+
+
+if __name__ == '__main__':
+    main()
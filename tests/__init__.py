@@ -0,0 +1 @@
+"""Tests for Fiction Timelines application."""
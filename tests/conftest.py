@@ -0,0 +1,66 @@
+"""Fixtures for tests that go through the Flask application."""
+
+import pytest
+
+from app import Timeline, User, create_app, db
+
+
+@pytest.fixture
+def app_config():
+    """Settings of the application under test, modules override it to turn features on"""
+    return {}
+
+
+@pytest.fixture
+def app(app_config, tmp_path):
+    """Application backed by a fresh in-memory database"""
+    application = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'SQLITE_PRAGMAS': {},
+        'SNAPSHOT_STORE': '',
+        'JOBS_DIR': str(tmp_path / 'jobs'),
+        'SNAPSHOT_DIR': str(tmp_path / 'snapshots'),
+        'TESTING': True,
+        **app_config
+    }, migrations=False)
+    with application.app_context():
+        db.create_all()
+    # No application context is left pushed: requests would share it, and with it g and the session.
+    # Tests wrap their own database access in app.app_context(), like the job workers do.
+    yield application
+    with application.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(app):
+    def make(username):
+        with app.app_context():
+            user = User(username=username, email=f'{username}@example.com', password_hash='')
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+
+@pytest.fixture
+def make_timeline(app):
+    def make(user_id, title='Timeline', **fields):
+        with app.app_context():
+            timeline = Timeline(title=title, description='', user_id=user_id, **fields)
+            db.session.add(timeline)
+            db.session.commit()
+            return timeline.id
+    return make
+
+
+@pytest.fixture
+def login(app):
+    """Build a test client logged in as the given user"""
+    def client_for(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return client_for
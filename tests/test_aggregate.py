@@ -0,0 +1,100 @@
+"""Tests for the zoom-level aggregation pyramid."""
+
+import pytest
+
+from utils.aggregate import ALL_EVENTS, FANOUT, LEVELS, MAX_KEY, BinCounts, bucket_deltas, bucket_width, plan_bins
+
+
+def test_bucket_deltas_count_every_level_and_category():
+    deltas = bucket_deltas(added=[(17.5, ['battle', 'battle', 'siege'])])
+    assert len(deltas) == LEVELS * 3
+    for level in range(LEVELS):
+        bucket = 17 // FANOUT ** level
+        assert deltas[level, bucket, ALL_EVENTS] == 1
+        assert deltas[level, bucket, 'battle'] == 1
+        assert deltas[level, bucket, 'siege'] == 1
+
+
+def test_bucket_deltas_floor_negative_keys():
+    deltas = bucket_deltas(added=[(-0.5, [])])
+    assert deltas[0, -1, ALL_EVENTS] == 1
+    assert deltas[1, -1, ALL_EVENTS] == 1
+    deltas = bucket_deltas(added=[(-5, [])])
+    assert deltas[0, -5, ALL_EVENTS] == 1
+    assert deltas[1, -2, ALL_EVENTS] == 1
+
+
+def test_bucket_deltas_cancel_out_unmoved_buckets():
+    assert bucket_deltas(added=[(10, ['a'])], removed=[(10.5, ['a'])]) == {}
+    # 8 and 10 only fall in different buckets at level 0
+    deltas = bucket_deltas(added=[(10, ['a'])], removed=[(8, ['a'])])
+    assert deltas == {(0, 10, ALL_EVENTS): 1, (0, 10, 'a'): 1, (0, 8, ALL_EVENTS): -1, (0, 8, 'a'): -1}
+
+
+def test_empty_category_is_not_the_event_count():
+    deltas = bucket_deltas(added=[(3, [''])])
+    assert deltas[0, 3, ALL_EVENTS] == 1
+    assert deltas[0, 3, ''] == 1
+
+    counts = BinCounts(plan_bins(0, 9, 1))
+    counts.add(0, ALL_EVENTS, 1)
+    counts.add(0, '', 1)
+    assert counts.events == [1]
+    assert counts.top_categories(0, 5) == [{'name': '', 'count': 1}]
+
+
+def test_bucket_deltas_skip_undated_and_huge_keys():
+    assert bucket_deltas(added=[(None, ['a']), (MAX_KEY, ['a']), (-MAX_KEY, [])]) == {}
+
+
+@pytest.mark.parametrize('start, end, bins', [
+    (0, 1000, 100),
+    (-500, 1500, 7),
+    (1066, 1067, 200),
+    (0, 10 ** 9, 50),
+    (-3.25, 17.75, 4),
+])
+def test_plan_bins_cover_the_range(start, end, bins):
+    binning = plan_bins(start, end, bins)
+    assert 1 <= binning.count <= bins
+    assert binning.start <= start
+    assert binning.end > end
+    assert binning.bin_of(start) == 0
+    assert binning.bin_of(end) == binning.count - 1
+    assert binning.bounds(0)[0] == binning.start
+    assert binning.bounds(binning.count - 1)[1] == binning.end
+    if binning.level is not None:
+        width = bucket_width(binning.level)
+        assert binning.start == binning.first_bucket * width
+        assert binning.last_bucket == binning.first_bucket + binning.count * binning.buckets_per_bin - 1
+        assert binning.bin_of_bucket(binning.last_bucket) == binning.count - 1
+
+
+def test_plan_bins_narrow_bins_have_no_level():
+    binning = plan_bins(1066, 1067, 200)
+    assert binning.level is None
+    assert binning.count == 200
+
+
+def test_plan_bins_single_date():
+    binning = plan_bins(5, 5, 100)
+    assert binning.count == 1
+    assert binning.bin_of(5) == 0
+
+
+def test_bin_of_clamps_to_the_outer_bins():
+    binning = plan_bins(0, 100, 10)
+    assert binning.bin_of(-1000) == 0
+    assert binning.bin_of(1000) == binning.count - 1
+
+
+def test_bin_counts():
+    binning = plan_bins(0, 99, 10)
+    counts = BinCounts(binning)
+    counts.add_events([(5, ['b', 'a']), (6, ['a']), (None, ['a']), (95, ['c'])])
+    counts.add_events([(6, ['a'])], sign=-1)
+    assert counts.events[binning.bin_of(5)] == 1
+    assert counts.events[binning.bin_of(95)] == 1
+    assert sum(counts.events) == 2
+    assert counts.top_categories(binning.bin_of(5), 5) == [{'name': 'a', 'count': 1}, {'name': 'b', 'count': 1}]
+    assert counts.top_categories(binning.bin_of(5), 1) == [{'name': 'a', 'count': 1}]
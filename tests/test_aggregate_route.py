@@ -0,0 +1,28 @@
+"""Tests for the zoom-level aggregation endpoint."""
+
+import pytest
+
+from app import Category, Event, db
+
+
+@pytest.mark.parametrize('bins', [1, 1000])  # Counted from the pyramid, and from the events themselves
+def test_blank_categories_are_dropped_and_not_counted(app, make_user, make_timeline, login, bins):
+    user_id = make_user('author')
+    timeline_id = make_timeline(user_id)
+    client = login(user_id)
+    for categories in ([''], ['', ' ', 'war'], [' war ']):
+        response = client.post(f'/api/timeline/{timeline_id}/events',
+                               json={'title': 'Event', 'description': '', 'date': '1000', 'categories': categories})
+        assert response.status_code == 201
+    response = client.post(f'/api/timeline/{timeline_id}/events',
+                           json={'title': 'Event', 'description': '', 'date': '1020', 'tags': ['', 'siege']})
+    assert response.status_code == 201
+
+    data = client.get(f'/api/timeline/{timeline_id}/aggregate', query_string={'bins': bins, 'events': 0}).get_json()
+
+    assert sum(item['count'] for item in data['bins']) == 4
+    categories = [category for item in data['bins'] for category in item['categories']]
+    assert categories == [{'name': 'war', 'count': 2}]
+    with app.app_context():
+        assert db.session.scalars(db.select(Category.name)).all() == ['war']
+        assert sorted(db.session.scalars(db.select(Event.tags)).all()) == ['', '', '', 'siege']
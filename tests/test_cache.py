@@ -0,0 +1,27 @@
+"""Tests for the in-process caches."""
+
+from utils.cache import UserCache
+
+
+def test_user_cache_remembers_users_until_they_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('utils.cache.time.monotonic', lambda: now[0])
+    cache = UserCache(ttl=30)
+    assert not cache.get(1)
+    cache.put(1)
+    assert cache.get(1)
+    now[0] += 31
+    assert not cache.get(1)
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 2
+
+
+def test_user_cache_invalidate_and_bound():
+    cache = UserCache(max_entries=2)
+    for user_id in (1, 2, 3):
+        cache.put(user_id)
+    assert not cache.get(1)
+    assert cache.get(2) and cache.get(3)
+    cache.invalidate(2)
+    assert not cache.get(2)
+    assert cache.stats()['entries'] == 1
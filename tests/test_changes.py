@@ -0,0 +1,106 @@
+"""Tests for the incremental change feed."""
+
+import pytest
+
+from tests.test_forks import add_event, delete_event, edit_event, fork, titles
+
+
+def sync(client, timeline_id, state, cursor=None, limit=2):
+    """
+    Apply change feed pages to a client-side copy of a timeline until it is up to date
+
+    Returns:
+        Tuple[str, int, list]: The final cursor, the number of pages read and
+        the deletions they reported
+    """
+    pages, deletions = 0, []
+    while True:
+        query = {'limit': limit}
+        if cursor is not None:
+            query['since'] = cursor
+        response = client.get(f'/api/timeline/{timeline_id}/changes', query_string=query)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert page['full'] == (cursor is None)
+        assert len(page['upserts']) + len(page['deletions']) <= limit
+        for event in page['upserts']:
+            state[event['id']] = event['title']
+        for event_id in page['deletions']:
+            state.pop(event_id, None)
+        deletions.extend(page['deletions'])
+        cursor = page['cursor']
+        pages += 1
+        if not page['more']:
+            return cursor, pages, deletions
+
+
+def test_change_feed_pages_across_a_fork_chain(make_user, make_timeline, login):
+    user_id = make_user('author')
+    client = login(user_id)
+    parent_id = make_timeline(user_id)
+    events = [add_event(client, parent_id, f'Event {n}', str(1000 + n)) for n in range(5)]
+    fork_id = fork(client, parent_id)
+    edit_event(client, fork_id, events[0], 'Fork edit', '1000')
+    delete_event(client, fork_id, events[1])
+    add_event(client, fork_id, 'Fork addition', '1500')
+    add_event(client, parent_id, 'Parent addition', '1600')
+
+    state = {}
+    cursor, pages, _ = sync(client, fork_id, state)
+
+    assert state == titles(client, fork_id)
+    assert len(state) == 6
+    assert pages == 3
+    assert {int(part.split(':')[0]) for part in cursor.split(',')} == {fork_id, parent_id}
+
+    # Nothing changed since, so the cursor comes back as is
+    assert sync(client, fork_id, state, cursor) == (cursor, 1, [])
+
+
+def test_change_feed_pages_deletions(make_user, make_timeline, login):
+    user_id = make_user('author')
+    client = login(user_id)
+    parent_id = make_timeline(user_id)
+    events = [add_event(client, parent_id, f'Event {n}', str(1000 + n)) for n in range(6)]
+    fork_id = fork(client, parent_id)
+    edit_event(client, fork_id, events[5], 'Kept by the fork', '1005')
+    parent_state, fork_state = {}, {}
+    parent_cursor, _, _ = sync(client, parent_id, parent_state)
+    fork_cursor, _, _ = sync(client, fork_id, fork_state)
+
+    delete_event(client, parent_id, events[0])
+    delete_event(client, parent_id, events[1])
+    delete_event(client, fork_id, events[2])
+    edit_event(client, parent_id, events[3], 'Parent edit', '1003')
+    delete_event(client, parent_id, events[5])
+
+    _, pages, deletions = sync(client, parent_id, parent_state, parent_cursor, limit=1)
+    assert pages == 4
+    assert sorted(deletions) == sorted([events[0], events[1], events[5]])
+    assert parent_state == titles(client, parent_id)
+
+    _, _, deletions = sync(client, fork_id, fork_state, fork_cursor, limit=1)
+    # The fork's own version of the last event outlives the parent's deletion
+    assert sorted(deletions) == sorted(events[:3])
+    assert fork_state == titles(client, fork_id)
+    assert fork_state == {events[3]: 'Parent edit', events[4]: 'Event 4', events[5]: 'Kept by the fork'}
+
+
+@pytest.mark.parametrize('cursor', ['abc', '1:x', '1:2,oops', ':'])
+def test_change_feed_rejects_malformed_cursor(make_user, make_timeline, login, cursor):
+    user_id = make_user('author')
+    timeline_id = make_timeline(user_id)
+    response = login(user_id).get(f'/api/timeline/{timeline_id}/changes', query_string={'since': cursor})
+    assert response.status_code == 400
+
+
+def test_change_feed_answers_timestamp_cursor_with_full_resync(make_user, make_timeline, login):
+    user_id = make_user('author')
+    timeline_id = make_timeline(user_id)
+    client = login(user_id)
+    event_id = add_event(client, timeline_id, 'Event')
+
+    page = client.get(f'/api/timeline/{timeline_id}/changes', query_string={'since': '2000-01-01T00:00:00'}).get_json()
+
+    assert page['full'] is True
+    assert [event['id'] for event in page['upserts']] == [event_id]
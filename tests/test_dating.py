@@ -0,0 +1,83 @@
+"""Tests for the dating systems."""
+
+import pytest
+
+from utils.dating import EraDatingSystem, get_dating_system, parse_era_table
+
+
+@pytest.mark.parametrize('date, key', [
+    ('1066', 1066.0),
+    ('44 BCE', -43.0),
+    ('44 B.C.', -43.0),
+    ('AD 793', 793.0),
+    ('793 CE', 793.0),
+    ('1066-10-14', 1066 + 9 / 12 + 13 / (12 * 31)),
+    ('14 October 1066', 1066 + 9 / 12 + 13 / (12 * 31)),
+    ('1066 Oct 14', 1066 + 9 / 12 + 13 / (12 * 31)),
+    ('March 1200', 1200 + 2 / 12),
+    ('Sept. 3 1752', 1752 + 8 / 12 + 2 / (12 * 31)),
+    ('Sep 1752', 1752 + 8 / 12),
+    ('December 25 800', 800 + 11 / 12 + 24 / (12 * 31)),
+    ('25 dec. 800', 800 + 11 / 12 + 24 / (12 * 31)),
+    ('may 1200', 1200 + 4 / 12),
+])
+def test_common_era_dates(date, key):
+    assert get_dating_system('CE').parse(date) == pytest.approx(key)
+
+
+@pytest.mark.parametrize('date, key', [
+    ('Marriage of Arthur 1200', 1200.0),
+    ('Decline 476', 476.0),
+    ('Augustus 14', 14.0),
+    ('Junior 1200', 1200.0),
+    ('Mayday 1200', 1200.0),
+])
+def test_common_era_words_starting_like_months_are_not_months(date, key):
+    assert get_dating_system('CE').parse(date) == key
+
+
+@pytest.mark.parametrize('date', ['', 'unknown', 'Long ago'])
+def test_common_era_rejects_dates_without_a_year(date):
+    assert get_dating_system('CE').parse(date) is None
+
+
+def test_common_era_dates_sort_chronologically():
+    dates = ['44 BCE', '1 BCE', 'AD 1', '1066', '1066-10-14', '1066 Dec 25', '1200']
+    keys = [get_dating_system('CE').parse(date) for date in dates]
+    assert keys == sorted(keys)
+
+
+def test_stardates():
+    stardate = get_dating_system('Stardate')
+    assert stardate.parse('Stardate 41153.7') == 41153.7
+    assert stardate.parse('SD 41153.7') == 41153.7
+    assert stardate.parse('yesterday') is None
+
+
+def test_unknown_systems_order_by_the_first_number():
+    custom = get_dating_system('Galactic Standard')
+    assert custom.parse('Year 35 of the Empire') == 35.0
+    assert custom.parse('The beginning') is None
+
+
+def test_era_dates_with_prefix_and_suffix_labels():
+    middle_earth = get_dating_system('Middle-earth')
+    assert middle_earth.parse('Third Age 3019') == 4031 + 3019
+    assert middle_earth.parse('3019 T.A.') == 4031 + 3019
+    assert middle_earth.parse('S.A. 3441') < middle_earth.parse('T.A. 1')
+    assert middle_earth.parse('Fifth Age 1') is None
+
+
+def test_era_table():
+    eras = parse_era_table('Before the Fall: -1000\n\nAfter the Fall: 0\n')
+    assert eras == [('Before the Fall', -1000.0), ('After the Fall', 0.0)]
+    system = get_dating_system('Custom', eras)
+    assert isinstance(system, EraDatingSystem)
+    assert system.parse('Before the Fall 10') == -990.0
+    assert get_dating_system('Custom', eras) is system
+
+
+@pytest.mark.parametrize('text', ['No separator', ': 10', 'Era: soon'])
+def test_era_table_rejects_malformed_lines(text):
+    with pytest.raises(ValueError):
+        parse_era_table(text)
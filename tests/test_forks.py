@@ -0,0 +1,148 @@
+"""Tests for copy-on-write forks, through the JSON routes."""
+
+from app import Event, EventTombstone, db
+
+
+def add_event(client, timeline_id, title, date='1000'):
+    response = client.post(f'/api/timeline/{timeline_id}/events',
+                           json={'title': title, 'description': '', 'date': date})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def edit_event(client, timeline_id, event_id, title, date='1000'):
+    response = client.put(f'/api/timeline/{timeline_id}/events/{event_id}',
+                          json={'title': title, 'description': '', 'date': date})
+    assert response.status_code == 200
+
+
+def delete_event(client, timeline_id, event_id):
+    assert client.delete(f'/api/timeline/{timeline_id}/events/{event_id}').status_code == 204
+
+
+def fork(client, timeline_id):
+    response = client.post(f'/api/timeline/{timeline_id}/fork')
+    assert response.status_code == 201
+    return response.get_json()['timeline_id']
+
+
+def titles(client, timeline_id):
+    """Titles of the events a timeline shows, keyed by event id"""
+    data = client.get(f'/api/timeline/{timeline_id}').get_json()
+    return {event['id']: event['title'] for event in data['events']}
+
+
+def diff(client, timeline_id):
+    return {change['id']: change for change in client.get(f'/api/timeline/{timeline_id}/diff').get_json()['changes']}
+
+
+def stored_rows(app, timeline_id):
+    """Event rows a timeline stores itself"""
+    with app.app_context():
+        return db.session.scalars(db.select(Event).where(Event.timeline_id == timeline_id)).all()
+
+
+def test_fork_inherits_events_without_copying_them(app, make_user, make_timeline, login):
+    user_id = make_user('author')
+    client = login(user_id)
+    parent_id = make_timeline(user_id)
+    first = add_event(client, parent_id, 'First')
+    second = add_event(client, parent_id, 'Second', '1100')
+
+    fork_id = fork(client, parent_id)
+
+    assert titles(client, fork_id) == {first: 'First', second: 'Second'}
+    assert stored_rows(app, fork_id) == []
+    assert diff(client, fork_id) == {}
+
+
+def test_fork_edit_overrides_inherited_event(app, make_user, make_timeline, login):
+    user_id = make_user('author')
+    client = login(user_id)
+    parent_id = make_timeline(user_id)
+    event_id = add_event(client, parent_id, 'Original')
+    fork_id = fork(client, parent_id)
+
+    edit_event(client, fork_id, event_id, 'Fork edit')
+
+    assert titles(client, fork_id) == {event_id: 'Fork edit'}
+    assert titles(client, parent_id) == {event_id: 'Original'}
+    [override] = stored_rows(app, fork_id)
+    assert override.uuid == event_id
+    base_hash = override.base_hash
+    assert base_hash is not None
+
+    # Editing the override again updates the fork's row and keeps the version it was based on
+    edit_event(client, fork_id, event_id, 'Second fork edit')
+    [override] = stored_rows(app, fork_id)
+    assert override.title == 'Second fork edit'
+    assert override.base_hash == base_hash
+    change = diff(client, fork_id)[event_id]
+    assert (change['status'], change['upstream'], change['base_hash']) == ('modified', 'unchanged', base_hash)
+
+
+def test_fork_delete_hides_inherited_event(app, make_user, make_timeline, login):
+    user_id = make_user('author')
+    client = login(user_id)
+    parent_id = make_timeline(user_id)
+    kept = add_event(client, parent_id, 'Kept')
+    deleted = add_event(client, parent_id, 'Deleted', '1100')
+    fork_id = fork(client, parent_id)
+
+    delete_event(client, fork_id, deleted)
+
+    assert titles(client, fork_id) == {kept: 'Kept'}
+    assert titles(client, parent_id) == {kept: 'Kept', deleted: 'Deleted'}
+    with app.app_context():
+        tombstone = db.session.scalars(db.select(EventTombstone).where(EventTombstone.timeline_id == fork_id)).one()
+    assert tombstone.event_uuid == deleted
+    assert tombstone.base_hash is not None
+    assert diff(client, fork_id)[deleted]['status'] == 'deleted'
+    # The parent's own row is untouched
+    assert {row.uuid for row in stored_rows(app, parent_id)} == {kept, deleted}
+
+
+def test_parent_changes_after_fork_show_through(make_user, make_timeline, login):
+    user_id = make_user('author')
+    client = login(user_id)
+    parent_id = make_timeline(user_id)
+    edited = add_event(client, parent_id, 'Edited upstream')
+    deleted = add_event(client, parent_id, 'Deleted upstream', '1100')
+    overridden = add_event(client, parent_id, 'Edited on both sides', '1200')
+    fork_id = fork(client, parent_id)
+    edit_event(client, fork_id, overridden, 'Fork edit', '1200')
+
+    edit_event(client, parent_id, edited, 'Parent edit')
+    delete_event(client, parent_id, deleted)
+    added = add_event(client, parent_id, 'Added upstream', '1300')
+    edit_event(client, parent_id, overridden, 'Parent edit', '1200')
+
+    assert titles(client, fork_id) == {edited: 'Parent edit', added: 'Added upstream', overridden: 'Fork edit'}
+    changes = diff(client, fork_id)
+    assert list(changes) == [overridden]
+    assert (changes[overridden]['status'], changes[overridden]['upstream']) == ('modified', 'modified')
+
+
+def test_three_level_fork_chain(make_user, make_timeline, login):
+    user_id = make_user('author')
+    client = login(user_id)
+    root_id = make_timeline(user_id)
+    a, b, c, d = (add_event(client, root_id, title, date) for title, date in
+                  [('A', '1000'), ('B', '1100'), ('C', '1200'), ('D', '1300')])
+    middle_id = fork(client, root_id)
+    edit_event(client, middle_id, a, 'A in middle')
+    delete_event(client, middle_id, b)
+    leaf_id = fork(client, middle_id)
+
+    # The leaf sees the middle fork's changes on top of the root's events
+    assert titles(client, leaf_id) == {a: 'A in middle', c: 'C', d: 'D'}
+
+    edit_event(client, leaf_id, c, 'C in leaf', '1200')
+    delete_event(client, leaf_id, a)
+    edit_event(client, root_id, d, 'D in root', '1300')
+
+    assert titles(client, leaf_id) == {c: 'C in leaf', d: 'D in root'}
+    assert titles(client, middle_id) == {a: 'A in middle', c: 'C', d: 'D in root'}
+    assert titles(client, root_id) == {a: 'A', b: 'B', c: 'C', d: 'D in root'}
+    # The leaf's override is based on the version it inherited from the root
+    assert diff(client, leaf_id)[c]['upstream'] == 'unchanged'
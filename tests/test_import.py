@@ -0,0 +1,35 @@
+"""Tests for the bulk event import endpoint."""
+
+import json
+
+
+def ndjson(*records):
+    return ''.join(json.dumps(record) + '\n' for record in records)
+
+
+def test_import_reports_invalid_rows_and_keeps_the_rest(make_user, make_timeline, login):
+    user_id = make_user('author')
+    timeline_id = make_timeline(user_id)
+    client = login(user_id)
+
+    body = ndjson(
+        {'title': 'Coronation', 'date': '1200'},
+        {'title': 'x', 'date': '1200', 'description': {'a': 1}},
+        {'title': 'y', 'date': '1300', 'end_date': 1400},
+        {'title': 'z', 'date': '1300', 'categories': 5},
+        {'title': 'Treaty', 'date': '1350', 'end_date': '1360', 'tags': 'peace, ,'},
+    ) + 'not json\n'
+    response = client.post(f'/api/timeline/{timeline_id}/events/import', data=body,
+                           content_type='application/x-ndjson')
+
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary['imported'] == 2
+    assert summary['failed'] == 4
+    assert [error['row'] for error in summary['errors']] == [2, 3, 4, 6]
+    assert summary['errors'][0]['error'] == 'Field description must be a string'
+    assert summary['errors'][1]['error'] == 'Field end_date must be a string'
+
+    events = client.get(f'/api/timeline/{timeline_id}').get_json()['events']
+    assert sorted(event['title'] for event in events) == ['Coronation', 'Treaty']
+    assert [event['tags'] for event in events if event['title'] == 'Treaty'] == [['peace']]
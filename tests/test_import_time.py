@@ -0,0 +1,22 @@
+"""Cold start budget of the application, see scripts/check_import_time.py."""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+import check_import_time  # noqa: E402
+
+
+def test_lazy_modules_stay_out_of_startup():
+    report = check_import_time.import_report()
+    eager = sorted({name for name, _, _, _ in report if name.split('.')[0] in check_import_time.LAZY_MODULES})
+    assert eager == []
+
+
+def test_startup_within_budget():
+    budget_ms = float(os.getenv('IMPORT_TIME_BUDGET_MS', 600))
+    # Best of several runs, like the script, so the first run's compilation doesn't count
+    startup_ms = min(check_import_time.startup_time() for _ in range(5))
+    assert startup_ms <= budget_ms
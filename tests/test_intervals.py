@@ -0,0 +1,69 @@
+"""Tests for the interval index."""
+
+import random
+
+from utils.intervals import IntervalTree
+
+
+def brute_force(intervals, start, end):
+    return sorted((s, item) for s, e, item in intervals if s < end and e > start)
+
+
+def test_overlapping_matches_brute_force():
+    rng = random.Random(7)
+    tree = IntervalTree()
+    intervals = []
+    for item in range(500):
+        start = rng.randint(0, 1000)
+        end = start + rng.randint(1, 50)
+        tree.insert(start, end, item)
+        intervals.append((start, end, item))
+    for _ in range(200):
+        start = rng.randint(-10, 1010)
+        end = start + rng.randint(1, 100)
+        expected = brute_force(intervals, start, end)
+        assert tree.overlapping(start, end) == [item for _, item in expected]
+
+
+def test_intervals_are_half_open():
+    tree = IntervalTree()
+    tree.insert(10, 20, 'a')
+    assert tree.overlapping(20, 30) == []
+    assert tree.overlapping(0, 10) == []
+    assert tree.overlapping(19.5, 30) == ['a']
+    assert tree.overlapping(0, 10.5) == ['a']
+
+
+def test_contained_and_containing_intervals_overlap():
+    tree = IntervalTree()
+    tree.insert(0, 100, 'outer')
+    tree.insert(40, 60, 'inner')
+    assert tree.overlapping(45, 50) == ['outer', 'inner']
+    assert tree.overlapping(-10, 110) == ['outer', 'inner']
+
+
+def test_intervals_sharing_a_start_are_kept_apart():
+    tree = IntervalTree()
+    tree.insert(5, 10, 'b')
+    tree.insert(5, 7, 'a')
+    assert len(tree) == 2
+    assert tree.overlapping(8, 9) == ['b']
+    tree.remove(5, 10, 'b')
+    assert tree.overlapping(0, 100) == ['a']
+
+
+def test_remove_updates_overlaps_and_ignores_unknown_intervals():
+    tree = IntervalTree()
+    for item in range(100):
+        tree.insert(item, item + 10, item)
+    for item in range(0, 100, 2):
+        tree.remove(item, item + 10, item)
+    tree.remove(1, 11, 1000)
+    assert len(tree) == 50
+    assert tree.overlapping(50, 52) == [41, 43, 45, 47, 49, 51]
+
+
+def test_empty_tree():
+    tree = IntervalTree()
+    assert len(tree) == 0
+    assert tree.overlapping(0, 1) == []
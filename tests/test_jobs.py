@@ -0,0 +1,299 @@
+"""Tests for the background job queue, its worker and the routes that queue jobs."""
+
+from datetime import datetime, timedelta
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import event as sqlalchemy_event
+
+from app import (FAILED, JOB_HANDLERS, QUEUED, RUNNING, SUCCEEDED, Event, Job, claim_job, db, enqueue_job,
+                 prune_jobs, record_job_heartbeats, run_job)
+from utils.jobs import JobError, JobProgress, JobWorker
+from utils.timeline import TimelineError
+
+
+def claim(app, worker='test-worker'):
+    with app.app_context():
+        return claim_job(worker)
+
+
+def run_queued_jobs(app):
+    """Claim and run queued jobs one at a time until none is left, returning their IDs"""
+    ran = []
+    while (job_id := claim(app)) is not None:
+        # Each job gets an application context of its own, as in `flask jobs work`
+        with app.app_context():
+            run_job(job_id)
+        ran.append(job_id)
+    return ran
+
+
+def queued_job(app, user_id, kind='export', **fields):
+    with app.app_context():
+        job = enqueue_job(kind, user_id)
+        for name, value in fields.items():
+            setattr(job, name, value)
+        db.session.commit()
+        return job.id
+
+
+def get_job(app, job_id):
+    with app.app_context():
+        return db.session.get(Job, job_id)
+
+
+def count_events(app):
+    with app.app_context():
+        return db.session.scalar(db.select(db.func.count(Event.id)))
+
+
+def test_job_progress_reports_at_most_once_per_interval(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('utils.jobs.time.monotonic', lambda: now[0])
+    reports = []
+    progress = JobProgress(lambda done, total: reports.append((done, total)), interval=1)
+
+    progress.update(1, 10)
+    progress.update(2)
+    now[0] = 1.5
+    progress.update(3)
+    progress.update(4, force=True)
+
+    assert reports == [(1, 10), (3, 10), (4, 10)]
+
+
+def test_job_worker_runs_each_claimed_job_once():
+    queue = list(range(1, 6))
+    ran = []
+    worker = JobWorker(lambda: queue.pop(0) if queue else None, ran.append, lambda job_ids: None,
+                       threads=2, poll_interval=0.01)
+
+    assert worker.run(once=True) == 5
+    assert sorted(ran) == [1, 2, 3, 4, 5]
+
+
+def test_job_worker_keeps_going_after_a_failed_claim():
+    claims = iter([RuntimeError('database is locked'), 3])
+    ran = []
+
+    def claim():
+        result = next(claims, None)
+        if result is None:
+            worker.stop()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    worker = JobWorker(claim, ran.append, lambda job_ids: None, threads=1, poll_interval=0.01)
+    assert worker.run() == 1
+    assert ran == [3]
+
+
+def test_job_worker_sends_heartbeats_while_jobs_run():
+    claims = [7]
+    beats = []
+    release = threading.Event()
+    worker = JobWorker(lambda: claims.pop() if claims else None, lambda job_id: release.wait(5), beats.append,
+                       threads=1, poll_interval=0.01, heartbeat_interval=0.01)
+    thread = threading.Thread(target=worker.run, kwargs={'once': True})
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not beats and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert beats and beats[0] == {7}
+
+
+def test_claim_job_takes_the_oldest_due_job(app, make_user):
+    user_id = make_user('author')
+    later = queued_job(app, user_id, run_after=datetime.utcnow() + timedelta(hours=1))
+    first = queued_job(app, user_id)
+    second = queued_job(app, user_id, run_after=datetime.utcnow() - timedelta(seconds=1))
+
+    assert claim(app, 'worker-a') == first
+    assert claim(app, 'worker-b') == second
+    assert claim(app, 'worker-a') is None
+
+    job = get_job(app, first)
+    assert (job.status, job.worker, job.attempts) == (RUNNING, 'worker-a', 1)
+    assert job.started_at is not None and job.heartbeat_at is not None
+    assert get_job(app, later).status == QUEUED
+
+
+def test_claim_job_skips_a_job_another_worker_claimed_first(app, make_user):
+    user_id = make_user('author')
+    first = queued_job(app, user_id)
+    second = queued_job(app, user_id)
+    raced = []
+
+    def claim_first_elsewhere(connection, cursor, statement, parameters, context, executemany):
+        # Another worker's UPDATE lands between this worker's SELECT and its own UPDATE
+        if statement.startswith('UPDATE job SET status') and not raced:
+            raced.append(statement)
+            cursor.execute("UPDATE job SET status = 'running', worker = 'worker-b' WHERE id = ?", (first,))
+
+    with app.app_context():
+        sqlalchemy_event.listen(db.engine, 'before_cursor_execute', claim_first_elsewhere)
+        try:
+            assert claim_job('worker-a') == second
+        finally:
+            sqlalchemy_event.remove(db.engine, 'before_cursor_execute', claim_first_elsewhere)
+
+    assert raced
+    assert get_job(app, first).worker == 'worker-b'
+    assert get_job(app, second).worker == 'worker-a'
+
+
+def test_stale_jobs_are_retried_or_failed(app, make_user):
+    user_id = make_user('author')
+    stale = datetime.utcnow() - timedelta(seconds=app.config['JOB_STALE_AFTER'] + 60)
+    running = dict(status=RUNNING, worker='dead-worker', heartbeat_at=stale)
+    retried = queued_job(app, user_id, 'export', attempts=1, **running)
+    exhausted = queued_job(app, user_id, 'export', attempts=app.config['JOB_MAX_ATTEMPTS'], **running)
+    not_idempotent = queued_job(app, user_id, 'import', attempts=1, **running)
+    alive = queued_job(app, user_id, 'export', attempts=1, status=RUNNING, worker='live-worker',
+                       heartbeat_at=datetime.utcnow())
+
+    # The queue is empty, so the claim requeues the stale jobs first
+    assert claim(app, 'worker-a') == retried
+    job = get_job(app, retried)
+    assert (job.status, job.worker, job.attempts) == (RUNNING, 'worker-a', 2)
+    for job_id in (exhausted, not_idempotent):
+        job = get_job(app, job_id)
+        assert (job.status, job.error) == (FAILED, 'The worker running the job stopped')
+    assert get_job(app, alive).worker == 'live-worker'
+
+
+def test_heartbeats_only_touch_running_jobs(app, make_user):
+    user_id = make_user('author')
+    long_ago = datetime.utcnow() - timedelta(hours=1)
+    running = queued_job(app, user_id, status=RUNNING, heartbeat_at=long_ago)
+    finished = queued_job(app, user_id, status=SUCCEEDED, heartbeat_at=long_ago)
+
+    with app.app_context():
+        record_job_heartbeats({running, finished})
+    assert get_job(app, running).heartbeat_at > long_ago
+    assert get_job(app, finished).heartbeat_at == long_ago
+
+
+def test_run_job_records_outcomes(app, make_user, monkeypatch):
+    user_id = make_user('author')
+
+    def succeed(job, payload, progress):
+        progress.update(payload['n'], payload['n'], force=True)
+        return {'done': payload['n']}
+
+    def fail(job, payload, progress):
+        raise JobError('Halfway there', {'done': 1})
+
+    def reject(job, payload, progress):
+        raise TimelineError('Timeline not found')
+
+    def crash(job, payload, progress):
+        raise ValueError('bug')
+
+    for kind, handler in (('succeed', succeed), ('fail', fail), ('reject', reject), ('crash', crash)):
+        monkeypatch.setitem(JOB_HANDLERS, kind, (handler, True))
+    job_ids = {kind: queued_job(app, user_id, kind, payload=json.dumps({'n': 3}))
+               for kind in ('succeed', 'fail', 'reject', 'crash', 'unknown')}
+
+    assert run_queued_jobs(app) == sorted(job_ids.values())
+
+    jobs = {kind: get_job(app, job_id) for kind, job_id in job_ids.items()}
+    outcomes = {kind: (job.status, json.loads(job.result) if job.result else None, job.error) for kind, job in jobs.items()}
+    assert outcomes == {
+        'succeed': (SUCCEEDED, {'done': 3}, None),
+        'fail': (FAILED, {'done': 1}, 'Halfway there'),
+        'reject': (FAILED, None, 'Timeline not found'),
+        'crash': (FAILED, None, 'Internal server error'),
+        'unknown': (FAILED, None, 'Unknown job kind: unknown'),
+    }
+    assert (jobs['succeed'].progress, jobs['succeed'].total) == (3, 3)
+    assert all(job.finished_at is not None for job in jobs.values())
+
+
+def test_import_with_respond_async_is_queued(app, make_user, make_timeline, login):
+    user_id = make_user('author')
+    timeline_id = make_timeline(user_id)
+    client = login(user_id)
+    body = '{"title": "Coronation", "date": "1200"}\n{"title": "", "date": "1300"}\n'
+
+    response = client.post(f'/api/timeline/{timeline_id}/events/import', data=body,
+                           content_type='application/x-ndjson', headers={'Prefer': 'respond-async'})
+
+    assert response.status_code == 202
+    assert response.headers['Preference-Applied'] == 'respond-async'
+    location = response.headers['Location']
+    job = response.get_json()
+    assert location.endswith(f"/api/jobs/{job['id']}")
+    assert (job['kind'], job['status']) == ('import', QUEUED)
+    upload = json.loads(get_job(app, job['id']).payload)['path']
+    assert os.path.exists(upload)
+    assert count_events(app) == 0
+    # Jobs are only shown to their owner
+    assert login(make_user('other')).get(location).status_code == 404
+
+    run_queued_jobs(app)
+
+    job = client.get(location).get_json()
+    assert job['status'] == SUCCEEDED
+    assert (job['result']['imported'], job['result']['failed']) == (1, 1)
+    assert job['progress']['done'] == job['progress']['total'] == len(body)
+    assert not os.path.exists(upload)
+    assert count_events(app) == 1
+
+
+def test_export_with_respond_async_is_downloaded_from_the_job(app, make_user, make_timeline, login):
+    user_id = make_user('author')
+    timeline_id = make_timeline(user_id)
+    client = login(user_id)
+    for n in range(3):
+        client.post(f'/api/timeline/{timeline_id}/events', json={'title': f'Event {n}', 'description': '', 'date': str(1000 + n)})
+
+    response = client.get(f'/api/timeline/{timeline_id}/export', headers={'Prefer': 'respond-async'})
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+    assert client.get(f'/api/jobs/{job_id}/result').status_code == 409
+
+    run_queued_jobs(app)
+
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert job['status'] == SUCCEEDED
+    download = client.get(job['result_url'])
+    assert download.status_code == 200
+    assert [json.loads(line)['title'] for line in download.data.decode().splitlines()] == ['Event 0', 'Event 1', 'Event 2']
+
+
+def test_reindex_is_always_queued(app, make_user, make_timeline, login):
+    user_id = make_user('author')
+    timeline_id = make_timeline(user_id)
+    client = login(user_id)
+    client.post(f'/api/timeline/{timeline_id}/events', json={'title': 'Event', 'description': '', 'date': '1000'})
+
+    response = client.post(f'/api/timeline/{timeline_id}/reindex')
+
+    assert response.status_code == 202
+    assert 'Preference-Applied' not in response.headers
+    assert login(make_user('other')).post(f'/api/timeline/{timeline_id}/reindex').status_code == 403
+    run_queued_jobs(app)
+    assert client.get(response.headers['Location']).get_json()['status'] == SUCCEEDED
+
+
+def test_prune_jobs_deletes_old_finished_jobs_and_their_files(app, make_user, tmp_path):
+    user_id = make_user('author')
+    path = tmp_path / 'export.ndjson'
+    path.write_text('{}\n')
+    old = datetime.utcnow() - timedelta(days=10)
+    pruned = queued_job(app, user_id, status=SUCCEEDED, finished_at=old, payload=json.dumps({'path': str(path)}))
+    recent = queued_job(app, user_id, status=FAILED, finished_at=datetime.utcnow())
+    waiting = queued_job(app, user_id)
+
+    with app.app_context():
+        assert prune_jobs(7) == 1
+        assert {job.id for job in db.session.scalars(db.select(Job))} == {recent, waiting}
+    assert not path.exists()
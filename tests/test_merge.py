@@ -0,0 +1,64 @@
+"""Tests for fork diffs and merge planning."""
+
+from utils.merge import diff_fork, plan_merge
+from utils.timeline import Event
+
+
+def event(event_id, title, date='1000'):
+    return Event(id=event_id, title=title, description='', date=date)
+
+
+BASE = {event_id: event(event_id, f'Original {event_id}') for event_id in 'abcdef'}
+
+
+def base_hash(event_id):
+    return BASE[event_id].content_hash()
+
+
+def test_diff_fork_pairs_changes_with_the_parent():
+    parent = [BASE['a'], event('b', 'Parent edit')]
+    fork = [(event('a', 'Fork edit'), base_hash('a')), (event('new', 'Added'), None)]
+    deleted = [('b', base_hash('b'))]
+
+    changes = {change.event_id: change for change in diff_fork(parent, fork, deleted)}
+
+    assert changes['a'].status == 'modified'
+    assert changes['a'].upstream == 'unchanged'
+    assert changes['new'].status == 'added'
+    assert changes['new'].parent is None
+    assert changes['b'].status == 'deleted'
+    assert changes['b'].upstream == 'modified'
+
+
+def test_plan_merge():
+    parent = [
+        BASE['a'],  # Unchanged upstream: the fork's edit applies
+        event('b', 'Parent edit'),  # Changed on both sides: conflict
+        event('c', 'Same edit'),  # Both sides made the same edit: in sync
+        BASE['d'],  # Deleted by the fork and unchanged upstream: the deletion applies
+    ]  # 'e' was deleted upstream and edited by the fork: conflict
+    fork = [
+        (event('a', 'Fork edit'), base_hash('a')),
+        (event('b', 'Fork edit'), base_hash('b')),
+        (event('c', 'Same edit'), base_hash('c')),
+        (event('e', 'Fork edit'), base_hash('e')),
+        (event('new', 'Added'), None),
+    ]
+    deleted = [('d', base_hash('d')), ('f', base_hash('f'))]  # 'f' is gone on both sides
+
+    apply, in_sync, conflicts = plan_merge(diff_fork(parent, fork, deleted))
+
+    assert sorted(change.event_id for change in apply) == ['a', 'd', 'new']
+    assert sorted(change.event_id for change in in_sync) == ['c', 'f']
+    assert sorted(change.event_id for change in conflicts) == ['b', 'e']
+    assert next(change for change in conflicts if change.event_id == 'e').upstream == 'deleted'
+
+
+def test_change_to_dict():
+    change, = diff_fork([BASE['a']], [(event('a', 'Fork edit'), base_hash('a'))], [])
+    data = change.to_dict()
+    assert data['id'] == 'a'
+    assert data['status'] == 'modified'
+    assert data['upstream'] == 'unchanged'
+    assert data['parent']['title'] == 'Original a'
+    assert data['fork']['title'] == 'Fork edit'
@@ -0,0 +1,161 @@
+"""Tests for precomputed timeline snapshots."""
+
+from datetime import datetime, timedelta
+import gzip
+import hashlib
+import json
+import os
+
+import pytest
+
+from app import QUEUED, Job, Timeline, db
+from tests.test_forks import add_event, edit_event
+from tests.test_jobs import claim, get_job, run_queued_jobs
+from utils.snapshots import LocalSnapshotStore, render_snapshot
+
+
+@pytest.fixture
+def app_config():
+    return {'SNAPSHOT_STORE': 'local', 'SNAPSHOT_DEBOUNCE': 10, 'SNAPSHOT_MAX_DELAY': 60}
+
+
+def snapshot_jobs(app, timeline_id):
+    with app.app_context():
+        return db.session.scalars(
+            db.select(Job).where(Job.kind == 'snapshot', Job.timeline_id == timeline_id).order_by(Job.id)
+        ).all()
+
+
+def make_due(app, job_id):
+    """Let a debounced job run now"""
+    with app.app_context():
+        db.session.get(Job, job_id).run_after = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+
+def get_timeline(app, timeline_id):
+    with app.app_context():
+        return db.session.get(Timeline, timeline_id)
+
+
+def test_render_snapshot_is_named_after_its_content():
+    payload = b'{"title": "Timeline"}'
+    key, data = render_snapshot(payload)
+    assert key == hashlib.sha256(payload).hexdigest() + '.json.gz'
+    assert gzip.decompress(data) == payload
+    assert render_snapshot(payload) == (key, data)
+    assert render_snapshot(b'{"title": "Other"}')[0] != key
+
+
+def test_local_snapshot_store(tmp_path):
+    store = LocalSnapshotStore(str(tmp_path / 'snapshots'))
+    key, data = render_snapshot(b'{}')
+    assert not store.exists(key)
+
+    store.put(key, data)
+
+    assert store.exists(key)
+    assert store.get(key) == data
+    assert os.listdir(tmp_path / 'snapshots') == [key]
+    assert store.url(key) is None
+    assert LocalSnapshotStore(str(tmp_path / 'snapshots'), base_url='https://cdn.example.com/s/').url(key) == \
+        f'https://cdn.example.com/s/{key}'
+
+
+def test_writes_are_debounced_into_one_snapshot_job(app, make_user, make_timeline, login):
+    user_id = make_user('author')
+    timeline_id = make_timeline(user_id)
+    client = login(user_id)
+
+    before = datetime.utcnow()
+    event_id = add_event(client, timeline_id, 'First')
+    [job] = snapshot_jobs(app, timeline_id)
+    assert job.status == QUEUED
+    assert before + timedelta(seconds=10) <= job.run_after <= datetime.utcnow() + timedelta(seconds=10)
+    # Not due yet
+    assert claim(app) is None
+
+    first_run_after = job.run_after
+    edit_event(client, timeline_id, event_id, 'Edited')
+    [job] = snapshot_jobs(app, timeline_id)
+    assert job.run_after > first_run_after
+
+    # Postponed at most SNAPSHOT_MAX_DELAY after the job was queued
+    with app.app_context():
+        db.session.get(Job, job.id).created_at = datetime.utcnow() - timedelta(seconds=55)
+        db.session.commit()
+    add_event(client, timeline_id, 'Second', '1100')
+    [job] = snapshot_jobs(app, timeline_id)
+    assert job.run_after == job.created_at + timedelta(seconds=60)
+
+
+def test_snapshot_job_renders_the_timeline_and_reads_use_it(app, make_user, make_timeline, login):
+    user_id = make_user('author')
+    timeline_id = make_timeline(user_id)
+    client = login(user_id)
+    add_event(client, timeline_id, 'Coronation')
+    from_database = client.get(f'/api/timeline/{timeline_id}')
+    assert 'Content-Encoding' not in from_database.headers
+
+    [job] = snapshot_jobs(app, timeline_id)
+    make_due(app, job.id)
+    assert run_queued_jobs(app) == [job.id]
+
+    result = json.loads(get_job(app, job.id).result)
+    timeline = get_timeline(app, timeline_id)
+    assert timeline.snapshot_key == result['key']
+    path = os.path.join(app.config['SNAPSHOT_DIR'], result['key'])
+    with open(path, 'rb') as snapshot:
+        assert result['key'] == render_snapshot(gzip.decompress(snapshot.read()))[0]
+
+    response = client.get(f'/api/timeline/{timeline_id}', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data)) == from_database.get_json()
+    response = client.get(f'/api/timeline/{timeline_id}')
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == from_database.get_json()
+
+    app.config['SNAPSHOT_BASE_URL'] = 'https://cdn.example.com/snapshots'
+    app.extensions.pop('snapshots')
+    response = client.get(f'/api/timeline/{timeline_id}')
+    assert response.status_code == 302
+    assert response.headers['Location'] == f"https://cdn.example.com/snapshots/{result['key']}"
+    assert response.cache_control.no_cache
+
+
+def test_stale_snapshots_are_not_served_and_get_replaced(app, make_user, make_timeline, login, monkeypatch):
+    user_id = make_user('author')
+    timeline_id = make_timeline(user_id)
+    client = login(user_id)
+    event_id = add_event(client, timeline_id, 'Coronation')
+    [job] = snapshot_jobs(app, timeline_id)
+    make_due(app, job.id)
+    run_queued_jobs(app)
+    old_key = get_timeline(app, timeline_id).snapshot_key
+
+    edit_event(client, timeline_id, event_id, 'Coronation, delayed')
+
+    response = client.get(f'/api/timeline/{timeline_id}', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json()['events'][0]['title'] == 'Coronation, delayed'
+    [_, job] = snapshot_jobs(app, timeline_id)
+    make_due(app, job.id)
+    run_queued_jobs(app)
+    new_key = get_timeline(app, timeline_id).snapshot_key
+    assert new_key != old_key
+    # Snapshots are immutable, the old one is left for caches still holding its URL
+    assert sorted(os.listdir(app.config['SNAPSHOT_DIR'])) == sorted([old_key, new_key])
+
+    # Rendering content the store already has doesn't write it again
+    writes = []
+    monkeypatch.setattr(LocalSnapshotStore, 'put', lambda store, key, data: writes.append(key))
+    with app.app_context():
+        db.session.execute(db.update(Timeline).where(Timeline.id == timeline_id)
+                           .values(snapshot_version=None, modified_at=Timeline.modified_at))
+        db.session.commit()
+    client.get(f'/api/timeline/{timeline_id}')
+    [*_, job] = snapshot_jobs(app, timeline_id)
+    make_due(app, job.id)
+    run_queued_jobs(app)
+    assert get_timeline(app, timeline_id).snapshot_key == new_key
+    assert writes == []
@@ -0,0 +1,170 @@
+"""
+Zoom-level aggregation for Fiction Timelines application.
+Summarizes events as a pyramid of date buckets, each level four times coarser than the one below,
+so zoomed-out views are counted from a bounded number of precomputed buckets.
+"""
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import math
+
+FANOUT = 4
+LEVELS = 16  # Level 0 buckets are one date key unit wide (a year in most dating systems)
+ALL_EVENTS = None  # Stands in for a category in the counts of every event, whatever its categories
+MAX_KEY = 2.0 ** 53  # Date keys beyond this can't be bucketed exactly and are left out
+
+BucketKey = Tuple[int, int, Optional[str]]  # (level, bucket, category or ALL_EVENTS)
+SummaryEntry = Tuple[Optional[float], Iterable[str]]  # (date key, categories) of an event
+
+
+def bucket_width(level: int) -> int:
+    """Width of the buckets of a pyramid level, in date key units"""
+    return FANOUT ** level
+
+
+def bucket_deltas(added: Iterable[SummaryEntry] = (), removed: Iterable[SummaryEntry] = ()) -> Dict[BucketKey, int]:
+    """
+    Compute the changes to the pyramid's bucket counts caused by adding and removing events
+
+    Events are counted in the bucket holding their start date at every
+    level, once in the bucket of all events and once per category. Events
+    without a date key are left out. An edit is the removal of the old
+    version and the addition of the new one, so buckets it doesn't move
+    between cancel out.
+
+    Args:
+        added: (date key, categories) of the events added
+        removed: (date key, categories) of the events removed
+
+    Returns:
+        Dict[BucketKey, int]: Non-zero count changes per (level, bucket, category)
+    """
+    deltas: Dict[BucketKey, int] = {}
+    for entries, sign in ((added, 1), (removed, -1)):
+        for date_key, categories in entries:
+            if date_key is None or abs(date_key) >= MAX_KEY:
+                continue
+            base = math.floor(date_key)
+            labels = (ALL_EVENTS, *set(categories))
+            for level in range(LEVELS):
+                # Floor division of the level 0 bucket gives the floor at every level, negative keys included
+                bucket = base // FANOUT ** level
+                for category in labels:
+                    key = (level, bucket, category)
+                    deltas[key] = deltas.get(key, 0) + sign
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+@dataclass
+class Binning:
+    """
+    Division of the date keys from start up to, but excluding, end into equal bins
+
+    Bins counted from the pyramid are aligned to the buckets of one level,
+    each covering a whole number of them. Bins narrower than a level 0
+    bucket have no level and are counted from the events themselves.
+    """
+    start: float
+    end: float
+    count: int
+    level: Optional[int] = None
+    first_bucket: int = 0
+    buckets_per_bin: int = 1
+
+    @property
+    def width(self) -> float:
+        return (self.end - self.start) / self.count
+
+    @property
+    def last_bucket(self) -> int:
+        return self.first_bucket + self.count * self.buckets_per_bin - 1
+
+    def bounds(self, index: int) -> Tuple[float, float]:
+        """Start and end date keys of a bin, the end excluded"""
+        end = self.end if index == self.count - 1 else self.start + (index + 1) * self.width
+        return self.start + index * self.width, end
+
+    def bin_of(self, date_key: float) -> int:
+        """Index of the bin holding a date key, clamped to the first and last bins"""
+        return min(max(int((date_key - self.start) // self.width), 0), self.count - 1)
+
+    def bin_of_bucket(self, bucket: int) -> int:
+        """Index of the bin holding a bucket of the binning's level"""
+        return (bucket - self.first_bucket) // self.buckets_per_bin
+
+
+def plan_bins(start: float, end: float, bins: int) -> Binning:
+    """
+    Divide a date range into at most the given number of bins
+
+    The coarsest level whose buckets are no wider than the requested bins is
+    used, so the range spans at most a few times as many buckets as bins.
+    Aligning the bins to those buckets can extend the first and last bins
+    past the range.
+
+    Args:
+        start: Date key where the range starts
+        end: Date key where the range ends, included
+        bins: Maximum number of bins
+
+    Returns:
+        Binning: Bins covering the range
+    """
+    # Move the end just past the last date key so the bins, which exclude their end, include it
+    single_date = end <= start
+    end = end + max(abs(end), 1.0) * 2.0 ** -52
+    if single_date:
+        return Binning(start, end, 1)
+    width = (end - start) / bins
+    if width < 1 or max(abs(start), abs(end)) >= MAX_KEY:
+        return Binning(start, end, bins)
+
+    level = min(int(math.log(width, FANOUT)), LEVELS - 1)
+    # Rounding in log() can land one level too high
+    if bucket_width(level) > width:
+        level -= 1
+    first_bucket = math.floor(start) // bucket_width(level)
+    buckets = math.floor(end) // bucket_width(level) - first_bucket + 1
+    buckets_per_bin = -(-buckets // bins)
+    count = -(-buckets // buckets_per_bin)
+    return Binning(
+        start=float(first_bucket * bucket_width(level)),
+        end=float((first_bucket + count * buckets_per_bin) * bucket_width(level)),
+        count=count,
+        level=level,
+        first_bucket=first_bucket,
+        buckets_per_bin=buckets_per_bin
+    )
+
+
+class BinCounts:
+    """Event and category counts accumulated per bin"""
+
+    def __init__(self, binning: Binning):
+        self.binning = binning
+        self.events = [0] * binning.count
+        self.categories = [Counter() for _ in range(binning.count)]
+
+    def add(self, index: int, category: Optional[str], count: int) -> None:
+        """Add to the count of a category in a bin, or to its event count for ALL_EVENTS"""
+        if category is ALL_EVENTS:
+            self.events[index] += count
+        else:
+            self.categories[index][category] += count
+
+    def add_events(self, entries: Iterable[SummaryEntry], sign: int = 1) -> None:
+        """Count individual events, or with sign -1 discount them, in the bins holding their dates"""
+        for date_key, categories in entries:
+            if date_key is None:
+                continue
+            index = self.binning.bin_of(date_key)
+            self.add(index, ALL_EVENTS, sign)
+            for category in set(categories):
+                self.add(index, category, sign)
+
+    def top_categories(self, index: int, limit: int) -> List[Dict]:
+        """Most common categories of a bin, ties broken by name"""
+        counts = sorted((item for item in self.categories[index].items() if item[1] > 0),
+                        key=lambda item: (-item[1], item[0]))
+        return [{'name': name, 'count': count} for name, count in counts[:limit]]
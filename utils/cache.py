@@ -0,0 +1,250 @@
+"""
+Caching utilities for Fiction Timelines application.
+Keeps hydrated timelines, resolved permissions and known users in memory so read-heavy pages don't rebuild them on every request.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import threading
+import time
+
+from utils.timeline import Permission, Timeline
+
+
+@dataclass
+class CachedTimeline:
+    """A hydrated timeline together with its encoded JSON"""
+    timeline: Timeline
+    payload: bytes
+    version: Tuple[datetime, ...]
+    weight: int
+
+
+class TimelineCache:
+    """
+    Process-wide LRU cache of hydrated timelines
+
+    Entries are keyed by timeline uuid and only served while the stored
+    version matches the caller's. A version is the modification times of the
+    timeline and of the ancestors it inherits events from, so a write in any
+    worker process makes the cached copy stale without explicit
+    coordination. The cache is bounded both by entry count and by total
+    weight, where an entry weighs one plus its number of events as a proxy
+    for memory use.
+    """
+
+    def __init__(self, max_entries: int = 128, max_weight: int = 200000):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, CachedTimeline]' = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+
+    def get(self, timeline_uuid: str, version: Tuple[datetime, ...]) -> Optional[CachedTimeline]:
+        """
+        Look up a cached timeline
+
+        Args:
+            timeline_uuid: UUID of the timeline
+            version: Current modification times of the timeline and its ancestors
+
+        Returns:
+            CachedTimeline if a fresh entry exists, None otherwise
+        """
+        with self._lock:
+            entry = self._entries.get(timeline_uuid)
+            if entry is None or entry.version != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(timeline_uuid)
+            self.hits += 1
+            return entry
+
+    def put(self, timeline_uuid: str, version: Tuple[datetime, ...], timeline: Timeline, payload: bytes) -> CachedTimeline:
+        """
+        Store a hydrated timeline, evicting least recently used entries if needed
+
+        Args:
+            timeline_uuid: UUID of the timeline
+            version: Modification times the timeline was hydrated at
+            timeline: Hydrated timeline
+            payload: Timeline encoded as JSON
+
+        Returns:
+            CachedTimeline: The stored entry
+        """
+        entry = CachedTimeline(timeline=timeline, payload=payload, version=version,
+                               weight=1 + len(timeline.events))
+        with self._lock:
+            self._discard(timeline_uuid)
+            if entry.weight > self.max_weight:
+                # Too large to ever fit, hand it back without caching
+                return entry
+            self._entries[timeline_uuid] = entry
+            self._weight += entry.weight
+            while len(self._entries) > self.max_entries or self._weight > self.max_weight:
+                _, evicted = self._entries.popitem(last=False)
+                self._weight -= evicted.weight
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, timeline_uuid: str) -> None:
+        """Drop the cached entry for a timeline, if any"""
+        with self._lock:
+            self._discard(timeline_uuid)
+
+    def clear(self) -> None:
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+            self._weight = 0
+
+    def stats(self) -> Dict:
+        """Return cache counters for sizing and monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'weight': self._weight,
+                'max_entries': self.max_entries,
+                'max_weight': self.max_weight,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _discard(self, timeline_uuid: str) -> None:
+        entry = self._entries.pop(timeline_uuid, None)
+        if entry is not None:
+            self._weight -= entry.weight
+
+
+class PermissionCache:
+    """
+    Process-wide cache of users' resolved timeline permissions
+
+    Permissions are checked on every write but change rarely, so resolved
+    values are kept for a short time. The process that changes a timeline's
+    collaborators invalidates its entries directly, and other worker
+    processes pick the change up once their entries expire.
+    """
+
+    MISSING = object()
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[int, int], Tuple[Optional[Permission], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, timeline_id: int, user_id: int):
+        """
+        Look up a user's resolved permission on a timeline
+
+        Returns:
+            The Permission, None if the user has no access, or
+            PermissionCache.MISSING if nothing fresh is cached
+        """
+        key = (timeline_id, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return self.MISSING
+            self.hits += 1
+            return entry[0]
+
+    def put(self, timeline_id: int, user_id: int, permission: Optional[Permission]) -> None:
+        """Store a user's resolved permission on a timeline"""
+        key = (timeline_id, user_id)
+        with self._lock:
+            self._entries[key] = (permission, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, timeline_id: int) -> None:
+        """Drop the cached permissions of every user on a timeline"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == timeline_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Return cache counters for sizing and monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class UserCache:
+    """
+    Process-wide cache of user ids known to exist
+
+    Every request restored from a session cookie has to confirm its user
+    still exists, so ids found in the database are remembered for a short
+    time. Missing users aren't cached, and a deleted user's sessions stop
+    working once their entry expires.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[int, float]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> bool:
+        """Whether the user was recently found to exist"""
+        with self._lock:
+            expires_at = self._entries.get(user_id)
+            if expires_at is None or expires_at < time.monotonic():
+                self.misses += 1
+                return False
+            self.hits += 1
+            return True
+
+    def put(self, user_id: int) -> None:
+        """Remember that a user exists"""
+        with self._lock:
+            self._entries[user_id] = time.monotonic() + self.ttl
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Forget a user, so the next request checks the database again"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Return cache counters for sizing and monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,186 @@
+"""
+Dating system module for Fiction Timelines application.
+Compiles free-form event dates into numeric keys that can be sorted, compared and range-queried.
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+import re
+
+_NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+class DatingSystem:
+    """Base class for dating system parsers"""
+    name = None
+
+    def parse(self, date: str) -> Optional[float]:
+        """
+        Convert a date string into a sortable numeric key
+
+        Args:
+            date: Date string in this dating system
+
+        Returns:
+            float: Sort key, or None if the date can't be parsed
+        """
+        raise NotImplementedError
+
+
+class NumericDatingSystem(DatingSystem):
+    """Fallback parser that orders dates by the first number they contain"""
+    name = 'custom'
+
+    def parse(self, date: str) -> Optional[float]:
+        match = _NUMBER_PATTERN.search(date or '')
+        return float(match.group()) if match else None
+
+
+class CommonEraDatingSystem(DatingSystem):
+    """
+    Gregorian years with optional month and day, e.g. "1066", "44 BCE",
+    "AD 793", "1066-10-14" or "14 October 1066"
+
+    BCE years are mapped to astronomical numbering (1 BCE is year 0), and
+    months and days are folded into the fractional part of the year.
+    """
+    name = 'CE'
+
+    _BCE = re.compile(r'\bB\.?\s?C\.?(?:\s?E\.?)?(?!\w)', re.IGNORECASE)
+    _CE = re.compile(r'\b(?:C\.?\s?E\.?|A\.?\s?D\.?)(?!\w)', re.IGNORECASE)
+    _ISO = re.compile(r'^(-?\d+)-(\d{1,2})(?:-(\d{1,2}))?\b')
+    # Full month names and standard abbreviations only, so words such as "Marriage" or "Augustus" aren't months
+    _MONTH = re.compile(
+        r'\b(january|jan|february|feb|march|mar|april|apr|may|june|jun|july|jul|august|aug'
+        r'|september|sept|sep|october|oct|november|nov|december|dec)\b\.?', re.IGNORECASE)
+    _MONTHS = {name: i for i, name in enumerate(
+        ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1)}
+
+    def parse(self, date: str) -> Optional[float]:
+        text = (date or '').strip()
+        bce = bool(self._BCE.search(text))
+        text = self._CE.sub('', self._BCE.sub('', text)).strip()
+
+        month = day = None
+        iso = self._ISO.match(text)
+        if iso:
+            year = int(iso.group(1))
+            month = int(iso.group(2))
+            day = int(iso.group(3)) if iso.group(3) else None
+        else:
+            numbers = [int(n) for n in re.findall(r'-?\d+', text)]
+            if not numbers:
+                return None
+            month_match = self._MONTH.search(text)
+            if month_match and len(numbers) > 1:
+                month = self._MONTHS[month_match.group(1)[:3].lower()]
+                # The year is the last number, unless the day comes last ("1066 Oct 14")
+                year, day = (numbers[0], numbers[1]) if abs(numbers[0]) > 31 else (numbers[-1], numbers[0])
+            else:
+                if month_match:
+                    month = self._MONTHS[month_match.group(1)[:3].lower()]
+                year = numbers[0]
+
+        if bce:
+            year = 1 - abs(year)
+        key = float(year)
+        if month and 1 <= month <= 12:
+            key += (month - 1) / 12
+            if day and 1 <= day <= 31:
+                key += (day - 1) / (12 * 31)
+        return key
+
+
+class StardateDatingSystem(DatingSystem):
+    """Stardates such as "Stardate 41153.7" or "SD 41153.7\""""
+    name = 'Stardate'
+
+    _STARDATE = re.compile(r'^\s*(?:stardate|sd)?\s*:?\s*(-?\d+(?:\.\d+)?)', re.IGNORECASE)
+
+    def parse(self, date: str) -> Optional[float]:
+        match = self._STARDATE.match(date or '')
+        return float(match.group(1)) if match else None
+
+
+class EraDatingSystem(DatingSystem):
+    """
+    Years counted within named eras, e.g. "Third Age 3019" or "3019 T.A."
+
+    Each era in the table has a starting offset on a shared absolute scale,
+    and a date's key is its era's offset plus the year within the era.
+    """
+
+    def __init__(self, name: str, eras: Sequence[Tuple[str, float]]):
+        self.name = name
+        self.eras = {label.lower(): float(start) for label, start in eras}
+        labels = '|'.join(re.escape(label) for label in sorted(self.eras, key=len, reverse=True))
+        self._prefix = re.compile(rf'^\s*({labels})\s*(-?\d+(?:\.\d+)?)', re.IGNORECASE)
+        self._suffix = re.compile(rf'^\s*(-?\d+(?:\.\d+)?)\s*({labels})(?!\w)', re.IGNORECASE)
+
+    def parse(self, date: str) -> Optional[float]:
+        match = self._prefix.match(date or '')
+        if match:
+            return self.eras[match.group(1).lower()] + float(match.group(2))
+        match = self._suffix.match(date or '')
+        if match:
+            return self.eras[match.group(2).lower()] + float(match.group(1))
+        return None
+
+
+_registry: Dict[str, DatingSystem] = {}
+
+
+def register_dating_system(system: DatingSystem) -> None:
+    """Make a dating system available to timelines by name"""
+    _registry[system.name] = system
+
+
+def get_dating_system(name: str, era_table: Optional[Sequence[Tuple[str, float]]] = None) -> DatingSystem:
+    """
+    Look up the parser for a timeline's dating system
+
+    Args:
+        name: Dating system label stored on the timeline
+        era_table: Optional user-defined list of (era name, start offset) pairs
+
+    Returns:
+        DatingSystem: The registered parser, an era parser for the given table,
+        or the numeric fallback for unknown labels
+    """
+    if era_table:
+        return _era_dating_system(name, tuple((label, float(start)) for label, start in era_table))
+    return _registry.get(name) or _registry[NumericDatingSystem.name]
+
+
+@lru_cache(maxsize=256)
+def _era_dating_system(name: str, eras: Tuple[Tuple[str, float], ...]) -> EraDatingSystem:
+    return EraDatingSystem(name, eras)
+
+
+def parse_era_table(text: str) -> List[Tuple[str, float]]:
+    """
+    Parse a user-supplied era table with one "Era name: start" pair per line
+
+    Raises:
+        ValueError: If a line isn't in the expected format
+    """
+    eras = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        label, sep, start = line.rpartition(':')
+        if not sep or not label.strip():
+            raise ValueError(f"Invalid era definition: {line.strip()}")
+        eras.append((label.strip(), float(start)))
+    return eras
+
+
+register_dating_system(NumericDatingSystem())
+register_dating_system(CommonEraDatingSystem())
+register_dating_system(StardateDatingSystem())
+register_dating_system(EraDatingSystem('Middle-earth', [
+    ('First Age', 0), ('F.A.', 0),
+    ('Second Age', 590), ('S.A.', 590),
+    ('Third Age', 4031), ('T.A.', 4031),
+    ('Fourth Age', 7052), ('Fo.A.', 7052)
+]))
@@ -0,0 +1,147 @@
+"""
+Event interchange formats for Fiction Timelines application.
+Streams events in and out of timelines as NDJSON or CSV without holding whole files in memory.
+"""
+
+from typing import BinaryIO, Dict, Iterable, Iterator, Tuple
+import csv
+import io
+import json
+import uuid
+import zlib
+
+from utils.timeline import Event, TimelineError
+
+# Columns of the CSV format, in order. Categories and tags are comma-separated within their cells.
+EVENT_CSV_FIELDS = ['title', 'description', 'date', 'end_date', 'categories', 'tags']
+
+# Exports are flushed to the client in chunks of roughly this many bytes
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def iter_ndjson_records(stream: BinaryIO) -> Iterator[Tuple[int, Dict]]:
+    """
+    Parse newline-delimited JSON one line at a time
+
+    Yields:
+        Tuple[int, Dict]: Line number and parsed record. Lines that aren't JSON
+        objects are yielded as a record holding only an '_error' key so the
+        caller can report them without aborting the import.
+    """
+    for line_number, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8'), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, {'_error': f"Invalid JSON: {e}"}
+            continue
+        if not isinstance(record, dict):
+            yield line_number, {'_error': "Record must be a JSON object"}
+            continue
+        yield line_number, record
+
+
+def iter_csv_records(stream: BinaryIO) -> Iterator[Tuple[int, Dict]]:
+    """
+    Parse CSV with a header row one row at a time
+
+    Yields:
+        Tuple[int, Dict]: Row number (the header is row 1) and the row's fields
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+    for row_number, row in enumerate(reader, start=2):
+        yield row_number, row
+
+
+def event_from_record(record: Dict) -> Event:
+    """
+    Validate an imported record and convert it to an Event with a new ID
+
+    Raises:
+        TimelineError: If a required field is missing or a field has the wrong type
+    """
+    if '_error' in record:
+        raise TimelineError(record['_error'])
+    for name in ('title', 'date'):
+        if not isinstance(record.get(name), str) or not record[name].strip():
+            raise TimelineError(f"Missing required field: {name}")
+    for name in ('description', 'end_date'):
+        if record.get(name) is not None and not isinstance(record[name], str):
+            raise TimelineError(f"Field {name} must be a string")
+
+    return Event(
+        id=str(uuid.uuid4()),
+        title=record['title'],
+        description=record.get('description') or '',
+        date=record['date'],
+        end_date=record.get('end_date') or None,
+        categories=parse_labels(record.get('categories'), 'categories'),
+        tags=parse_labels(record.get('tags'), 'tags')
+    )
+
+
+def parse_labels(value, name: str) -> set:
+    """
+    Accept labels as a list or as a comma-separated string
+
+    Labels are stripped and blank ones dropped.
+
+    Raises:
+        TimelineError: If the value is neither a list of strings nor a string
+    """
+    if value is None:
+        return set()
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list) or not all(isinstance(label, str) for label in value):
+        raise TimelineError(f"Field {name} must be a list of strings")
+    return {label.strip() for label in value if label.strip()}
+
+
+def iter_ndjson_chunks(events: Iterable[Event]) -> Iterator[bytes]:
+    """Serialize events as newline-delimited JSON, one buffered chunk at a time"""
+    return _chunked(json.dumps(event.to_dict()) + '\n' for event in events)
+
+
+def iter_csv_chunks(events: Iterable[Event]) -> Iterator[bytes]:
+    """Serialize events as CSV with a header row, one buffered chunk at a time"""
+    def rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['id'] + EVENT_CSV_FIELDS)
+        for event in events:
+            writer.writerow([
+                event.id, event.title, event.description, event.date, event.end_date or '',
+                ','.join(sorted(event.categories)), ','.join(sorted(event.tags))
+            ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    return _chunked(rows())
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a stream of chunks into a gzip stream without buffering it whole"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _chunked(pieces: Iterable[str]) -> Iterator[bytes]:
+    """Join small strings into chunks of about EXPORT_CHUNK_SIZE bytes"""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
@@ -0,0 +1,315 @@
+"""
+Request instrumentation for Fiction Timelines application.
+Records SQL query counts and timings and hot-path spans per request, and reports them as
+Server-Timing headers, structured logs and Prometheus metrics.
+"""
+
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import functools
+import json
+import logging
+import threading
+import time
+
+from flask import Flask, Response, g, request, before_render_template, template_rendered
+from sqlalchemy import event as sqlalchemy_event
+
+logger = logging.getLogger('fiction_timelines.requests')
+
+# Trace of the request being handled, None when instrumentation is off or outside a request
+_current: ContextVar[Optional['RequestTrace']] = ContextVar('request_trace', default=None)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class RequestTrace:
+    """Query and span timings collected while handling one request"""
+    __slots__ = ('started', 'queries', 'query_time', 'spans', 'render_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.spans: Dict[str, List] = {}  # Span name -> [count, total seconds]
+        self.render_started = None
+
+    def add_span(self, name: str, seconds: float) -> None:
+        totals = self.spans.get(name)
+        if totals is None:
+            self.spans[name] = [1, seconds]
+        else:
+            totals[0] += 1
+            totals[1] += seconds
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'started')
+
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.add_span(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def span(name: str):
+    """
+    Time a block of code as part of the current request's trace
+
+    Spans with the same name add up. When instrumentation is off, or no
+    request is being traced, this costs a single context variable lookup.
+
+    Usage:
+        with span('hydrate'):
+            ...
+    """
+    trace = _current.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name)
+
+
+def instrument_methods(cls: type, names: Iterable[str], prefix: str) -> None:
+    """
+    Wrap methods of a class in spans named prefix + method name
+
+    Classes are only patched when instrumentation is enabled, so their
+    methods run unwrapped otherwise. Wrapping twice is a no-op.
+    """
+    for name in names:
+        method = getattr(cls, name)
+        if getattr(method, '_span_name', None):
+            continue
+        span_name = prefix + name
+
+        @functools.wraps(method)
+        def wrapper(*args, _method=method, _span_name=span_name, **kwargs):
+            with span(_span_name):
+                return _method(*args, **kwargs)
+        wrapper._span_name = span_name
+        setattr(cls, name, wrapper)
+
+
+class Metrics:
+    """
+    In-process metrics rendered in the Prometheus text format
+
+    Counters and histograms are updated as requests finish. Collectors are
+    called when the metrics are scraped, to report values owned by other
+    objects such as cache statistics.
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._descriptions: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], List] = {}  # Bucket counts followed by sum and count
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def describe(self, name: str, metric_type: str, help_text: str) -> None:
+        self._descriptions[name] = (metric_type, help_text)
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1.0) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: Dict[str, str], value: float) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * len(self.BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """Register a function returning (name, labels, value) samples at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        samples: Dict[str, List[Tuple[Tuple, List[str]]]] = {}  # Metric name -> (labels, lines) per series
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                samples.setdefault(name, []).append((labels, [f"{name}{_labels(labels)} {_number(value)}"]))
+            for (name, labels), histogram in self._histograms.items():
+                lines = [f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}"
+                         for bound, count in zip(self.BUCKETS, histogram)]
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(histogram[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram[-1]}")
+                samples.setdefault(name, []).append((labels, lines))
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                labels = tuple(sorted(labels.items()))
+                samples.setdefault(name, []).append((labels, [f"{name}{_labels(labels)} {_number(value)}"]))
+
+        output = []
+        for name in sorted(samples):
+            if name in self._descriptions:
+                metric_type, help_text = self._descriptions[name]
+                output.append(f"# HELP {name} {help_text}")
+                output.append(f"# TYPE {name} {metric_type}")
+            for _, lines in sorted(samples[name], key=lambda series: series[0]):
+                output.extend(lines)
+        return '\n'.join(output) + '\n'
+
+
+def _labels(labels: Tuple) -> str:
+    """Format label pairs, escaping values as the exposition format requires"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def cache_samples(caches: Dict[str, object]) -> Callable[[], Iterable[Sample]]:
+    """Build a collector reporting the stats() of caches, labelled by the given names"""
+    def collect():
+        for cache_name, cache in caches.items():
+            stats = cache.stats()
+            labels = {'cache': cache_name}
+            yield 'cache_entries', labels, stats['entries']
+            for key in ('hits', 'misses', 'evictions'):
+                if key in stats:
+                    yield f'cache_{key}_total', labels, stats[key]
+    return collect
+
+
+def init_instrumentation(app: Flask, engine, metrics: Metrics) -> None:
+    """
+    Record SQL queries, spans and rendering time for every request of an application
+
+    Each response gets a Server-Timing header, requests slower than
+    INSTRUMENTATION_LOG_THRESHOLD_MS are logged as JSON to the
+    fiction_timelines.requests logger, and the totals are published as
+    Prometheus metrics at /metrics.
+
+    Args:
+        app: Application to instrument
+        engine: SQLAlchemy engine whose queries are counted
+        metrics: Registry receiving the per-request totals
+    """
+    log_threshold = app.config.get('INSTRUMENTATION_LOG_THRESHOLD_MS', 0) / 1000
+    metrics.describe('http_requests_total', 'counter', 'Requests handled, by endpoint, method and status')
+    metrics.describe('http_request_duration_seconds', 'histogram', 'Time to handle a request, by endpoint')
+    metrics.describe('db_queries_total', 'counter', 'SQL statements executed while handling requests, by endpoint')
+    metrics.describe('db_query_seconds_total', 'counter', 'Time spent in SQL statements while handling requests, by endpoint')
+    metrics.describe('span_seconds_total', 'counter', 'Time spent in instrumented code while handling requests, by span')
+    metrics.describe('span_calls_total', 'counter', 'Calls of instrumented code while handling requests, by span')
+    metrics.describe('cache_entries', 'gauge', 'Entries held by an in-process cache')
+    metrics.describe('cache_hits_total', 'counter', 'Lookups answered by an in-process cache')
+    metrics.describe('cache_misses_total', 'counter', 'Lookups an in-process cache could not answer')
+    metrics.describe('cache_evictions_total', 'counter', 'Entries evicted from an in-process cache')
+
+    @sqlalchemy_event.listens_for(engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and _current.get() is not None:
+            context._instrumentation_started = time.perf_counter()
+
+    @sqlalchemy_event.listens_for(engine, 'after_cursor_execute')
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        trace = _current.get()
+        started = getattr(context, '_instrumentation_started', None)
+        if trace is not None and started is not None:
+            trace.queries += 1
+            trace.query_time += time.perf_counter() - started
+
+    def start_render(sender, template, context, **extra):
+        trace = _current.get()
+        if trace is not None:
+            trace.render_started = time.perf_counter()
+
+    def end_render(sender, template, context, **extra):
+        trace = _current.get()
+        if trace is not None and trace.render_started is not None:
+            trace.add_span('render', time.perf_counter() - trace.render_started)
+            trace.render_started = None
+
+    # Signals hold their receivers weakly, and these only live in this scope
+    before_render_template.connect(start_render, app, weak=False)
+    template_rendered.connect(end_render, app, weak=False)
+
+    @app.before_request
+    def start_trace():
+        g.instrumentation_token = _current.set(RequestTrace())
+
+    @app.after_request
+    def finish_trace(response: Response) -> Response:
+        trace = _current.get()
+        if trace is None:
+            return response
+        duration = time.perf_counter() - trace.started
+        endpoint = request.endpoint or 'unmatched'
+
+        queries = f"{trace.queries} {'query' if trace.queries == 1 else 'queries'}"
+        timings = [f'db;dur={trace.query_time * 1000:.1f};desc="{queries}"']
+        timings.extend(f'{name};dur={seconds * 1000:.1f}' for name, (_, seconds) in trace.spans.items())
+        timings.append(f'app;dur={duration * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+
+        metrics.inc('http_requests_total', {'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code)})
+        metrics.observe('http_request_duration_seconds', {'endpoint': endpoint}, duration)
+        metrics.inc('db_queries_total', {'endpoint': endpoint}, trace.queries)
+        metrics.inc('db_query_seconds_total', {'endpoint': endpoint}, trace.query_time)
+        for name, (count, seconds) in trace.spans.items():
+            metrics.inc('span_calls_total', {'span': name}, count)
+            metrics.inc('span_seconds_total', {'span': name}, seconds)
+
+        if duration >= log_threshold:
+            logger.info(json.dumps({
+                'event': 'request',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'queries': trace.queries,
+                'query_ms': round(trace.query_time * 1000, 2),
+                'spans': {name: {'count': count, 'ms': round(seconds * 1000, 2)}
+                          for name, (count, seconds) in trace.spans.items()}
+            }, separators=(',', ':')))
+        return response
+
+    @app.teardown_request
+    def end_trace(exc):
+        token = g.pop('instrumentation_token', None)
+        if token is not None:
+            _current.reset(token)
+
+    def metrics_view():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
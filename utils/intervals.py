@@ -0,0 +1,142 @@
+"""
+Interval index for Fiction Timelines application.
+Finds events whose time spans overlap without scanning the whole timeline.
+"""
+
+from typing import Hashable, List, Optional
+import random
+
+
+class _Node:
+    __slots__ = ('start', 'end', 'item', 'priority', 'max_end', 'left', 'right')
+
+    def __init__(self, start: float, end: float, item: Hashable):
+        self.start = start
+        self.end = end
+        self.item = item
+        self.priority = random.random()
+        self.max_end = end
+        self.left = None
+        self.right = None
+
+    def update(self) -> None:
+        self.max_end = self.end
+        if self.left is not None and self.left.max_end > self.max_end:
+            self.max_end = self.left.max_end
+        if self.right is not None and self.right.max_end > self.max_end:
+            self.max_end = self.right.max_end
+
+
+class IntervalTree:
+    """
+    Dynamic set of half-open intervals [start, end) supporting overlap queries
+
+    Implemented as a treap ordered by (start, item) where every node tracks the
+    largest end in its subtree. Inserts and removals take O(log n) expected
+    time, and overlap queries skip every subtree that ends before the query
+    starts, so they only visit the paths leading to matching intervals.
+    Items must be orderable so that intervals sharing a start can be told apart.
+    """
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def insert(self, start: float, end: float, item: Hashable) -> None:
+        """Add an interval identified by item"""
+        self._root = self._insert(self._root, _Node(start, end, item))
+        self._size += 1
+
+    def remove(self, start: float, end: float, item: Hashable) -> None:
+        """Remove a previously inserted interval, ignoring unknown ones"""
+        self._root, removed = self._remove(self._root, (start, item))
+        if removed:
+            self._size -= 1
+
+    def overlapping(self, start: float, end: float) -> List[Hashable]:
+        """
+        Get the items whose intervals overlap [start, end)
+
+        Returns:
+            List: Items ordered by interval start
+        """
+        result = []
+        stack = []
+        node = self._root
+        while stack or node is not None:
+            if node is not None and node.max_end > start:
+                # In-order traversal, pruned by max_end on the way down
+                stack.append(node)
+                node = node.left
+                continue
+            if not stack:
+                break
+            node = stack.pop()
+            if node.start >= end:
+                # Everything to the right starts even later
+                break
+            if node.end > start:
+                result.append(node.item)
+            node = node.right
+        return result
+
+    def _insert(self, root: Optional[_Node], node: _Node) -> _Node:
+        if root is None:
+            return node
+        if (node.start, node.item) < (root.start, root.item):
+            root.left = self._insert(root.left, node)
+            if root.left.priority > root.priority:
+                root = self._rotate_right(root)
+        else:
+            root.right = self._insert(root.right, node)
+            if root.right.priority > root.priority:
+                root = self._rotate_left(root)
+        root.update()
+        return root
+
+    def _remove(self, root: Optional[_Node], key: tuple):
+        if root is None:
+            return None, False
+        root_key = (root.start, root.item)
+        if key < root_key:
+            root.left, removed = self._remove(root.left, key)
+        elif key > root_key:
+            root.right, removed = self._remove(root.right, key)
+        else:
+            return self._merge(root.left, root.right), True
+        root.update()
+        return root, removed
+
+    def _merge(self, left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+        if left is None:
+            return right
+        if right is None:
+            return left
+        if left.priority > right.priority:
+            left.right = self._merge(left.right, right)
+            left.update()
+            return left
+        right.left = self._merge(left, right.left)
+        right.update()
+        return right
+
+    @staticmethod
+    def _rotate_right(node: _Node) -> _Node:
+        pivot = node.left
+        node.left = pivot.right
+        pivot.right = node
+        node.update()
+        pivot.update()
+        return pivot
+
+    @staticmethod
+    def _rotate_left(node: _Node) -> _Node:
+        pivot = node.right
+        node.right = pivot.left
+        pivot.left = node
+        node.update()
+        pivot.update()
+        return pivot
@@ -0,0 +1,162 @@
+"""
+Background jobs for Fiction Timelines application.
+Runs queued jobs on a pool of worker threads, so heavy operations are done outside the request that asked for them.
+The queue itself is a database table, claimed with atomic updates, so any number of workers can share it
+without a separate broker.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger('fiction_timelines.jobs')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class JobError(Exception):
+    """Failure of a job, reported to its owner along with what the job got done before failing"""
+
+    def __init__(self, message: str, result: Optional[Dict] = None):
+        super().__init__(message)
+        self.result = result
+
+
+class JobProgress:
+    """
+    Progress reporter handed to a running job
+
+    Jobs report as often as is convenient for them, and the reports are
+    passed on at most once per interval, plus the final one, so progress
+    updates don't slow the job down.
+    """
+
+    def __init__(self, report: Callable[[int, Optional[int]], None], interval: float = 1.0):
+        self._report = report
+        self._interval = interval
+        self._last = None
+        self.done = 0
+        self.total = None
+
+    def update(self, done: int, total: Optional[int] = None, force: bool = False) -> None:
+        """Record how much of the job is done, out of total if it is known"""
+        self.done = done
+        if total is not None:
+            self.total = total
+        now = time.monotonic()
+        if force or self._last is None or now - self._last >= self._interval:
+            self._last = now
+            self._report(self.done, self.total)
+
+
+def worker_name() -> str:
+    """Identify this worker process in the jobs it claims"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class JobWorker:
+    """
+    Pool of threads running jobs claimed from a queue
+
+    A job is only claimed when a thread is free to run it, so jobs left in
+    the queue can be picked up by other workers. While jobs run, the worker
+    periodically reports them as alive so that the jobs of a worker that
+    died can be told apart and requeued.
+
+    Args:
+        claim: Claim the next queued job for this worker and return its ID,
+            or None if the queue is empty
+        run: Run a claimed job to completion, recording its outcome
+        heartbeat: Mark the given jobs as still running
+        threads: Number of jobs run at the same time
+        poll_interval: Seconds to wait before checking an empty queue again
+        heartbeat_interval: Seconds between heartbeats
+    """
+
+    def __init__(self, claim: Callable[[], Optional[int]], run: Callable[[int], None],
+                 heartbeat: Callable[[Set[int]], None], threads: int = 2, poll_interval: float = 1.0,
+                 heartbeat_interval: float = 30.0):
+        self._claim = claim
+        self._run = run
+        self._heartbeat = heartbeat
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._slots = threading.Semaphore(threads)
+        self._running: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._finished = threading.Event()
+
+    def stop(self) -> None:
+        """Stop claiming jobs, the jobs already running are finished"""
+        self._stopping.set()
+
+    def run(self, once: bool = False) -> int:
+        """
+        Run jobs until stopped
+
+        Args:
+            once: Return as soon as the queue is empty instead of waiting for
+                more jobs
+
+        Returns:
+            int: Number of jobs run
+        """
+        count = 0
+        heartbeat = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+        heartbeat.start()
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='job') as executor:
+            while not self._stopping.is_set():
+                # Wait for a free thread, without claiming a job once stopped
+                if not self._slots.acquire(timeout=self.poll_interval):
+                    continue
+                if self._stopping.is_set():
+                    self._slots.release()
+                    break
+                try:
+                    job_id = self._claim()
+                except Exception:
+                    logger.exception('Failed to claim a job')
+                    job_id = None
+                if job_id is None:
+                    self._slots.release()
+                    if once:
+                        break
+                    self._stopping.wait(self.poll_interval)
+                    continue
+                with self._lock:
+                    self._running.add(job_id)
+                executor.submit(self._execute, job_id)
+                count += 1
+        self._finished.set()
+        heartbeat.join()
+        return count
+
+    def _execute(self, job_id: int) -> None:
+        try:
+            self._run(job_id)
+        except Exception:
+            logger.exception('Job %s could not be run', job_id)
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+            self._slots.release()
+
+    def _beat(self) -> None:
+        # Keeps beating after the worker is stopped, until its last job finishes
+        while not self._finished.wait(self.heartbeat_interval):
+            with self._lock:
+                running = set(self._running)
+            if running:
+                try:
+                    self._heartbeat(running)
+                except Exception:
+                    logger.exception('Failed to record the heartbeat of jobs %s', sorted(running))
@@ -0,0 +1,115 @@
+"""
+Fork reconciliation for Fiction Timelines application.
+Compares forks with their parent and plans three-way merges of their changes back upstream.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.timeline import Event
+
+
+@dataclass
+class EventChange:
+    """
+    One event a fork changed, together with the parent's current version
+
+    The base hash is the content hash of the parent's version when the fork
+    first changed the event, which serves as the common ancestor of a
+    three-way merge.
+    """
+    event_id: str
+    base_hash: Optional[str]  # None for events the fork added
+    parent: Optional[Event]  # None if the parent doesn't have the event
+    fork: Optional[Event]  # None if the fork deleted the event
+    parent_hash: Optional[str] = None
+    fork_hash: Optional[str] = None
+
+    def __post_init__(self):
+        self.parent_hash = self.parent.content_hash() if self.parent is not None else None
+        self.fork_hash = self.fork.content_hash() if self.fork is not None else None
+
+    @property
+    def status(self) -> str:
+        """What the fork did to the event: added, modified or deleted"""
+        if self.fork is None:
+            return 'deleted'
+        return 'added' if self.base_hash is None else 'modified'
+
+    @property
+    def upstream(self) -> str:
+        """What the parent did to the event since the fork changed it: unchanged, modified or deleted"""
+        if self.parent_hash == self.base_hash:
+            return 'unchanged'
+        return 'deleted' if self.parent is None else 'modified'
+
+    @property
+    def diverged(self) -> bool:
+        """Whether the fork's version differs from the parent's"""
+        return self.fork_hash != self.parent_hash
+
+    def to_dict(self) -> Dict:
+        """Convert change to dictionary for serialization"""
+        return {
+            'id': self.event_id,
+            'status': self.status,
+            'upstream': self.upstream,
+            'base_hash': self.base_hash,
+            'parent': self.parent.to_dict() if self.parent is not None else None,
+            'fork': self.fork.to_dict() if self.fork is not None else None
+        }
+
+
+def diff_fork(parent_events: Iterable[Event], fork_events: Iterable[Tuple[Event, Optional[str]]],
+              deleted: Iterable[Tuple[str, Optional[str]]]) -> List[EventChange]:
+    """
+    Pair each change stored by a fork with the parent's version of the event
+
+    Forks only store the events they added or overrode and tombstones for the
+    ones they deleted, so everything else is identical to the parent by
+    construction. The parent's versions are indexed by uuid once and every
+    fork change is matched with a single lookup, so the diff is linear in
+    the number of events involved.
+
+    Args:
+        parent_events: The parent's current versions of the changed events
+        fork_events: (event, base hash) for each event stored by the fork
+        deleted: (event uuid, base hash) for each event the fork deleted
+
+    Returns:
+        List[EventChange]: One change per stored fork event and tombstone,
+        including ones that no longer differ from the parent
+    """
+    parents = {event.id: event for event in parent_events}
+    changes = [
+        EventChange(event_id=event.id, base_hash=base_hash, parent=parents.get(event.id), fork=event)
+        for event, base_hash in fork_events
+    ]
+    changes.extend(
+        EventChange(event_id=event_id, base_hash=base_hash, parent=parents.get(event_id), fork=None)
+        for event_id, base_hash in deleted
+    )
+    return changes
+
+
+def plan_merge(changes: Iterable[EventChange]) -> Tuple[List[EventChange], List[EventChange], List[EventChange]]:
+    """
+    Decide how a fork's changes merge into its parent
+
+    A change applies cleanly when the parent still has the base version, is
+    already in sync when both sides hold the same content, and conflicts
+    when both sides changed the event in different ways.
+
+    Returns:
+        Tuple of the changes to apply to the parent, the changes the parent
+        already matches, and the conflicting changes
+    """
+    apply, in_sync, conflicts = [], [], []
+    for change in changes:
+        if not change.diverged:
+            in_sync.append(change)
+        elif change.parent_hash == change.base_hash:
+            apply.append(change)
+        else:
+            conflicts.append(change)
+    return apply, in_sync, conflicts
@@ -0,0 +1,83 @@
+"""
+Full-text search support for Fiction Timelines application.
+Defines the SQLite FTS5 indexes over events and timelines and turns user input into safe FTS queries.
+"""
+
+from typing import List, Optional
+
+from markupsafe import escape
+
+# External-content FTS5 tables mirror the title and description columns of
+# their source tables and are kept in sync by triggers, so every write path
+# (single edits, bulk imports, migrations) updates the index.
+FTS_CREATE_STATEMENTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS event_fts USING fts5(
+        title, description, content='event', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_insert AFTER INSERT ON event BEGIN
+        INSERT INTO event_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_delete AFTER DELETE ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_update AFTER UPDATE OF title, description ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO event_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS timeline_fts USING fts5(
+        title, description, content='timeline', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS timeline_fts_insert AFTER INSERT ON timeline BEGIN
+        INSERT INTO timeline_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS timeline_fts_delete AFTER DELETE ON timeline BEGIN
+        INSERT INTO timeline_fts(timeline_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS timeline_fts_update AFTER UPDATE OF title, description ON timeline BEGIN
+        INSERT INTO timeline_fts(timeline_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO timeline_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+FTS_DROP_STATEMENTS = [
+    "DROP TABLE IF EXISTS event_fts",
+    "DROP TABLE IF EXISTS timeline_fts",
+]
+
+FTS_TABLE_PREFIXES = ('event_fts', 'timeline_fts')
+
+# Snippet markers are control characters so the surrounding text can be
+# HTML-escaped before they are turned into <mark> tags
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+
+
+def fts_query(text: str) -> Optional[str]:
+    """
+    Convert free text into an FTS5 query matching all of its words
+
+    Each word is quoted so FTS operators and punctuation in user input can't
+    cause syntax errors, and the last word is matched as a prefix to support
+    search-as-you-type.
+
+    Returns:
+        str: FTS5 MATCH expression, or None if the text has no words
+    """
+    words: List[str] = text.split()
+    if not words:
+        return None
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def render_snippet(snippet: Optional[str]) -> str:
+    """HTML-escape an FTS snippet and highlight its matches with <mark> tags"""
+    if not snippet:
+        return ''
+    return str(escape(snippet)).replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+
+def include_in_migrations(obj, name: str, type_: str, reflected: bool, compare_to) -> bool:
+    """Alembic include_object hook that hides the FTS tables and their shadow tables from autogenerate"""
+    return not (type_ == 'table' and name.startswith(FTS_TABLE_PREFIXES))
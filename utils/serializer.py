@@ -0,0 +1,117 @@
+"""
+JSON serialization for Fiction Timelines application.
+Encodes timelines by splicing together cached per-event JSON fragments instead of re-encoding every event.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+import json
+import threading
+
+from utils.timeline import Event, Timeline
+
+try:
+    import orjson
+except ImportError:  # Optional faster backend, the standard library encoder is used without it
+    orjson = None
+
+# Characters escaped so the JSON can be embedded in a <script> tag, as Flask's tojson filter does
+_HTML_ESCAPES = ((b'&', b'\\u0026'), (b'<', b'\\u003c'), (b'>', b'\\u003e'), (b"'", b'\\u0027'))
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode an object as compact UTF-8 JSON that is safe to embed in HTML
+
+    Uses orjson when it's installed.
+    """
+    if orjson is not None:
+        data = orjson.dumps(obj)
+    else:
+        data = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    for char, escape in _HTML_ESCAPES:
+        if char in data:
+            data = data.replace(char, escape)
+    return data
+
+
+class EventFragmentCache:
+    """
+    Process-wide LRU cache of encoded event JSON
+
+    Fragments are keyed by event id and modification time, so edited events
+    are re-encoded while every unchanged event is reused as-is when the
+    timeline around it is serialized again.
+    """
+
+    def __init__(self, max_entries: int = 200000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._fragments: 'OrderedDict[Tuple[str, int], bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fragments(self, events: List[Event]) -> List[bytes]:
+        """
+        Return the encoded JSON of events, in order, encoding cache misses
+
+        The whole batch is looked up under one lock acquisition, and misses
+        are encoded outside the lock.
+        """
+        keys = [(event.id, event.version) for event in events]
+        with self._lock:
+            get = self._fragments.get
+            touch = self._fragments.move_to_end
+            found = [get(key) for key in keys]
+            for key, fragment in zip(keys, found):
+                if fragment is not None:
+                    touch(key)
+            missing = [i for i, fragment in enumerate(found) if fragment is None]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if not missing:
+            return found
+
+        for i in missing:
+            found[i] = dumps(events[i].to_dict())
+        with self._lock:
+            for i in missing:
+                self._fragments[keys[i]] = found[i]
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+        return found
+
+    def clear(self) -> None:
+        """Drop all cached fragments"""
+        with self._lock:
+            self._fragments.clear()
+
+    def stats(self) -> Dict:
+        """Return cache counters for sizing and monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._fragments),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+def serialize_events(events: Iterable[Event], fragments: EventFragmentCache) -> bytes:
+    """Encode events as a JSON array from their cached fragments"""
+    return b'[' + b','.join(fragments.fragments(list(events))) + b']'
+
+
+def serialize_timeline(timeline: Timeline, fragments: EventFragmentCache) -> bytes:
+    """
+    Encode a timeline as JSON, equivalent to encoding Timeline.to_dict()
+
+    Only the timeline's own fields are encoded here; its events, ordered by
+    date, are spliced in from the fragment cache.
+
+    Returns:
+        bytes: UTF-8 JSON that is safe to embed in HTML
+    """
+    head = dumps(timeline.to_dict(include_events=False))
+    events = serialize_events(timeline.iter_events_by_date(), fragments)
+    return head[:-1] + b',"events":' + events + b'}'
@@ -0,0 +1,142 @@
+"""
+Timeline snapshots for Fiction Timelines application.
+Stores rendered timeline JSON as immutable, gzipped artifacts named after their content,
+in a local directory or an S3-compatible bucket, so reads can be answered without the database.
+"""
+
+from typing import Optional, Tuple
+import gzip
+import hashlib
+import os
+import tempfile
+
+# Snapshots never change once written, so anything in front of the store may cache them for good
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def render_snapshot(payload: bytes) -> Tuple[str, bytes]:
+    """
+    Compress a JSON payload into a snapshot named after its content
+
+    Compression is deterministic, so the same payload always produces the
+    same artifact and storing it again is a no-op.
+
+    Returns:
+        Tuple of the snapshot's key and its gzipped bytes
+    """
+    key = hashlib.sha256(payload).hexdigest() + '.json.gz'
+    return key, gzip.compress(payload, compresslevel=9, mtime=0)
+
+
+class SnapshotStore:
+    """Where snapshots are kept, by key"""
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def put(self, key: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def get(self, key: str) -> bytes:
+        """Return a snapshot's gzipped bytes"""
+        raise NotImplementedError
+
+    def url(self, key: str) -> Optional[str]:
+        """Return a URL clients can be redirected to for a snapshot, or None if the application serves it"""
+        return None
+
+
+class LocalSnapshotStore(SnapshotStore):
+    """
+    Snapshots kept as files in a local directory
+
+    Args:
+        directory: Directory holding the snapshots, created if needed
+        base_url: URL the directory is published at by a web server, if any
+    """
+
+    def __init__(self, directory: str, base_url: Optional[str] = None):
+        self.directory = directory
+        self.base_url = base_url
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put(self, key: str, data: bytes) -> None:
+        # Written under a temporary name and renamed, so readers never see a partial file
+        fd, partial = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                output.write(data)
+            os.replace(partial, self._path(key))
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), 'rb') as snapshot:
+            return snapshot.read()
+
+    def url(self, key: str) -> Optional[str]:
+        return f"{self.base_url.rstrip('/')}/{key}" if self.base_url else None
+
+
+class S3SnapshotStore(SnapshotStore):
+    """
+    Snapshots kept as objects in an S3 bucket, or any store speaking its API
+
+    Objects are stored with Content-Encoding: gzip, so browsers and HTTP
+    clients redirected to them decompress them transparently.
+
+    Args:
+        bucket: Name of the bucket
+        prefix: Prefix of the snapshots' object keys
+        base_url: Public URL of the prefix, e.g. a CDN in front of the bucket.
+            Without one clients are redirected to presigned URLs.
+        url_ttl: Seconds presigned URLs stay valid
+        **client_options: Passed to boto3.client, e.g. endpoint_url
+    """
+
+    def __init__(self, bucket: str, prefix: str = '', base_url: Optional[str] = None, url_ttl: int = 3600,
+                 **client_options):
+        # The AWS SDK is slow to import, so only processes using the store pay for it
+        import boto3
+        self.client = boto3.client('s3', **client_options)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.base_url = base_url
+        self.url_ttl = url_ttl
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.prefix + key,
+            Body=data,
+            ContentType='application/json',
+            ContentEncoding='gzip',
+            CacheControl=IMMUTABLE_CACHE_CONTROL
+        )
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)['Body'].read()
+
+    def url(self, key: str) -> Optional[str]:
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{key}"
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': self.prefix + key}, ExpiresIn=self.url_ttl
+        )
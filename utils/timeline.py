@@ -3,11 +3,21 @@ Timeline management module for Fiction Timelines application.
 Handles creation, modification, and management of fictional timelines and their events.
 """
 
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import List, Dict, Optional, Set
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, FrozenSet, Iterable, Iterator, Optional, Set, Tuple
 from enum import Enum
+import hashlib
+import heapq
 import json
+import math
+import sys
+import uuid
+
+from utils.dating import DatingSystem, get_dating_system
+from utils.intervals import IntervalTree
 
 class TimelineError(Exception):
     """Base exception class for Timeline-related errors"""
@@ -27,18 +37,154 @@ class Permission(Enum):
     EDIT = "edit"
     ADMIN = "admin"
 
-@dataclass
+# Shared label sets, so events with the same categories or tags hold one frozenset between them
+_label_sets: Dict[FrozenSet[str], FrozenSet[str]] = {}
+_MAX_LABEL_SETS = 65536
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+def intern_labels(labels: Iterable[str]) -> FrozenSet[str]:
+    """
+    Return labels as a shared frozenset of interned strings
+    
+    Timelines typically reuse a small number of category and tag
+    combinations, so hydrating thousands of events only creates one set
+    per distinct combination.
+    """
+    labels = frozenset(sys.intern(label) for label in labels)
+    shared = _label_sets.get(labels)
+    if shared is not None:
+        return shared
+    if len(_label_sets) < _MAX_LABEL_SETS:
+        _label_sets[labels] = labels
+    return labels
+
+def _to_micros(value: Optional[datetime]) -> int:
+    """Convert a naive UTC datetime to microseconds since the epoch, defaulting to now"""
+    if value is None:
+        value = datetime.utcnow()
+    elif value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
 class Event:
-    """Represents a single event in the timeline"""
-    id: str
-    title: str
-    description: str
-    date: str  # Store as string to support arbitrary dating systems
-    categories: Set[str] = field(default_factory=set)
-    tags: Set[str] = field(default_factory=set)
-    created_by: str = None
-    created_at: datetime = field(default_factory=datetime.utcnow)
-    modified_at: datetime = field(default_factory=datetime.utcnow)
+    """
+    Represents a single event in the timeline
+    
+    Hydrated timelines keep every event in memory, so events are slotted,
+    share interned label sets and store timestamps as integer microseconds
+    until they are read. Categories and tags are frozensets; assign a new
+    collection to change them.
+    """
+    __slots__ = ('id', 'title', 'description', 'date', '_categories', '_tags', '_created_by',
+                 '_created_at', '_modified_at', 'date_key', 'end_date', 'end_key')
+    
+    def __init__(self, id: str, title: str, description: str, date: str,
+                 categories: Iterable[str] = (), tags: Iterable[str] = (), created_by: Optional[str] = None,
+                 created_at: Optional[datetime] = None, modified_at: Optional[datetime] = None,
+                 date_key: Optional[float] = None, end_date: Optional[str] = None, end_key: Optional[float] = None):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.date = date  # Store as string to support arbitrary dating systems
+        self.categories = categories
+        self.tags = tags
+        self.created_by = created_by
+        self._created_at = _to_micros(created_at)
+        self._modified_at = _to_micros(modified_at)
+        self.date_key = date_key  # Compiled from date by the timeline's dating system
+        self.end_date = end_date  # Set for events spanning a period rather than a single date
+        self.end_key = end_key  # Compiled from end_date by the timeline's dating system
+    
+    @property
+    def categories(self) -> FrozenSet[str]:
+        return self._categories
+    
+    @categories.setter
+    def categories(self, value: Iterable[str]) -> None:
+        self._categories = intern_labels(value)
+    
+    @property
+    def tags(self) -> FrozenSet[str]:
+        return self._tags
+    
+    @tags.setter
+    def tags(self, value: Iterable[str]) -> None:
+        self._tags = intern_labels(value)
+    
+    @property
+    def created_by(self) -> Optional[str]:
+        return self._created_by
+    
+    @created_by.setter
+    def created_by(self, value: Optional[str]) -> None:
+        self._created_by = sys.intern(value) if value is not None else None
+    
+    @property
+    def created_at(self) -> datetime:
+        return _EPOCH + self._created_at * _MICROSECOND
+    
+    @created_at.setter
+    def created_at(self, value: datetime) -> None:
+        self._created_at = _to_micros(value)
+    
+    @property
+    def modified_at(self) -> datetime:
+        return _EPOCH + self._modified_at * _MICROSECOND
+    
+    @modified_at.setter
+    def modified_at(self, value: datetime) -> None:
+        self._modified_at = _to_micros(value)
+    
+    @property
+    def version(self) -> int:
+        """Modification time in microseconds, a cheap key for caching the event's serialized form"""
+        return self._modified_at
+    
+    @property
+    def has_span(self) -> bool:
+        """Whether the event covers a non-empty period of time"""
+        return self.date_key is not None and self.end_key is not None and self.end_key > self.date_key
+    
+    def replace(self, **changes) -> 'Event':
+        """Return a copy of the event with the given fields changed"""
+        fields = {
+            'id': self.id, 'title': self.title, 'description': self.description, 'date': self.date,
+            'categories': self._categories, 'tags': self._tags, 'created_by': self._created_by,
+            'created_at': self.created_at, 'modified_at': self.modified_at,
+            'date_key': self.date_key, 'end_date': self.end_date, 'end_key': self.end_key
+        }
+        fields.update(changes)
+        return Event(**fields)
+    
+    def _astuple(self) -> tuple:
+        return (self.id, self.title, self.description, self.date, self._categories, self._tags, self._created_by,
+                self._created_at, self._modified_at, self.date_key, self.end_date, self.end_key)
+    
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._astuple() == other._astuple()
+    
+    __hash__ = None
+    
+    def __repr__(self) -> str:
+        return f"Event(id={self.id!r}, title={self.title!r}, date={self.date!r})"
+    
+    def content_hash(self) -> str:
+        """
+        Hash the user-editable content of the event
+        
+        Two versions of an event with the same hash are interchangeable, which
+        is how forks tell their overrides apart from the parent's version.
+        
+        Returns:
+            str: Hex SHA-256 digest
+        """
+        content = [self.title, self.description or '', self.date, self.end_date,
+                   sorted(self.categories), sorted(self.tags)]
+        return hashlib.sha256(json.dumps(content, separators=(',', ':')).encode('utf-8')).hexdigest()
     
     def to_dict(self) -> Dict:
         """Convert event to dictionary for serialization"""
@@ -47,6 +193,9 @@ class Event:
             'title': self.title,
             'description': self.description,
             'date': self.date,
+            'date_key': self.date_key,
+            'end_date': self.end_date,
+            'end_key': self.end_key,
             'categories': list(self.categories),
             'tags': list(self.tags),
             'created_by': self.created_by,
@@ -67,6 +216,81 @@ class Timeline:
     modified_at: datetime = field(default_factory=datetime.utcnow)
     collaborators: Dict[str, Permission] = field(default_factory=dict)
     parent_timeline_id: Optional[str] = None
+    era_table: Optional[List[Tuple[str, float]]] = None
+    _dating: DatingSystem = field(default=None, init=False, repr=False, compare=False)
+    _positions: Dict[str, int] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _index_keys: List[Tuple[float, int]] = field(default_factory=list, init=False, repr=False, compare=False)
+    _index_events: List[Event] = field(default_factory=list, init=False, repr=False, compare=False)
+    _index_entries: Dict[str, Tuple[float, int]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _index_seq: int = field(default=0, init=False, repr=False, compare=False)
+    _spans: Optional[IntervalTree] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self._dating = get_dating_system(self.dating_system, self.era_table)
+        # Events must be changed through the methods below so that the
+        # id map and the date index stay in sync with the events list
+        for position, event in enumerate(self.events):
+            self._positions[event.id] = position
+            self._index_event(event)
+    
+    def get_event(self, event_id: str) -> Optional[Event]:
+        """Return the event with the given ID, or None if it doesn't exist"""
+        position = self._positions.get(event_id)
+        return self.events[position] if position is not None else None
+    
+    def iter_events_by_date(self) -> Iterator[Event]:
+        """Iterate over events ordered by date, unparseable dates last"""
+        return iter(self._index_events)
+    
+    def events_between(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Event]:
+        """
+        Get events whose date falls within a range, ordered by date
+        
+        Events with unparseable dates are only included when no bound is given.
+        
+        Args:
+            start: Inclusive lower bound, or None for no lower bound
+            end: Inclusive upper bound, or None for no upper bound
+            
+        Returns:
+            List[Event]: Matching events, in O(log n + k)
+            
+        Raises:
+            TimelineError: If a bound can't be parsed in this dating system
+        """
+        if start is None and end is None:
+            return list(self._index_events)
+        lo = bisect_left(self._index_keys, (self._parse_bound(start), -1)) if start is not None else 0
+        hi = bisect_right(self._index_keys, (self._parse_bound(end), math.inf)) if end is not None else self._dated_count()
+        return self._index_events[lo:hi]
+    
+    def nearest(self, date: str, k: int = 1) -> List[Event]:
+        """
+        Get the k events closest in time to a date, ordered by distance
+        
+        Args:
+            date: Date to search around
+            k: Maximum number of events to return
+            
+        Returns:
+            List[Event]: Closest events, in O(log n + k)
+            
+        Raises:
+            TimelineError: If the date can't be parsed in this dating system
+        """
+        key = self._parse_bound(date)
+        hi = bisect_left(self._index_keys, (key, -1))
+        lo = hi - 1
+        end = self._dated_count()
+        result = []
+        while len(result) < k and (lo >= 0 or hi < end):
+            if hi >= end or (lo >= 0 and key - self._index_keys[lo][0] <= self._index_keys[hi][0] - key):
+                result.append(self._index_events[lo])
+                lo -= 1
+            else:
+                result.append(self._index_events[hi])
+                hi += 1
+        return result
     
     def add_event(self, event: Event, user_id: str) -> None:
         """
@@ -83,11 +307,14 @@ class Timeline:
         if not self._can_edit(user_id):
             raise PermissionError("User does not have permission to add events")
             
+        self.compile_dates(event)
         if self._check_conflicts(event):
             raise EventConflictError("Event conflicts with existing events")
             
         event.created_by = user_id
+        self._positions[event.id] = len(self.events)
         self.events.append(event)
+        self._index_event(event)
         self.modified_at = datetime.utcnow()
     
     def edit_event(self, event_id: str, updated_event: Event, user_id: str) -> None:
@@ -106,17 +333,21 @@ class Timeline:
         if not self._can_edit(user_id):
             raise PermissionError("User does not have permission to edit events")
             
-        for i, event in enumerate(self.events):
-            if event.id == event_id:
-                if self._check_conflicts(updated_event, exclude_id=event_id):
-                    raise EventConflictError("Updated event conflicts with existing events")
-                    
-                updated_event.modified_at = datetime.utcnow()
-                self.events[i] = updated_event
-                self.modified_at = datetime.utcnow()
-                return
-                
-        raise TimelineError(f"Event with id {event_id} not found")
+        position = self._positions.get(event_id)
+        if position is None:
+            raise TimelineError(f"Event with id {event_id} not found")
+            
+        self.compile_dates(updated_event)
+        if self._check_conflicts(updated_event, exclude_id=event_id):
+            raise EventConflictError("Updated event conflicts with existing events")
+            
+        updated_event.modified_at = datetime.utcnow()
+        self._unindex_event(event_id)
+        del self._positions[event_id]
+        self.events[position] = updated_event
+        self._positions[updated_event.id] = position
+        self._index_event(updated_event)
+        self.modified_at = datetime.utcnow()
     
     def delete_event(self, event_id: str, user_id: str) -> None:
         """
@@ -132,7 +363,14 @@ class Timeline:
         if not self._can_edit(user_id):
             raise PermissionError("User does not have permission to delete events")
             
-        self.events = [e for e in self.events if e.id != event_id]
+        position = self._positions.pop(event_id, None)
+        if position is not None:
+            # Swap the last event into the freed slot to keep removal O(1)
+            last = self.events.pop()
+            if position < len(self.events):
+                self.events[position] = last
+                self._positions[last.id] = position
+            self._unindex_event(event_id)
         self.modified_at = datetime.utcnow()
     
     def add_collaborator(self, user_id: str, permission: Permission, admin_id: str) -> None:
@@ -182,30 +420,42 @@ class Timeline:
             Timeline: A new Timeline object with copied data and new ownership
         """
         forked = Timeline(
-            id=f"{self.id}_fork_{datetime.utcnow().timestamp()}",
+            id=str(uuid.uuid4()),
             title=f"Fork of {self.title}",
             description=self.description,
             dating_system=self.dating_system,
-            events=[Event(**event.to_dict()) for event in self.events],
+            events=[event.replace() for event in self.events],
             owner_id=new_owner_id,
-            parent_timeline_id=self.id
+            parent_timeline_id=self.id,
+            era_table=self.era_table
         )
         return forked
     
-    def to_dict(self) -> Dict:
-        """Convert timeline to dictionary for serialization"""
-        return {
+    def to_dict(self, include_events: bool = True) -> Dict:
+        """
+        Convert timeline to dictionary for serialization
+        
+        Args:
+            include_events: Whether to include the events, ordered by date
+        """
+        data = {
             'id': self.id,
             'title': self.title,
             'description': self.description,
             'dating_system': self.dating_system,
-            'events': [event.to_dict() for event in self.events],
             'owner_id': self.owner_id,
             'created_at': self.created_at.isoformat(),
             'modified_at': self.modified_at.isoformat(),
             'collaborators': {k: v.value for k, v in self.collaborators.items()},
             'parent_timeline_id': self.parent_timeline_id
         }
+        if include_events:
+            data['events'] = [event.to_dict() for event in self._index_events]
+        return data
+    
+    def can_edit(self, user_id: str) -> bool:
+        """Check if user may add, edit or delete events"""
+        return self._can_edit(user_id)
     
     def _can_edit(self, user_id: str) -> bool:
         """Check if user has edit permissions"""
@@ -219,6 +469,119 @@ class Timeline:
             return True
         return user_id in self.collaborators and self.collaborators[user_id] == Permission.ADMIN
     
+    def parse_date(self, date: str) -> Optional[float]:
+        """Compile a date string into a sort key using this timeline's dating system"""
+        return self._dating.parse(date)
+    
+    def compile_dates(self, event: Event) -> None:
+        """
+        Fill in an event's date keys if they haven't been compiled yet
+        
+        Raises:
+            TimelineError: If the event ends before it starts
+        """
+        self._compile_keys(event)
+        if event.date_key is not None and event.end_key is not None and event.end_key < event.date_key:
+            raise TimelineError("Event cannot end before it starts")
+    
+    def conflicting_events(self, event: Event, exclude_id: Optional[str] = None) -> List[Event]:
+        """
+        Get the events an event would conflict with
+        
+        Two events conflict when both span a period of time, the periods
+        overlap and they share a tag, since a tagged character, place or
+        artifact can't be part of two overlapping events. Point-in-time events
+        never conflict. Runs in O(log n + k) using the span index.
+        
+        Args:
+            event: Event to check, with compiled date keys
+            exclude_id: Optional ID of event to ignore, e.g. the event being edited
+            
+        Returns:
+            List[Event]: Conflicting events ordered by start date
+        """
+        if not event.has_span or not event.tags:
+            return []
+        if self._spans is None:
+            # Built on first use so hydrating a timeline for reads stays cheap
+            self._spans = IntervalTree()
+            for other in self.events:
+                if other.has_span:
+                    self._spans.insert(other.date_key, other.end_key, other.id)
+        result = []
+        for event_id in self._spans.overlapping(event.date_key, event.end_key):
+            other = self.get_event(event_id)
+            if event_id != exclude_id and event_id != event.id and not other.tags.isdisjoint(event.tags):
+                result.append(other)
+        return result
+    
+    def find_all_conflicts(self) -> List[Tuple[Event, Event]]:
+        """
+        Find every pair of conflicting events in the timeline
+        
+        Sweeps the spans in start order while keeping the active spans per tag,
+        so validating a whole timeline takes O(n log n + k) instead of
+        checking each event against every other.
+        
+        Returns:
+            List[Tuple[Event, Event]]: Conflicting pairs, earlier-starting event first
+        """
+        spans = sorted((e for e in self.events if e.has_span), key=lambda e: e.date_key)
+        active = []  # Heap of (end_key, sequence, event)
+        active_by_tag = defaultdict(dict)
+        pairs = {}
+        for sequence, event in enumerate(spans):
+            while active and active[0][0] <= event.date_key:
+                _, _, expired = heapq.heappop(active)
+                for tag in expired.tags:
+                    active_by_tag[tag].pop(expired.id, None)
+            for tag in event.tags:
+                for other in active_by_tag[tag].values():
+                    pairs.setdefault((other.id, event.id), (other, event))
+                active_by_tag[tag][event.id] = event
+            heapq.heappush(active, (event.end_key, sequence, event))
+        return list(pairs.values())
+    
+    def _index_event(self, event: Event) -> None:
+        """Insert an event into the date and span indexes, compiling its date keys if needed"""
+        self._compile_keys(event)
+        entry = (event.date_key if event.date_key is not None else math.inf, self._index_seq)
+        self._index_seq += 1
+        position = bisect_left(self._index_keys, entry)
+        self._index_keys.insert(position, entry)
+        self._index_events.insert(position, event)
+        self._index_entries[event.id] = entry
+        if self._spans is not None and event.has_span:
+            self._spans.insert(event.date_key, event.end_key, event.id)
+    
+    def _compile_keys(self, event: Event) -> None:
+        """Compile any missing date keys of an event"""
+        if event.date_key is None:
+            event.date_key = self.parse_date(event.date)
+        if event.end_key is None and event.end_date:
+            event.end_key = self.parse_date(event.end_date)
+    
+    def _unindex_event(self, event_id: str) -> None:
+        """Remove an event from the date and span indexes"""
+        entry = self._index_entries.pop(event_id)
+        position = bisect_left(self._index_keys, entry)
+        event = self._index_events[position]
+        if self._spans is not None and event.has_span:
+            self._spans.remove(event.date_key, event.end_key, event.id)
+        del self._index_keys[position]
+        del self._index_events[position]
+    
+    def _dated_count(self) -> int:
+        """Number of indexed events with a parseable date"""
+        return bisect_left(self._index_keys, (math.inf, -1))
+    
+    def _parse_bound(self, date: str) -> float:
+        """Parse a query date, rejecting dates that can't be ordered"""
+        key = self.parse_date(date)
+        if key is None:
+            raise TimelineError(f"Unrecognized date for {self.dating_system} dating system: {date}")
+        return key
+    
     def _check_conflicts(self, event: Event, exclude_id: Optional[str] = None) -> bool:
         """
         Check if an event conflicts with existing events
@@ -230,7 +593,4 @@ class Timeline:
         Returns:
             bool: True if there are conflicts, False otherwise
         """
-        # This is a placeholder for more sophisticated conflict detection
-        # In a real implementation, this would need to handle the custom dating system
-        # and potentially more complex conflict rules
-        return False  # For now, assume no conflicts 
\ No newline at end of file
+        return bool(self.conflicting_events(event, exclude_id)) 
\ No newline at end of file